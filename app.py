@@ -5,8 +5,11 @@ from factory.app_factory import create_app
 
 import logging
 
-# Crea un'istanza dell'applicazione Flask utilizzando la factory
-app = create_app()
+# Crea un'istanza dell'applicazione Flask utilizzando la factory.
+# I worker embedding avviati con "spawn" (core/embedding_pool.py) rieseguono
+# questo file come __mp_main__: lì l'app non va creata.
+if __name__ != "__mp_main__":
+    app = create_app()
 
 # Avvia l'applicazione
 if __name__ == "__main__":
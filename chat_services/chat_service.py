@@ -12,19 +12,20 @@ import redis
 from typing import List, Dict, Any
 from concurrent.futures import ThreadPoolExecutor
 import requests
-from menu_services import vector_db
 from review_services.review_query_api import extract_review_queries
 from review_services.review_service    import fetch_reviews
 from menu_services.search_service import best_menu_match
+from menu_services.hybrid_search import search_products, search_products_many
 from chat_services.order_builder import build_order
 from core.aliases import resolve as resolve_alias
-from core.prompt_utils import (fill_prompt_loop,
-                                   process_conditional_blocks,
-                                   fix_italian_encoding)
+from core.prompt_utils import fix_italian_encoding
+from core.prompt_template import prepare_prompt, split_prefix
+from core.prompt_files import read_text as read_prompt_file
+from core.prompt_budget import apply_budget, count_tokens, record_system_tokens
 from chat_services.criteria_api import extract_criteria
 from cart_services.cart_service import fetch_cart
 from core.db_router import set_current_db 
-from core.prompt_store import get_prompt
+from core.prompt_store import get_prepared_prompt, get_prompt
 from datetime import datetime
 from concurrent.futures import as_completed
 from pathlib import Path
@@ -34,6 +35,10 @@ from core.llm_formatting import format_messages_for_vllm
 # Configurazione modello LLM
 LLM_URL   = os.getenv("LLM_URL", "http://localhost:8000/v1/chat/completions")
 LLM_MODEL = os.getenv("LLM_MODEL", "google/gemma-3-27b-it")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "8192"))
+# inline = template così com'è · prefix = parte statica in testa, <dynamic_data> in coda
+# (prefisso stabile per tenant → prefix cache di vLLM)
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "inline")
 DEFAULT_PROMPT_FILE = Path(
     os.getenv(
         "CHAT_PROMPT_FILE",
@@ -88,32 +93,39 @@ def _gather_menu_queries(criteria: List[Dict[str, Any]]) -> dict[str, set[str]]:
     return mapping
 
 
+def _search_product_safe(project: str, name: str) -> List[Dict[str, Any]]:
+    try:
+        return _with_db(project, search_products, name, 3)()
+    except Exception as exc:
+        logging.warning("[chat_service] prefetch menu error for %r: %s", name, exc)
+        return []
+
+
 def _prefetch_menu_data(criteria: List[Dict[str, Any]],
                         project: str) -> dict[str, List[Dict[str, Any]]]:
     queries = _gather_menu_queries(criteria)
     if not queries:
         return {}
 
-    futures = {}
-    for query, keys in queries.items():
-        futures[EXECUTOR.submit(
-            _with_db(project, vector_db.search_menu, query, 3)
-        )] = (query, keys)
+    # Un passo lessicale per tutti i prodotti, embedding (un batch) solo per
+    # i nomi senza match esatto, vedi menu_services/hybrid_search.py.
+    # Se il batch fallisce si riprova nome per nome: un errore non svuota
+    # i risultati di tutti i prodotti.
+    names = list(queries)
+    try:
+        results = _with_db(project, search_products_many, names, 3)()
+    except Exception as exc:
+        logging.warning("[chat_service] prefetch menu batch error for %s: %s (ricerca per nome)",
+                        names, exc)
+        results = [_search_product_safe(project, name) for name in names]
 
     menu_cache: dict[str, List[Dict[str, Any]]] = {}
-    for fut in as_completed(futures):
-        query, keys = futures[fut]
-        try:
-            rows = fut.result()
-        except Exception as exc:
-            logging.warning("[chat_service] prefetch menu error for '%s': %s", query, exc)
-            rows = []
-
+    for query, rows in zip(names, results):
         if not rows:
             fallback = best_menu_match(query)
             rows = [fallback] if fallback else []
 
-        for key in keys:
+        for key in queries[query]:
             menu_cache[key] = rows
 
     logging.debug("[chat_service] prefetched %d menu keys", len(menu_cache))
@@ -134,7 +146,7 @@ def _lookup_menu_rows(prod_name: str,
             return menu_cache[alias_key]
 
     # Fallback a chiamata singola se non era stato prefetcheato
-    rows = vector_db.search_menu(prod_name, k=3)
+    rows = search_products(prod_name, k=3)
     if not rows:
         fallback = best_menu_match(prod_name)
         rows = [fallback] if fallback else []
@@ -151,7 +163,7 @@ def build_menu_items(criteria: List[Dict[str,Any]],
                      ) -> List[Dict[str,str]]:
     """
     Costruisce la lista di piatti confermati per il prompt,
-    cercandoli nel DB (search_menu o fuzzy match).
+    cercandoli nel DB (ricerca ibrida o fuzzy match).
 
     Returns:
         Lista di dict con campi name, type, description, ingredients, price
@@ -189,6 +201,57 @@ def _save_state(sid: str, patch: dict):
         REDIS.hset(_redis_key(sid), mapping=patch)
     REDIS.expire(_redis_key(sid), REDIS_TTL)
 
+# ------------------------------------------------------------------ #
+def _post_llm(payload_llm: Dict[str, Any], timeout: float = 180) -> Dict[str, Any]:
+    headers = {}
+    if "api.openai.com" in LLM_URL or os.getenv("LLM_API_KEY"):
+        headers["Authorization"] = f"Bearer {os.getenv('LLM_API_KEY', '')}"
+    r = requests.post(LLM_URL, json=payload_llm, headers=headers, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def _load_prompt(project: str) -> str:
+    prompts = get_prompt(project)
+    if not prompts:
+        try:
+            prompts = read_prompt_file(DEFAULT_PROMPT_FILE)
+        except FileNotFoundError:
+            logging.error("[chat_service] Prompt file mancante (%s)", DEFAULT_PROMPT_FILE)
+    return prompts or ""
+
+
+def warmup_prefix_cache(projects: List[str]):
+    """
+    Una richiesta da 1 token per tenant con la parte statica del prompt
+    (layout prefix): vLLM la tiene in prefix cache prima del primo utente.
+    Con PROMPT_LAYOUT=inline la parte iniziale cambia a ogni turno: niente da fare.
+    """
+    if PROMPT_LAYOUT != "prefix":
+        logging.info("[chat_service] LLM_PREFIX_WARMUP ignorato: PROMPT_LAYOUT=%s", PROMPT_LAYOUT)
+        return
+    for project in projects:
+        t0 = time.perf_counter()
+        try:
+            set_current_db(project)
+            split = split_prefix(_load_prompt(project))
+            if split is None:
+                logging.info("[chat_service] warmup %s: prompt senza <dynamic_data>, skip", project)
+                continue
+            _post_llm({
+                "model": LLM_MODEL,
+                "messages": format_messages_for_vllm([
+                    {"role": "system", "content": split[0]},
+                    {"role": "user",   "content": "ciao"},
+                ]),
+                "max_tokens": 1,
+            }, timeout=60)
+            logging.info("[chat_service] prefix cache %s pronta in %.0f ms",
+                         project or "default", (time.perf_counter() - t0) * 1000)
+        except Exception as exc:
+            logging.warning("[chat_service] warmup prefix cache %s fallito: %s", project, exc)
+
+
 # ------------------------------------------------------------------ #
 def chat(payload: Dict[str,Any]) -> Dict[str,Any]:
     """
@@ -205,18 +268,20 @@ def chat(payload: Dict[str,Any]) -> Dict[str,Any]:
     replyformat  = payload.get("replyformat", "")
     project      = payload.get("project", "")
 
-    prompts = get_prompt(project)
-    if not prompts:
-        prompts      = payload.get("prompts", "")
+    # prompt del progetto dal DB (in cache con la forma compilata), poi payload, poi file
+    prepared = get_prepared_prompt(project)
+    if prepared is not None:
+        prompts  = prepared.text
     if not prompts:
         try:
-            prompts = DEFAULT_PROMPT_FILE.read_text(encoding="utf-8")
-            logging.info("[chat_service] prompt caricato da %s", DEFAULT_PROMPT_FILE)
+            prompts = read_prompt_file(DEFAULT_PROMPT_FILE)    # riletto solo se cambia
         except FileNotFoundError:
             logging.error("[chat_service] Prompt file mancante (%s)", DEFAULT_PROMPT_FILE)
 
     if not prompts or conv_history is None:
         return {"error": "Missing prompts or conversation_history"}
+    if prepared is None:
+        prepared = prepare_prompt(prompts)
 
     if project:
         logging.debug("[DEBUG chat_service] ECCO IL PROGETTO: %s", project)
@@ -325,30 +390,48 @@ def chat(payload: Dict[str,Any]) -> Dict[str,Any]:
     reviews_items = fut_reviews.result() if fut_reviews else []
     logging.debug("[chat_service] reviews_items %d", len(reviews_items))
 
-    sys_prompt = prompts
     logging.debug("[chat_service] menu_items      ➜ %s", json.dumps(menu_items, indent=2, ensure_ascii=False))
-    sys_prompt = fill_prompt_loop(sys_prompt, menu_items,  "menu")
     logging.debug("[chat_service] cart_items      ➜ %s", json.dumps(cart_items, indent=2, ensure_ascii=False))
-    sys_prompt = fill_prompt_loop(sys_prompt, cart_items,  "products_cart")
     logging.debug("[chat_service] reviews_items   ➜ %s", json.dumps(reviews_items, indent=2, ensure_ascii=False))
-    sys_prompt = fill_prompt_loop(sys_prompt, reviews_items, "reviews")
     logging.debug("[chat_service] delivery_state  ➜ %s", merged)
 
-    sys_prompt = process_conditional_blocks(
-        sys_prompt,
-        {
+    # Budget di token per sezione (core/prompt_budget.py): tempo di prefill prevedibile
+    budget = apply_budget(prepared,
+                          {"menu": menu_items, "cart": cart_items, "reviews": reviews_items},
+                          conv_list)
+    menu_items    = budget["sections"]["menu"]
+    cart_items    = budget["sections"]["cart"]
+    reviews_items = budget["sections"]["reviews"]
+    conv_list     = budget["history"]
+
+    # Template compilato una volta (in cache con il prompt) e reso in un solo passaggio:
+    # loop → blocchi [if] → placeholders delivery_* e {cart_total}
+    sys_prompt = prepared.render(
+        loops={
+            "menu":          menu_items,
+            "products_cart": cart_items,
+            "reviews":       reviews_items,
+        },
+        conditions={
             "menu":     "1" if menu_items else "",
             "cart":     "1" if cart_items else "",
             "reviews":  "1" if reviews_items else "",
             "delivery": "1" if merged.get("delivery_type") else ""
-        }
+        },
+        replacements={
+            **{fld: _as_text(merged.get(fld))
+               for fld in ["delivery_type", "delivery_day", "delivery_hour", "address"]},
+            "cart_total": cart_total,
+        },
+        layout=PROMPT_LAYOUT,
     )
-    # placeholders delivery_*
-    for fld in ["delivery_type", "delivery_day", "delivery_hour", "address"]:
-        sys_prompt = sys_prompt.replace(f"{{{fld}}}", _as_text(merged.get(fld)))
-        
-    sys_prompt = sys_prompt.replace("{cart_total}", cart_total)
-    logging.debug("[chat_service] system_prompt ready (%d chars)", len(sys_prompt))
+    if budget["report"]:
+        sys_tokens = count_tokens(sys_prompt)
+        record_system_tokens(sys_tokens)
+        logging.debug("[chat_service] system_prompt ready (%d chars, %d token) ➜ %s",
+                      len(sys_prompt), sys_tokens, budget["report"])
+    else:
+        logging.debug("[chat_service] system_prompt ready (%d chars)", len(sys_prompt))
 
     # ––––– DEBUG: prompt finale con tutti i placeholder risolti –––––
     if logging.getLogger().isEnabledFor(logging.DEBUG):
@@ -369,7 +452,7 @@ def chat(payload: Dict[str,Any]) -> Dict[str,Any]:
         "temperature": temperature,
         "top_p": top_p,
         "top_k": top_k,
-        "max_tokens": 8192
+        "max_tokens": LLM_MAX_TOKENS
     }
     if replyformat:
         payload_llm["response_format"] = {
@@ -378,12 +461,7 @@ def chat(payload: Dict[str,Any]) -> Dict[str,Any]:
 
     logging.debug("[chat_service] chiamo vLLM…")
     try:
-        headers = {}
-        if "api.openai.com" in LLM_URL or os.getenv("LLM_API_KEY"):
-            headers["Authorization"] = f"Bearer {os.getenv('LLM_API_KEY', '')}"
-        r = requests.post(LLM_URL, json=payload_llm, headers=headers, timeout=180)
-        r.raise_for_status()
-        llm = r.json()
+        llm = _post_llm(payload_llm)
         content = llm["choices"][0]["message"]["content"]
     except Exception as exc:
         logging.error("[chat_service] errore LLM %s", exc)
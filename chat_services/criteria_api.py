@@ -8,6 +8,7 @@ from __future__ import annotations
 import os, json, logging, re, pathlib, requests
 from typing import List, Dict, Any
 from core.llm_formatting import format_messages_for_vllm
+from core.prompt_files import load_json_prompt
 
 # ─────────────────────────────────────────────────────────────
 # Config
@@ -30,27 +31,13 @@ if os.getenv("REMOTE_API_KEY"):
 # Prompt loader (JSON -> campo "prompt")
 # ─────────────────────────────────────────────────────────────
 def _load_json_prompt(basename: str, field: str = "prompt", fallback: str = "") -> str:
-    candidates = [
+    # file letto e parsato solo quando cambia (core/prompt_files.py)
+    val = load_json_prompt([
         PROMPTS_DIR / basename,
         PROMPTS_DIR / f"{basename}.json",
         PROMPTS_DIR / f"{basename}.txt",
-    ]
-    for path in candidates:
-        try:
-            with open(path, "r", encoding="utf-8") as fp:
-                raw = fp.read()
-            obj = json.loads(raw)
-            val = obj.get(field)
-            if isinstance(val, str) and val.strip():
-                logging.info("[criteria_prompt] Caricato '%s' da %s[%s] (%d chars)",
-                             basename, path, field, len(val))
-                return val
-        except FileNotFoundError:
-            continue
-        except Exception as e:
-            logging.error("[criteria_prompt] Errore parsing %s: %s", path, e)
-    logging.warning("[criteria_prompt] Uso fallback per '%s' (non trovato/valido)", basename)
-    return fallback or '{"note":"fallback"}'
+    ], field=field, tag="criteria_prompt")
+    return val or fallback or '{"note":"fallback"}'
 
 
 # ─────────────────────────────────────────────────────────────
@@ -6,7 +6,7 @@ pronto per il frontend. Aggiunge prodotti simili a ogni richiesta.
 from __future__ import annotations
 import json, logging
 from typing import List, Dict, Any
-from menu_services.vector_db import search_menu
+from menu_services.hybrid_search import search_products
 from core.aliases import resolve as resolve_alias
 
 def _normalize_name(name: str) -> str:
@@ -37,7 +37,7 @@ def _similar_products(prod_name: str,
     """
     rows = _rows_from_cache(prod_name, menu_cache)
     if rows is None:
-        rows = search_menu(prod_name, k=max_k)
+        rows = search_products(prod_name, k=max_k)
     rows = list(rows[:max_k])
 
     return [{
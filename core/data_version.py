@@ -0,0 +1,137 @@
+# core/data_version.py
+"""
+Versione dei dati per tabella (menu, recensioni, prompt, …), per invalidare cache
+e indici in-process senza interrogare le tabelle vere.
+
+• tabella `data_version(table_name, version, updated_at)` per ogni DB tenant;
+• trigger statement-level su INSERT/UPDATE/DELETE/TRUNCATE che incrementa
+  la versione e manda `pg_notify('data_version', '<tabella>')`: vale per i
+  loader in data/ ma anche per modifiche manuali;
+• get_version() è letta con un TTL breve (DATA_VERSION_TTL_S) per tenant.
+
+Il DDL (Postgres ≥ 14, proprietario delle tabelle) gira solo fuori dal
+percorso delle richieste: i loader chiamano ensure_data_version(cur) prima
+di scrivere, data/install_data_version.py lo applica a DB già esistenti.
+Se il trigger manca o la versione non è leggibile (es. ruolo in sola
+lettura), get_version() restituisce None: versione sconosciuta, i
+chiamanti non usano cache né ETag.
+"""
+
+from __future__ import annotations
+import logging, os, threading, time
+from typing import Dict, Tuple
+
+from psycopg2.errors import UndefinedTable
+
+from core.db_router import get_current_db
+from core.vector_client import _run
+
+DATA_VERSION_TTL_S = float(os.getenv("DATA_VERSION_TTL_S", "2"))
+NOTIFY_CHANNEL = "data_version"
+VERSIONED_TABLES = ("menu", "recensioni", "prompt")
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS data_version (
+    table_name text PRIMARY KEY,
+    version    bigint      NOT NULL DEFAULT 1,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO data_version AS dv (table_name) VALUES (TG_TABLE_NAME)
+    ON CONFLICT (table_name)
+    DO UPDATE SET version = dv.version + 1, updated_at = now();
+    PERFORM pg_notify('data_version', TG_TABLE_NAME);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+_TRIGGER = """
+CREATE OR REPLACE TRIGGER {table}_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+"""
+
+_HAS_TRIGGER = """
+SELECT EXISTS (SELECT 1 FROM pg_trigger
+               WHERE tgrelid = to_regclass(%s) AND tgname = %s AND NOT tgisinternal)
+"""
+
+_CACHE: Dict[Tuple[str, str], Tuple[float, int | None]] = {}   # (db, tabella) → (scadenza, versione)
+_INSTALLED: set[Tuple[str, str]] = set()                     # trigger visti su (db, tabella)
+_UNKNOWN: set[Tuple[str, str]] = set()                       # per loggare solo i cambi di stato
+_LOCK = threading.Lock()
+
+
+def ensure_data_version(cur, tables=VERSIONED_TABLES):
+    """
+    Crea tabella, funzione e trigger (idempotente, Postgres ≥ 14).
+    `cur` è un cursore psycopg2; il lock advisory evita DDL concorrenti tra worker.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('data_version'))")
+    cur.execute(_DDL)
+    cur.execute("SELECT to_regclass(t) IS NOT NULL, t FROM unnest(%s::text[]) AS t",
+                (list(tables),))
+    for exists, table in cur.fetchall():
+        if exists:
+            cur.execute(_TRIGGER.format(table=table))
+
+
+def _read_version(key: Tuple[str, str]) -> int | None:
+    table = key[1]
+    if key not in _INSTALLED:
+        rows = _run(_HAS_TRIGGER, (table, f"{table}_data_version"), query_class="list")
+        if not rows[0][0]:
+            return None                          # nessun trigger: le modifiche non si vedrebbero
+        with _LOCK:
+            _INSTALLED.add(key)
+    try:
+        rows = _run("SELECT version FROM data_version WHERE table_name = %s", (table,),
+                    query_class="list")
+    except UndefinedTable:                       # tabella rimossa nel frattempo
+        with _LOCK:
+            _INSTALLED.discard(key)
+        raise
+    return rows[0][0] if rows else 0
+
+
+def get_version(table: str, max_age: float | None = None) -> int | None:
+    """
+    Versione corrente di `table` nel DB del tenant (0 = mai modificata,
+    None = sconosciuta: trigger non installato o DB non leggibile).
+    Il valore è tenuto in cache per `max_age` secondi (default DATA_VERSION_TTL_S).
+    """
+    key = (get_current_db(), table)
+    max_age = DATA_VERSION_TTL_S if max_age is None else max_age
+    now = time.monotonic()
+    hit = _CACHE.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+
+    try:
+        version = _read_version(key)
+        reason = "trigger non installato, vedi data/install_data_version.py"
+    except Exception as exc:
+        version, reason = None, str(exc).strip()
+    with _LOCK:
+        _CACHE[key] = (now + max_age, version)
+        was_unknown = key in _UNKNOWN
+        if version is None:
+            _UNKNOWN.add(key)
+        else:
+            _UNKNOWN.discard(key)
+    if version is None and not was_unknown:
+        logging.warning("[data_version] versione di %s su %s sconosciuta (%s): niente cache",
+                        table, key[0], reason)
+    elif version is not None and was_unknown:
+        logging.info("[data_version] versione di %s su %s di nuovo disponibile", table, key[0])
+    return version
+
+
+def invalidate(dbname: str, table: str | None = None):
+    """Scarta le versioni in cache (es. alla ricezione di una NOTIFY)."""
+    with _LOCK:
+        for key in [k for k in _CACHE if k[0] == dbname and (table is None or k[1] == table)]:
+            _CACHE.pop(key, None)
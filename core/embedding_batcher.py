@@ -0,0 +1,123 @@
+# core/embedding_batcher.py
+"""
+Micro-batching degli embedding.
+
+Le richieste singole (get_embedding) arrivano da molti thread in parallelo
+(richieste Flask + EXECUTOR della chat). Invece di lanciare N encode() con
+batch=1, un thread in background raccoglie le richieste concorrenti per pochi
+millisecondi e le codifica insieme in un'unica chiamata.
+
+• submit(text) → Future con l'embedding
+• embed(text)  → attende il risultato (comodo per i chiamanti sincroni)
+"""
+
+from __future__ import annotations
+import logging, queue, threading, time
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+EncodeFn = Callable[[Sequence[str]], List[List[float]]]
+
+_STOP = object()
+
+
+class EmbeddingBatcher:
+    """
+    Raccoglie le richieste di embedding concorrenti e le codifica a blocchi.
+
+    Args:
+        encode_fn: funzione bulk (lista di testi → lista di vettori)
+        max_batch_size: numero massimo di testi per singola encode()
+        max_wait_ms: attesa massima dal primo testo del batch prima di codificare
+    """
+
+    def __init__(self, encode_fn: EncodeFn,
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        self._encode = encode_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[object]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    # ------------------------------------------------------------------ #
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._ensure_thread()
+        self._queue.put((text, fut))
+        return fut
+
+    def embed(self, text: str, timeout: float | None = None) -> List[float]:
+        return self.submit(text).result(timeout=timeout)
+
+    def close(self):
+        """Ferma il thread di background (usato nei test e allo shutdown)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+
+    # ------------------------------------------------------------------ #
+    def _collect(self, first) -> tuple[list, bool]:
+        """
+        Raccoglie altre richieste fino a riempire il batch o scadere l'attesa.
+        Ritorna (batch, stop_richiesto).
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (self._queue.get(timeout=remaining) if remaining > 0
+                        else self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: list):
+        # Testi identici nello stesso batch vengono codificati una sola volta
+        unique: dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        texts = list(unique)
+        try:
+            vecs = self._encode(texts)
+            if len(vecs) != len(texts):
+                raise ValueError(
+                    f"encode_fn ha restituito {len(vecs)} vettori per {len(texts)} testi"
+                )
+        except Exception as exc:
+            logging.error("[embedding_batcher] batch di %d testi fallito: %s", len(texts), exc)
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+
+        logging.debug("[embedding_batcher] batch %d richieste → %d testi",
+                      len(batch), len(texts))
+        for text, fut in batch:
+            if not fut.done():
+                fut.set_result(vecs[unique[text]])
@@ -0,0 +1,167 @@
+# core/embedding_cache.py
+"""
+Cache a due livelli per gli embedding delle query:
+• L1 – LRU in-process (per worker), limitata in dimensione
+• L2 – Redis, condivisa da tutti i worker gunicorn e persistente ai riavvii
+
+Chiave: (provider, modello, testo normalizzato). La normalizzazione tocca
+solo spazi e maiuscole, così "Ramen" e " ramen " puntano alla stessa voce;
+al modello arriva sempre il testo originale (accenti e alias cambiano il
+significato: "mochi" non è "mochi yuzu").
+"""
+
+from __future__ import annotations
+import hashlib, logging, os, re, threading, time
+from array import array
+from typing import Dict, Iterable, List
+
+import redis
+
+from core.lru import LRUCache
+
+EMB_CACHE_ENABLED    = os.getenv("EMB_CACHE_ENABLED", "1") == "1"
+EMB_CACHE_L1_SIZE    = int(os.getenv("EMB_CACHE_L1_SIZE", "4096"))
+EMB_CACHE_L2_ENABLED = os.getenv("EMB_CACHE_L2_ENABLED", "1") == "1"
+EMB_CACHE_L2_TTL     = int(os.getenv("EMB_CACHE_L2_TTL", str(30 * 24 * 3600)))  # 30 giorni
+_L2_RETRY_AFTER      = 30.0   # secondi di pausa dopo un errore Redis
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str | None) -> str:
+    """
+    Chiave di cache per un testo: spazi compressi e minuscole.
+    È la stessa per la cache embedding e per core/search_cache.py.
+    """
+    return _WS_RE.sub(" ", text or "").strip().lower()
+
+
+class EmbeddingCache:
+    """
+    L1 (LRUCache) + L2 (Redis, vettori float32 serializzati).
+    Gli errori Redis non sono mai fatali: la L2 viene sospesa per qualche
+    secondo e la richiesta prosegue come miss.
+    """
+
+    def __init__(self, provider: str, model: str,
+                 l1_size: int = EMB_CACHE_L1_SIZE,
+                 l2_enabled: bool = EMB_CACHE_L2_ENABLED,
+                 l2_ttl: int = EMB_CACHE_L2_TTL,
+                 redis_client: "redis.Redis | None" = None):
+        self.provider = provider
+        self.model = model
+        self.l1 = LRUCache(l1_size)
+        self.l2_enabled = l2_enabled
+        self.l2_ttl = l2_ttl
+        self._redis = redis_client
+        self._redis_lock = threading.Lock()
+        self._l2_down_until = 0.0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    # ------------------------------------------------------------------ #
+    def _l2_key(self, norm: str) -> str:
+        digest = hashlib.sha1(norm.encode("utf-8")).hexdigest()
+        return f"emb:{self.provider}:{self.model}:{digest}"
+
+    def _client(self) -> "redis.Redis | None":
+        if not self.l2_enabled or time.monotonic() < self._l2_down_until:
+            return None
+        if self._redis is None:
+            with self._redis_lock:
+                if self._redis is None:
+                    self._redis = redis.Redis(
+                        host=REDIS_HOST, port=REDIS_PORT,
+                        socket_timeout=0.2, socket_connect_timeout=0.2,
+                    )
+        return self._redis
+
+    def _l2_failed(self, exc: Exception):
+        self.l2_errors += 1
+        self._l2_down_until = time.monotonic() + _L2_RETRY_AFTER
+        logging.warning("[embedding_cache] Redis non disponibile (%s): L2 sospesa per %.0f s",
+                        exc, _L2_RETRY_AFTER)
+
+    # ------------------------------------------------------------------ #
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        Cerca le chiavi (già normalizzate) in L1 e poi in L2.
+        Le voci trovate in L2 vengono promosse in L1.
+        """
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            vec = self.l1.get(key)
+            if vec is not None:
+                found[key] = list(vec)
+            else:
+                missing.append(key)
+
+        client = self._client() if missing else None
+        if client is not None:
+            try:
+                blobs = client.mget([self._l2_key(k) for k in missing])
+            except redis.RedisError as exc:
+                self._l2_failed(exc)
+                blobs = [None] * len(missing)
+            for key, blob in zip(missing, blobs):
+                if blob is None:
+                    self.l2_misses += 1
+                    continue
+                vec = array("f")
+                vec.frombytes(blob)
+                vec = vec.tolist()
+                self.l2_hits += 1
+                self.l1.put(key, tuple(vec))
+                found[key] = vec
+        return found
+
+    def get(self, key: str) -> List[float] | None:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        for key, vec in items.items():
+            self.l1.put(key, tuple(vec))
+
+        client = self._client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, vec in items.items():
+                pipe.set(self._l2_key(key), array("f", vec).tobytes(), ex=self.l2_ttl)
+            pipe.execute()
+        except redis.RedisError as exc:
+            self._l2_failed(exc)
+
+    def put(self, key: str, vec: List[float]):
+        self.put_many({key: vec})
+
+    def clear(self):
+        """Svuota solo la L1 (la L2 è condivisa tra i worker)."""
+        self.l1.clear()
+
+    def stats(self) -> dict:
+        l1 = self.l1.stats()
+        lookups = l1["hits"] + l1["misses"]
+        hits = l1["hits"] + self.l2_hits
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "l1": l1,
+            "l2": {
+                "enabled": self.l2_enabled,
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "errors": self.l2_errors,
+            },
+            "misses": l1["misses"] - self.l2_hits,
+            "evictions": l1["evictions"],
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
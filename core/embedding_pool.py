@@ -0,0 +1,313 @@
+# core/embedding_pool.py
+"""
+Pool di processi per gli embedding (EMBEDDING_EXECUTION=pool).
+
+model.encode() dentro i thread Flask/EXECUTOR serializza sul GIL e rallenta
+anche le richieste che non c'entrano (/getcart). Qui l'encode gira in N
+processi separati, ognuno con il proprio modello:
+
+• il modello viene caricato nel processo padre PRIMA del fork (se lo start
+  method è "fork"), così i worker lo ereditano copy-on-write;
+• ogni worker ha la propria multiprocessing.Queue di richieste (solo i
+  testi); il padre assegna ogni batch al worker con meno batch in corso e
+  sa quindi sempre quali richieste possiede ciascun processo;
+• i vettori tornano in un buffer di memoria condivisa float32 suddiviso in
+  slot (uno per batch in volo): nessuna serializzazione dei risultati;
+• ogni risposta riporta attesa in coda e tempo di encode, esposti in /stats;
+• se un worker muore, tutte le richieste assegnate a lui (in elaborazione o
+  ancora in coda) falliscono subito e i loro slot tornano liberi, invece di
+  aspettare EMB_POOL_TIMEOUT_S; il sostituto parte con una coda nuova;
+• i worker morti sono sostituiti con start method "spawn": il thread di
+  dispatch gira accanto ai thread delle richieste e un fork da lì può
+  ereditare lock presi da altri thread (logging, allocatori, runtime del
+  modello). Per questo le code usano sempre un contesto "spawn", le cui
+  primitive funzionano con entrambi i tipi di processo.
+"""
+
+from __future__ import annotations
+import atexit, itertools, logging, multiprocessing as mp, os, queue, threading, time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from core.embedding_providers import get_provider, provider_class
+
+EMB_POOL_WORKERS      = int(os.getenv("EMB_POOL_WORKERS", "2"))
+EMB_POOL_QUEUE_DEPTH  = int(os.getenv("EMB_POOL_QUEUE_DEPTH", "64"))   # batch in volo (= slot)
+EMB_POOL_TIMEOUT_S    = float(os.getenv("EMB_POOL_TIMEOUT_S", "30"))
+EMB_POOL_START_METHOD = os.getenv(
+    "EMB_POOL_START_METHOD",
+    "fork" if "fork" in mp.get_all_start_methods() else "spawn",
+)
+
+
+def _worker_main(provider_name: str, shm_name: str, shape: tuple, req_q, res_q):
+    """
+    Loop del processo worker: legge (req_id, slot, testi, t_enqueue),
+    scrive i vettori nello slot di memoria condivisa e notifica il padre.
+    """
+    provider = get_provider(provider_name)
+    provider.load()                      # no-op se ereditato dal fork
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buf = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    try:
+        while True:
+            item = req_q.get()
+            if item is None:
+                return
+            req_id, slot, texts, t_enq = item
+            t_start = time.time()
+            try:
+                vecs = provider.encode(texts, batch_size=len(texts))
+                buf[slot, :len(texts), :] = vecs
+                err = None
+            except Exception as exc:              # l'errore torna al chiamante
+                err = repr(exc)
+            res_q.put((req_id, err, t_start - t_enq, time.time() - t_start))
+    finally:
+        del buf
+        shm.close()
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.queue_wait_s = 0.0
+        self.queue_wait_max_s = 0.0
+        self.encode_s = 0.0
+        self.encode_max_s = 0.0
+
+    def add(self, n: int, wait_s: float, enc_s: float, error: bool):
+        with self.lock:
+            self.batches += 1
+            self.texts += n
+            self.errors += int(error)
+            self.queue_wait_s += wait_s
+            self.queue_wait_max_s = max(self.queue_wait_max_s, wait_s)
+            self.encode_s += enc_s
+            self.encode_max_s = max(self.encode_max_s, enc_s)
+
+    def as_dict(self) -> dict:
+        b = self.batches or 1
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "queue_wait_ms_avg": round(self.queue_wait_s / b * 1000, 3),
+            "queue_wait_ms_max": round(self.queue_wait_max_s * 1000, 3),
+            "encode_ms_avg": round(self.encode_s / b * 1000, 3),
+            "encode_ms_max": round(self.encode_max_s * 1000, 3),
+        }
+
+
+class EmbeddingWorkerPool:
+    """
+    Pool di `workers` processi con `queue_depth` slot di memoria condivisa,
+    ognuno grande `max_batch` vettori da `dim` float32.
+    """
+
+    def __init__(self, provider_name: str,
+                 workers: int = EMB_POOL_WORKERS,
+                 queue_depth: int = EMB_POOL_QUEUE_DEPTH,
+                 max_batch: int = 32,
+                 start_method: str = EMB_POOL_START_METHOD,
+                 timeout: float = EMB_POOL_TIMEOUT_S):
+        self.provider_name = provider_name
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self.max_batch = max(1, max_batch)
+        self.dim = provider_class(provider_name).dim
+        self.start_method = start_method
+        self.timeout = timeout
+        self._shape = (self.queue_depth, self.max_batch, self.dim)
+
+        self._ctx = mp.get_context(start_method)
+        self._respawn_ctx = mp.get_context("spawn")     # sostituti: niente fork da thread
+        self._lock = threading.Lock()
+        self._started = False
+        self._closing = False
+        self._ids = itertools.count()
+        self._pending: Dict[int, tuple[Future, int, int, int]] = {}   # id → (fut, slot, n, worker)
+        self._abandoned: set[int] = set()
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._procs: list = []
+        self._req_qs: list = []
+        self._assigned: List[int] = []                  # batch in corso per worker
+        self.stats = _Stats()
+
+    # ------------------------------------------------------------------ #
+    def start(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            if self.start_method == "fork":
+                # modello caricato una volta sola, poi condiviso copy-on-write
+                get_provider(self.provider_name).load()
+
+            nbytes = int(np.prod(self._shape)) * 4
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._buf = np.ndarray(self._shape, dtype=np.float32, buffer=self._shm.buf)
+            self._res_q = self._respawn_ctx.Queue()
+            self._req_qs = [self._respawn_ctx.Queue() for _ in range(self.workers)]
+            self._assigned = [0] * self.workers
+            for slot in range(self.queue_depth):
+                self._free_slots.put(slot)
+            self._procs = [self._spawn(i, self._ctx) for i in range(self.workers)]
+
+            threading.Thread(target=self._dispatch, name="embedding-pool-dispatch",
+                             daemon=True).start()
+            atexit.register(self.close)
+            self._started = True
+            logging.info("[embedding_pool] %d worker (%s, %s) · %d slot × %d × %d",
+                         self.workers, self.provider_name, self.start_method,
+                         self.queue_depth, self.max_batch, self.dim)
+
+    def _spawn(self, index: int, ctx):
+        p = ctx.Process(
+            target=_worker_main,
+            args=(self.provider_name, self._shm.name, self._shape,
+                  self._req_qs[index], self._res_q),
+            name=f"embedding-worker-{index}",
+            daemon=True,
+        )
+        p.start()
+        return p
+
+    def _respawn_dead(self):
+        """
+        Sostituisce i worker morti. Le richieste assegnate a un worker morto
+        falliscono subito (il processo non scriverà più nei loro slot); il
+        sostituto riceve una coda nuova, senza le richieste già fallite.
+        """
+        dead = [i for i, p in enumerate(self._procs) if not p.is_alive()]
+        if not dead or self._closing:
+            return
+        logging.error("[embedding_pool] %d worker terminati: li riavvio", len(dead))
+        for i in dead:
+            with self._lock:
+                lost = [rid for rid, entry in self._pending.items() if entry[3] == i]
+                old_q, self._req_qs[i] = self._req_qs[i], self._respawn_ctx.Queue()
+            old_q.close()
+            old_q.cancel_join_thread()
+            err = f"worker terminato (exitcode {self._procs[i].exitcode})"
+            for req_id in lost:
+                self._complete(req_id, err, 0.0, 0.0)
+            self._procs[i] = self._spawn(i, self._respawn_ctx)
+
+    def _complete(self, req_id: int, err: str | None, wait_s: float, enc_s: float):
+        with self._lock:
+            entry = self._pending.pop(req_id, None)
+            abandoned = req_id in self._abandoned
+            self._abandoned.discard(req_id)
+            if entry is not None:
+                self._assigned[entry[3]] -= 1
+        if entry is None:
+            return
+        fut, slot, n, _ = entry
+        self.stats.add(n, wait_s, enc_s, err is not None)
+        logging.debug("[embedding_pool] batch %d testi · coda %.1f ms · encode %.1f ms",
+                      n, wait_s * 1000, enc_s * 1000)
+        if abandoned:
+            # il chiamante non aspetta più (timeout o errore su un altro blocco)
+            self._free_slots.put(slot)
+        elif err is not None:
+            fut.set_exception(RuntimeError(f"embedding worker: {err}"))
+        else:
+            fut.set_result(None)
+
+    def _dispatch(self):
+        """Thread del padre: smista le notifiche dei worker ai Future in attesa."""
+        checked = time.monotonic()
+        while not self._closing:
+            try:
+                req_id, err, wait_s, enc_s = self._res_q.get(timeout=1.0)
+            except queue.Empty:
+                req_id = None
+            except (EOFError, OSError):
+                return
+            if req_id is not None:
+                self._complete(req_id, err, wait_s, enc_s)
+            if req_id is None or time.monotonic() - checked >= 1.0:
+                checked = time.monotonic()
+                self._respawn_dead()
+
+    # ------------------------------------------------------------------ #
+    def _submit(self, texts: List[str]) -> tuple[int, Future, int]:
+        try:
+            slot = self._free_slots.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("embedding pool saturo (EMB_POOL_QUEUE_DEPTH)") from None
+        req_id = next(self._ids)
+        fut: Future = Future()
+        with self._lock:                         # assegnazione e put insieme: niente respawn in mezzo
+            worker = min(range(self.workers), key=self._assigned.__getitem__)
+            self._assigned[worker] += 1
+            self._pending[req_id] = (fut, slot, len(texts), worker)
+            self._req_qs[worker].put((req_id, slot, texts, time.time()))
+        return req_id, fut, slot
+
+    def _release(self, req_id: int, slot: int):
+        """Restituisce lo slot, o lo lascia al dispatch se il worker ci sta ancora scrivendo."""
+        with self._lock:
+            if req_id in self._pending:
+                self._abandoned.add(req_id)
+                return
+        self._free_slots.put(slot)
+
+    def encode(self, texts: Sequence[str]) -> List[List[float]]:
+        """Codifica i testi nei worker (a blocchi di max_batch), in ordine."""
+        self.start()
+        texts = list(texts)
+        chunks = [texts[i:i + self.max_batch] for i in range(0, len(texts), self.max_batch)]
+        inflight: List[tuple[int, Future, int]] = []
+        out: List[List[float]] = []
+        try:
+            for chunk in chunks:
+                inflight.append(self._submit(chunk))
+            for (req_id, fut, slot), chunk in zip(inflight, chunks):
+                try:
+                    fut.result(timeout=self.timeout)
+                except FutureTimeout:
+                    self.stats.timeouts += 1
+                    raise
+                out.extend(self._buf[slot, :len(chunk), :].tolist())
+        finally:
+            # anche in caso di errore: nessuno slot dei blocchi in volo resta occupato
+            for req_id, _, slot in inflight:
+                self._release(req_id, slot)
+        return out
+
+    def close(self):
+        if not self._started or self._closing:
+            return
+        self._closing = True
+        for q in self._req_qs:
+            q.put(None)
+        for p in self._procs:
+            p.join(timeout=2)
+            if p.is_alive():
+                p.terminate()
+        del self._buf
+        self._shm.close()
+        self._shm.unlink()
+
+    def as_dict(self) -> dict:
+        return {
+            "provider": self.provider_name,
+            "workers": self.workers,
+            "workers_alive": sum(p.is_alive() for p in self._procs),
+            "queue_depth": self.queue_depth,
+            "free_slots": self._free_slots.qsize(),
+            "inflight_per_worker": list(self._assigned),
+            "start_method": self.start_method,
+            **self.stats.as_dict(),
+        }
@@ -0,0 +1,187 @@
+# core/embedding_providers.py
+"""
+Provider di embedding selezionabili con EMBEDDING_PROVIDER.
+
+Le dipendenze pesanti (sentence_transformers/torch, openai) vengono importate
+solo dal provider effettivamente configurato e solo al primo utilizzo:
+create_app() e le rotte che non fanno ricerca semantica (/menu, /cart)
+non pagano il costo di import del modello.
+"""
+
+from __future__ import annotations
+import abc, logging, os, threading, time
+from pathlib import Path
+from typing import Dict, List, Sequence, Type
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "local_cpu")  # local_cpu | local_onnx | openai
+
+# Modello ONNX int8 esportato con tools/export_onnx.py
+_DEFAULT_ONNX_DIR = Path(__file__).resolve().parents[1] / "models" / "all-MiniLM-L6-v2-onnx"
+EMB_ONNX_DIR     = Path(os.getenv("EMB_ONNX_DIR", _DEFAULT_ONNX_DIR))
+EMB_ONNX_FILE    = os.getenv("EMB_ONNX_FILE", "model_int8.onnx")
+EMB_ONNX_THREADS = int(os.getenv("EMB_ONNX_THREADS", "0"))     # 0 = default onnxruntime
+EMB_ONNX_MAX_LEN = int(os.getenv("EMB_ONNX_MAX_LEN", "256"))   # come max_seq_length di SBERT
+
+
+class EmbeddingProvider(abc.ABC):
+    """
+    Interfaccia comune: encode(lista di testi) → lista di vettori normalizzati.
+    Un provider che non implementa _load/_encode non è istanziabile.
+    """
+    name: str = ""
+    model: str = ""
+    dim: int = 0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        """Carica modello/client una sola volta (thread-safe)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                t0 = time.perf_counter()
+                self._load()
+                self._loaded = True
+                logging.info("[embedding_providers] %s pronto in %.2f s",
+                             self.name, time.perf_counter() - t0)
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32) -> List[List[float]]:
+        self.load()
+        return self._encode(list(texts), batch_size)
+
+    # da implementare nei provider concreti
+    @abc.abstractmethod
+    def _load(self):
+        """Carica modello/client (chiamato una sola volta da load())."""
+
+    @abc.abstractmethod
+    def _encode(self, texts: List[str], batch_size: int) -> List[List[float]]:
+        """Vettori normalizzati per `texts`, a blocchi di `batch_size`."""
+
+
+class LocalCpuProvider(EmbeddingProvider):
+    """SentenceTransformers su CPU (gratis, funziona su ogni PC)."""
+    name = "local_cpu"
+    model = "all-MiniLM-L6-v2"
+    dim = 384
+
+    def _load(self):
+        logging.info("Caricamento modello embedding locale (CPU)...")
+        from sentence_transformers import SentenceTransformer
+        # Usa un modello molto leggero ma efficace
+        self._model = SentenceTransformer(self.model)
+
+    def _encode(self, texts: List[str], batch_size: int) -> List[List[float]]:
+        vecs = self._model.encode(texts, batch_size=batch_size,
+                                  normalize_embeddings=True)
+        return vecs.tolist()
+
+
+class LocalOnnxProvider(EmbeddingProvider):
+    """
+    Stesso all-MiniLM-L6-v2 di local_cpu, esportato in ONNX e quantizzato int8,
+    eseguito con onnxruntime su CPU (niente PyTorch in memoria).
+    Pipeline identica a SBERT: tokenizer → transformer → mean pooling → L2.
+    """
+    name = "local_onnx"
+    model = "all-MiniLM-L6-v2"
+    dim = 384
+
+    def _load(self):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = EMB_ONNX_DIR / EMB_ONNX_FILE
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"Modello ONNX non trovato in {model_path}: eseguire tools/export_onnx.py"
+            )
+        logging.info("Caricamento modello embedding ONNX int8 (%s)...", model_path)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMB_ONNX_THREADS > 0:
+            opts.intra_op_num_threads = EMB_ONNX_THREADS
+        self._session = ort.InferenceSession(str(model_path), sess_options=opts,
+                                             providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(str(EMB_ONNX_DIR / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=EMB_ONNX_MAX_LEN)
+        self._tokenizer.enable_padding()
+        self._np = np
+
+    def _encode(self, texts: List[str], batch_size: int) -> List[List[float]]:
+        np = self._np
+        out: List[List[float]] = []
+        for i in range(0, len(texts), batch_size):
+            enc = self._tokenizer.encode_batch(texts[i:i + batch_size])
+            ids  = np.asarray([e.ids for e in enc], dtype=np.int64)
+            mask = np.asarray([e.attention_mask for e in enc], dtype=np.int64)
+            feed = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._inputs:
+                feed["token_type_ids"] = np.asarray([e.type_ids for e in enc], dtype=np.int64)
+            feed = {k: v for k, v in feed.items() if k in self._inputs}
+
+            hidden = self._session.run(None, feed)[0]            # (B, T, dim)
+            m = mask[..., None].astype(np.float32)
+            pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.extend(pooled.tolist())
+        return out
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """API OpenAI (richiede OPENAI_API_KEY)."""
+    name = "openai"
+    model = "text-embedding-3-small"
+    dim = 1536
+
+    def _load(self):
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY mancante")
+        import openai
+        self._client = openai.Client(api_key=api_key)
+
+    def _encode(self, texts: List[str], batch_size: int) -> List[List[float]]:
+        # l'endpoint accetta già una lista di input
+        resp = self._client.embeddings.create(input=texts, model=self.model)
+        data = sorted(resp.data, key=lambda d: d.index)
+        return [d.embedding for d in data]
+
+
+_PROVIDERS: Dict[str, Type[EmbeddingProvider]] = {
+    LocalCpuProvider.name: LocalCpuProvider,
+    LocalOnnxProvider.name: LocalOnnxProvider,
+    OpenAIProvider.name:   OpenAIProvider,
+}
+
+_INSTANCES: Dict[str, EmbeddingProvider] = {}
+_INSTANCES_LOCK = threading.Lock()
+
+
+def provider_class(name: str | None = None) -> Type[EmbeddingProvider]:
+    """Classe del provider richiesto (default: EMBEDDING_PROVIDER), senza istanziarlo."""
+    name = name or EMBEDDING_PROVIDER
+    try:
+        return _PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"EMBEDDING_PROVIDER sconosciuto: {name!r} "
+                         f"(validi: {sorted(_PROVIDERS)})") from None
+
+
+def get_provider(name: str | None = None) -> EmbeddingProvider:
+    """Istanza singleton del provider (il modello si carica al primo encode)."""
+    name = name or EMBEDDING_PROVIDER
+    inst = _INSTANCES.get(name)
+    if inst is None:
+        with _INSTANCES_LOCK:
+            inst = _INSTANCES.get(name)
+            if inst is None:
+                inst = _INSTANCES[name] = provider_class(name)()
+    return inst
@@ -0,0 +1,28 @@
+# core/embedding_texts.py
+"""
+Testi da cui vengono calcolati gli embedding salvati nel DB.
+Condivisi tra i loader (data/) e gli strumenti di verifica (tools/),
+così un confronto tra backend usa esattamente lo stesso input.
+"""
+
+from __future__ import annotations
+from typing import Iterable
+
+
+def menu_text(name: str | None, dish_type: str | None,
+              description: str | None, ingredients: Iterable[str] | None) -> str:
+    """Testo di un piatto: nome | tipo | descrizione | ingredienti."""
+    return " | ".join([
+        name or "",
+        dish_type or "",
+        description or "",
+        ", ".join(ingredients or []),
+    ])
+
+
+def review_text(recensione: str, piatti: str | None) -> str:
+    """Testo di una recensione, con la lista piatti (serializzata) in coda."""
+    txt = recensione
+    if piatti:
+        txt += " | Piatti: " + piatti
+    return txt
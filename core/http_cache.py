@@ -0,0 +1,93 @@
+# core/http_cache.py
+"""
+Risposte JSON precalcolate per le GET che i frontend interrogano di continuo
+(/menu, /ingredienti) e che cambiano solo quando cambia il menu.
+
+• corpo serializzato (e, se richiesto, compresso gzip) una volta per
+  tenant + chiave (es. tipo di piatto) + versione dei dati della tabella
+  (core/data_version.py): una nuova versione rende irraggiungibili le
+  voci vecchie, che escono per LRU;
+• ETag forte sul contenuto; If-None-Match → 304 senza corpo;
+• Cache-Control: no-cache → il client rivalida a ogni poll (304 se invariato);
+• versione sconosciuta (get_version → None) → corpo ricalcolato, niente ETag.
+
+Contatori hit/miss in /stats (http_cache).
+"""
+
+from __future__ import annotations
+import gzip, hashlib, os
+from typing import Any, Callable, Hashable
+
+from flask import Response, current_app, request
+
+from core.data_version import get_version
+from core.db_router import get_current_db
+from core.lru import LRUCache
+
+HTTP_CACHE_SIZE      = int(os.getenv("HTTP_CACHE_SIZE", "512"))
+HTTP_GZIP_MIN_BYTES  = int(os.getenv("HTTP_GZIP_MIN_BYTES", "1024"))   # 0 = gzip disattivato
+_GZIP_LEVEL = 6
+
+_CACHE = LRUCache(HTTP_CACHE_SIZE)
+
+
+class CachedBody:
+    """Corpo JSON serializzato, ETag e variante gzip (calcolata al primo uso)."""
+
+    __slots__ = ("body", "etag", "_gzip")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self._gzip: bytes | None = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.body, compresslevel=_GZIP_LEVEL, mtime=0)
+        return self._gzip
+
+
+def _accepts_gzip() -> bool:
+    return (HTTP_GZIP_MIN_BYTES > 0
+            and "gzip" in request.accept_encodings
+            and request.accept_encodings["gzip"] > 0)
+
+
+def cached_json_response(table: str, key: Hashable,
+                         build: Callable[[], Any]) -> Response:
+    """
+    Risposta 200/304 per `build()` (payload JSON), in cache per tenant,
+    `key` e versione di `table`. `build` gira solo ai miss.
+    """
+    version = get_version(table)
+    if version is None:
+        resp = Response(current_app.json.dumps(build()), mimetype="application/json")
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+    cache_key = (get_current_db(), table, version, key)
+    entry = _CACHE.get(cache_key)
+    if entry is None:
+        entry = CachedBody(current_app.json.dumps(build()).encode("utf-8"))
+        _CACHE.put(cache_key, entry)
+
+    use_gzip = _accepts_gzip() and len(entry.body) >= HTTP_GZIP_MIN_BYTES
+    # ETag diverso per variante: i proxy non devono scambiare i due corpi
+    etag = entry.etag + ("-gz" if use_gzip else "")
+    # weak: un proxy che ricomprime può inoltrare W/"..." (confronto debole, RFC 9110)
+    inm = request.if_none_match
+    if inm.contains_weak(entry.etag) or inm.contains_weak(entry.etag + "-gz"):
+        resp = Response(status=304)
+    else:
+        resp = Response(entry.gzipped if use_gzip else entry.body, mimetype="application/json")
+        if use_gzip:
+            resp.headers["Content-Encoding"] = "gzip"
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+
+def http_cache_stats() -> dict:
+    return {"gzip_min_bytes": HTTP_GZIP_MIN_BYTES, **_CACHE.stats()}
@@ -0,0 +1,106 @@
+# core/lru.py
+"""
+Cache LRU thread-safe, limitata in dimensione e con TTL opzionale.
+Tiene i contatori hit/miss/eviction per esporli nelle statistiche.
+on_evict(key, value), se impostato, è chiamato (fuori dal lock) per ogni
+voce che esce dalla cache: eviction, scadenza, pop() o clear().
+"""
+
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Dizionario LRU: oltre `maxsize` elementi scarta il meno usato di recente.
+    Se `ttl` (secondi) è impostato, le voci scadute contano come miss.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None,
+                 on_evict: Callable[[Hashable, Any], None] | None = None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _notify(self, removed: List[Tuple[Hashable, Any]]):
+        if self.on_evict is not None:
+            for key, value in removed:
+                self.on_evict(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            ts, value = entry
+            if self.ttl is None or time.monotonic() - ts <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+        self._notify([(key, value)])
+        return default
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """Inserisce/aggiorna `key`; True se la chiave non era in cache."""
+        removed = []
+        with self._lock:
+            new = key not in self._data
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                old_key, (_, old_value) = self._data.popitem(last=False)
+                removed.append((old_key, old_value))
+                self.evictions += 1
+        self._notify(removed)
+        return new
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        self._notify([(key, entry[1])])
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            removed = [(k, v) for k, (_, v) in self._data.items()]
+            self._data.clear()
+        self._notify(removed)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Copia delle voci (dalla meno recente), senza toccare l'ordine LRU né i contatori."""
+        with self._lock:
+            return [(k, v) for k, (_, v) in self._data.items()]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,245 @@
+# core/pg_listener.py
+"""
+LISTEN/NOTIFY sul canale `data_version` (vedi core/data_version.py).
+
+I trigger di versione mandano pg_notify('data_version', '<tabella>') a ogni
+scrittura su menu/recensioni/prompt. NOTIFY vale per un solo database: il listener
+tiene una connessione dedicata (autocommit, fuori dai pool) per ogni tenant
+sottoscritto e un unico thread che le attende tutte con select().
+
+• subscribe(db) / unsubscribe(db): i moduli con cache per tenant
+  sottoscrivono solo i tenant che hanno in memoria; le sottoscrizioni
+  sono contate, la connessione si chiude all'ultimo unsubscribe (menu
+  snapshot e prompt_store possono seguire lo stesso tenant);
+• add_callback(fn): fn(dbname, table) per ogni notifica; table=None dopo
+  una (ri)connessione, quando eventuali notifiche possono essere andate perse;
+• ogni notifica invalida anche la versione in cache di data_version, così
+  indice menu e cache dei risultati si aggiornano senza attendere il TTL.
+
+Le connessioni LISTEN contano nel budget PG_GLOBAL_MAX_CONN dei pool
+(core/pg_pool.py) e sono al massimo PG_LISTEN_MAX_CONN: oltre il tetto, o con
+il budget esaurito, il tenant resta senza LISTEN (riprova ogni
+PG_LISTEN_RETRY_S) e le sue cache si aggiornano con i propri TTL.
+
+Se Postgres non è raggiungibile il listener riprova ogni PG_LISTEN_RETRY_S:
+nel frattempo le cache restano valide fino ai propri TTL.
+"""
+
+from __future__ import annotations
+import logging, os, select, threading, time
+from typing import Callable, Dict, List
+
+import psycopg2
+
+from core import data_version
+from core.pg_pool import ConnectionBudget
+from core.vector_client import _PG_STATIC, _REGISTRY
+
+PG_LISTEN_ENABLED  = os.getenv("PG_LISTEN_ENABLED", "1") == "1"
+PG_LISTEN_RETRY_S  = float(os.getenv("PG_LISTEN_RETRY_S", "5"))
+PG_LISTEN_MAX_CONN = int(os.getenv("PG_LISTEN_MAX_CONN", "16"))   # per processo
+
+Callback = Callable[[str, "str | None"], None]
+
+
+class PgListener:
+    """Un thread, una connessione LISTEN per tenant sottoscritto."""
+
+    def __init__(self, channel: str = data_version.NOTIFY_CHANNEL,
+                 connect_kwargs: dict | None = None, poll_s: float = 1.0,
+                 budget: ConnectionBudget | None = None,
+                 max_conns: int = PG_LISTEN_MAX_CONN):
+        self.channel = channel
+        self.connect_kwargs = connect_kwargs or _PG_STATIC
+        self.poll_s = poll_s
+        self.budget = budget if budget is not None else _REGISTRY.budget
+        self.max_conns = max(0, max_conns)
+        self._conns: Dict[str, "psycopg2.extensions.connection"] = {}
+        self._pending: Dict[str, float] = {}            # db → prossimo tentativo (monotonic)
+        self._deferred: set[str] = set()                # in attesa di un posto (solo TTL)
+        self._refs: Dict[str, int] = {}                 # db → sottoscrizioni attive
+        self._callbacks: List[Callback] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.notifications = 0
+        self.reconnects = 0
+
+    # ── API ───────────────────────────────────────────────────────────
+    def add_callback(self, fn: Callback):
+        with self._lock:
+            if fn not in self._callbacks:
+                self._callbacks.append(fn)
+
+    def subscribe(self, dbname: str):
+        """Una sottoscrizione in più per `dbname` (ognuna va chiusa con unsubscribe)."""
+        with self._lock:
+            self._refs[dbname] = self._refs.get(dbname, 0) + 1
+            if dbname not in self._conns and dbname not in self._pending:
+                self._pending[dbname] = 0.0
+        self._ensure_thread()
+
+    def unsubscribe(self, dbname: str):
+        with self._lock:
+            refs = self._refs.get(dbname, 0) - 1
+            if refs > 0:
+                self._refs[dbname] = refs
+                return
+            self._refs.pop(dbname, None)
+            self._pending.pop(dbname, None)
+            self._deferred.discard(dbname)
+            conn = self._conns.pop(dbname, None)
+        if conn is not None:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": PG_LISTEN_ENABLED,
+                "channel": self.channel,
+                "listening": sorted(self._conns),
+                "pending": sorted(self._pending),
+                "ttl_only": sorted(self._deferred),
+                "subscriptions": dict(self._refs),
+                "max_conns": self.max_conns,
+                "notifications": self.notifications,
+                "reconnects": self.reconnects,
+            }
+
+    # ── thread ────────────────────────────────────────────────────────
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="pg-listener", daemon=True)
+                self._thread.start()
+
+    def _reserve(self, db: str, now: float) -> bool:
+        """Posto per una nuova connessione: tetto del listener e budget globale."""
+        first = False
+        with self._lock:
+            ok = len(self._conns) < self.max_conns and self.budget.try_acquire()
+            if not ok and db in self._pending:
+                self._pending[db] = now + PG_LISTEN_RETRY_S
+                first = db not in self._deferred
+                self._deferred.add(db)
+        if not ok and first:
+            logging.info("[pg_listener] %s senza LISTEN (PG_LISTEN_MAX_CONN %d o budget "
+                         "connessioni esaurito): cache aggiornate solo dai TTL",
+                         db, self.max_conns)
+        return ok
+
+    def _close(self, conn):
+        _close_quietly(conn)
+        self.budget.release()
+
+    def _connect_pending(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [db for db, at in self._pending.items() if at <= now]
+        for db in due:
+            if not self._reserve(db, now):
+                continue
+            conn = None
+            try:
+                conn = psycopg2.connect(dbname=db, **self.connect_kwargs)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+            except psycopg2.Error as exc:
+                if conn is not None:                   # connessa ma LISTEN fallito
+                    _close_quietly(conn)
+                self.budget.release()
+                logging.warning("[pg_listener] LISTEN su %s fallito: %s (riprovo tra %.0f s)",
+                                db, exc, PG_LISTEN_RETRY_S)
+                with self._lock:
+                    if db in self._pending:
+                        self._pending[db] = now + PG_LISTEN_RETRY_S
+                continue
+            with self._lock:
+                if db not in self._pending:            # unsubscribe nel frattempo
+                    self._close(conn)
+                    continue
+                del self._pending[db]
+                self._deferred.discard(db)
+                self._conns[db] = conn
+            logging.info("[pg_listener] in ascolto su %s (canale %s)", db, self.channel)
+            self._dispatch(db, None)                   # notifiche perse prima del LISTEN
+
+    def _dispatch(self, dbname: str, table: str | None):
+        data_version.invalidate(dbname, table)
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for fn in callbacks:
+            try:
+                fn(dbname, table)
+            except Exception as exc:
+                logging.warning("[pg_listener] callback %s fallita: %s", fn, exc)
+
+    def _drain(self, dbname: str, conn):
+        try:
+            conn.poll()
+        except psycopg2.Error as exc:
+            logging.warning("[pg_listener] connessione LISTEN su %s persa: %s", dbname, exc)
+            with self._lock:
+                if self._conns.get(dbname) is conn:
+                    del self._conns[dbname]
+                    self._pending[dbname] = time.monotonic() + PG_LISTEN_RETRY_S
+                    self.reconnects += 1
+                    owned = True
+                else:
+                    owned = False                      # già chiusa (e rilasciata) da unsubscribe
+            if owned:
+                self._close(conn)
+            return
+        tables = set()
+        while conn.notifies:
+            tables.add(conn.notifies.pop(0).payload or None)
+        for table in tables:                           # notifiche dello stesso statement unite
+            self.notifications += 1
+            self._dispatch(dbname, table)
+
+    def _loop(self):
+        while True:
+            self._connect_pending()
+            with self._lock:
+                conns = dict(self._conns)
+            if not conns:
+                time.sleep(self.poll_s)
+                continue
+            by_fd = {c.fileno(): (db, c) for db, c in conns.items() if not c.closed}
+            try:
+                ready, _, _ = select.select(list(by_fd), [], [], self.poll_s)
+            except (OSError, ValueError):               # connessione chiusa da unsubscribe
+                continue
+            for fd in ready:
+                self._drain(*by_fd[fd])
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# ───────────────────────────────────────────────────────────────────
+_LISTENER: PgListener | None = None
+_GUARD = threading.Lock()
+
+
+def get_listener() -> PgListener | None:
+    """Listener di processo (None con PG_LISTEN_ENABLED=0)."""
+    global _LISTENER
+    if not PG_LISTEN_ENABLED:
+        return None
+    if _LISTENER is None:
+        with _GUARD:
+            if _LISTENER is None:
+                _LISTENER = PgListener()
+    return _LISTENER
+
+
+def pg_listener_stats() -> dict:
+    listener = get_listener()
+    return listener.stats() if listener else {"enabled": False}
@@ -0,0 +1,411 @@
+# core/pg_pool.py
+"""
+Pool di connessioni PostgreSQL thread-safe, uno per tenant (database).
+
+Sostituisce psycopg2 SimpleConnectionPool (non thread-safe) condiviso dai
+thread Flask/EXECUTOR:
+• getconn() attende al massimo `acquire_timeout` e poi solleva PoolTimeout
+  (invece di PoolError immediato quando il pool è esaurito);
+• le connessioni rimaste inattive a lungo vengono verificate (SELECT 1)
+  prima di essere riconsegnate, quelle rotte vengono scartate;
+• putconn() fa rollback delle transazioni lasciate aperte;
+• metriche: connessioni in uso, in attesa e latenza di acquisizione.
+
+Dimensione configurabile per tenant (PG_POOL_SIZES) così un ristorante
+molto attivo non esaurisce le connessioni degli altri.
+
+Con centinaia di ristoranti (un DB ciascuno) serve anche un tetto globale:
+PoolRegistry tiene un budget di connessioni condiviso da tutti i pool, che
+crescono pigramente da 0; quando il budget è esaurito chiude le connessioni
+inattive dei tenant usati meno di recente (LRU) per fare spazio.
+"""
+
+from __future__ import annotations
+import logging, os, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+import psycopg2, psycopg2.extensions
+from psycopg2.pool import PoolError
+
+
+def parse_kv(raw: str | None) -> Dict[str, str]:
+    """'a=1,b=2' → {'a': '1', 'b': '2'} (voci malformate ignorate)."""
+    out: Dict[str, str] = {}
+    for part in (raw or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            if k.strip():
+                out[k.strip()] = v.strip()
+    return out
+
+
+PG_POOL_MIN             = int(os.getenv("PG_POOL_MIN", "0"))       # pool pigri
+PG_GLOBAL_MAX_CONN      = int(os.getenv("PG_GLOBAL_MAX_CONN", "80"))  # per processo
+PG_POOL_MAX             = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_SIZES           = {k: int(v) for k, v in parse_kv(os.getenv("PG_POOL_SIZES")).items()}
+PG_POOL_ACQUIRE_TIMEOUT = float(os.getenv("PG_POOL_ACQUIRE_TIMEOUT", "5"))
+PG_POOL_HEALTHCHECK_S   = float(os.getenv("PG_POOL_HEALTHCHECK_S", "30"))
+
+# statement_timeout (ms) per classe di query, applicato con SET LOCAL
+PG_STATEMENT_TIMEOUTS: Dict[str, int] = {
+    "default": 10000,
+    "search":  3000,
+    "list":    5000,
+    "write":   5000,
+    **{k: int(v) for k, v in parse_kv(os.getenv("PG_STATEMENT_TIMEOUTS")).items()},
+}
+
+
+def statement_timeout_ms(query_class: str | None) -> int:
+    return PG_STATEMENT_TIMEOUTS.get(query_class or "default",
+                                     PG_STATEMENT_TIMEOUTS["default"])
+
+
+class PoolTimeout(PoolError):
+    """Nessuna connessione disponibile entro acquire_timeout."""
+
+
+class ConnectionBudget:
+    """Contatore globale delle connessioni aperte da tutti i pool del processo."""
+
+    def __init__(self, limit: int = PG_GLOBAL_MAX_CONN):
+        self.limit = max(1, limit)
+        self._used = 0
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._used >= self.limit:
+                self.denied += 1
+                return False
+            self._used += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._used = max(0, self._used - 1)
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connessione psycopg2 con qualche attributo di servizio per il pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_last_used = time.monotonic()
+        self.prepared: set[str] = set()    # statement preparati su questa sessione
+        self.prepared_stale = False        # dopo un errore: DEALLOCATE ALL al prossimo uso
+
+
+class TenantPool:
+    """
+    Pool thread-safe per un singolo database.
+
+    Args:
+        dbname: database del tenant
+        minconn / maxconn: connessioni aperte all'avvio / massimo consentito
+        connect_kwargs: credenziali psycopg2 (user, password, host, port)
+        acquire_timeout: attesa massima di getconn() in secondi
+        connect_fn: factory di connessioni (default psycopg2.connect)
+        budget: budget globale condiviso (None = nessun tetto globale)
+        make_room: callback che libera posti nel budget (eviction LRU)
+    """
+
+    def __init__(self, dbname: str,
+                 minconn: int = PG_POOL_MIN,
+                 maxconn: int = PG_POOL_MAX,
+                 connect_kwargs: Dict[str, Any] | None = None,
+                 acquire_timeout: float = PG_POOL_ACQUIRE_TIMEOUT,
+                 healthcheck_after: float = PG_POOL_HEALTHCHECK_S,
+                 connect_fn: Callable[[], Any] | None = None,
+                 budget: ConnectionBudget | None = None,
+                 make_room: Callable[["TenantPool"], bool] | None = None):
+        self.dbname = dbname
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_after = healthcheck_after
+        self._connect_kwargs = dict(connect_kwargs or {})
+        self._connect_fn = connect_fn or self._default_connect
+        self._budget = budget
+        self._make_room = make_room
+        self.last_used = time.monotonic()
+
+        self._cond = threading.Condition()
+        self._idle: list = []          # connessioni libere (LIFO)
+        self._size = 0                 # aperte + in apertura
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+
+        # metriche
+        self.acquires = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.acquire_s_total = 0.0
+        self.acquire_s_max = 0.0
+
+        for _ in range(self.minconn):
+            if not self._reserve_budget():
+                break
+            with self._cond:
+                self._size += 1
+            conn = self._open()
+            with self._cond:
+                self._idle.append(conn)
+
+    # ------------------------------------------------------------------ #
+    def _default_connect(self):
+        return psycopg2.connect(dbname=self.dbname,
+                                connection_factory=PooledConnection,
+                                **self._connect_kwargs)
+
+    def _reserve_budget(self) -> bool:
+        return self._budget is None or self._budget.try_acquire()
+
+    def _release_budget(self):
+        if self._budget is not None:
+            self._budget.release()
+
+    def _open(self):
+        """Apre una connessione per un posto già riservato (_size e budget)."""
+        try:
+            conn = self._connect_fn()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._release_budget()
+                self._cond.notify()
+            raise
+        if not hasattr(conn, "pool_last_used"):
+            conn.pool_last_used = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        """Chiude una connessione e libera il suo posto nel pool (lock già preso)."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._size -= 1
+        self._release_budget()
+        self.discarded += 1
+        self._cond.notify()
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.pool_last_used < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as exc:
+            logging.warning("[pg_pool] %s: connessione non valida scartata (%s)",
+                            self.dbname, exc)
+            return False
+
+    # ------------------------------------------------------------------ #
+    def getconn(self, timeout: float | None = None):
+        """
+        Restituisce una connessione sana; attende fino a `timeout`
+        (default acquire_timeout) se il pool è al massimo.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        t0 = time.monotonic()
+        deadline = t0 + timeout
+        self.last_used = t0
+        while True:
+            conn, must_open, need_room = None, False, False
+            with self._cond:
+                if self._closed:
+                    raise PoolError("pool chiuso")
+                while not self._idle and self._size >= self.maxconn:
+                    self._wait_or_timeout(deadline, timeout)
+                if self._idle:
+                    conn = self._idle.pop()
+                elif self._reserve_budget():
+                    self._size += 1          # riserva il posto prima di connettersi
+                    must_open = True
+                else:
+                    need_room = True
+
+            if need_room:
+                # budget globale esaurito: prova a chiudere connessioni inattive
+                # di altri tenant (fuori dal lock, per evitare deadlock tra pool)
+                if self._make_room is None or not self._make_room(self):
+                    with self._cond:
+                        self._wait_or_timeout(deadline, timeout, slice_s=0.05)
+                continue
+            if must_open:
+                conn = self._open()
+            elif not self._healthy(conn):
+                with self._cond:
+                    self._discard(conn)
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                waited = time.monotonic() - t0
+                self.acquires += 1
+                self.acquire_s_total += waited
+                self.acquire_s_max = max(self.acquire_s_max, waited)
+            return conn
+
+    def _wait_or_timeout(self, deadline: float, timeout: float,
+                         slice_s: float | None = None):
+        """Attende una riconsegna (lock già preso) o solleva PoolTimeout."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.timeouts += 1
+            raise PoolTimeout(
+                f"nessuna connessione libera per {self.dbname} "
+                f"entro {timeout:.1f}s (max {self.maxconn})"
+            )
+        self._waiters += 1
+        try:
+            self._cond.wait(remaining if slice_s is None else min(slice_s, remaining))
+        finally:
+            self._waiters -= 1
+
+    def putconn(self, conn, close: bool = False):
+        """Riconsegna la connessione (rollback se in transazione)."""
+        broken = close or conn.closed
+        if not broken:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            self._in_use -= 1
+            if broken or self._closed:
+                self._discard(conn)
+                return
+            conn.pool_last_used = time.monotonic()
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator[Any]:
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close_idle(self, limit: int | None = None) -> int:
+        """Chiude fino a `limit` connessioni inattive (le più vecchie prima)."""
+        closed = 0
+        with self._cond:
+            while self._idle and (limit is None or closed < limit):
+                self._discard(self._idle.pop(0))
+                closed += 1
+        return closed
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                self._discard(conn)
+            self._idle.clear()
+
+    # ------------------------------------------------------------------ #
+    def stats(self) -> dict:
+        with self._cond:
+            n = self.acquires or 1
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "acquires": self.acquires,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "acquire_ms_avg": round(self.acquire_s_total / n * 1000, 3),
+                "acquire_ms_max": round(self.acquire_s_max * 1000, 3),
+            }
+
+
+def pool_size_for(dbname: str) -> int:
+    """Massimo connessioni per il tenant (override in PG_POOL_SIZES)."""
+    return PG_POOL_SIZES.get(dbname, PG_POOL_MAX)
+
+
+class PoolRegistry:
+    """
+    Pool per tenant con budget globale di connessioni e eviction LRU.
+
+    I pool nascono vuoti (minconn 0) e crescono su richiesta. Se il budget è
+    esaurito, make_room() chiude le connessioni inattive dei tenant usati meno
+    di recente. Un pool svuotato resta registrato (costa solo qualche byte)
+    così chi ne tiene un riferimento continua a condividere lo stesso budget.
+    """
+
+    def __init__(self, connect_kwargs: Dict[str, Any] | None = None,
+                 budget: int = PG_GLOBAL_MAX_CONN,
+                 pool_factory: Callable[..., TenantPool] = TenantPool):
+        self.budget = ConnectionBudget(budget)
+        self._connect_kwargs = dict(connect_kwargs or {})
+        self._pool_factory = pool_factory
+        self._pools: "OrderedDict[str, TenantPool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_connections = 0
+
+    def get(self, dbname: str) -> TenantPool:
+        with self._lock:
+            pool = self._pools.get(dbname)
+            if pool is None:
+                pool = self._pools[dbname] = self._pool_factory(
+                    dbname,
+                    maxconn=pool_size_for(dbname),
+                    connect_kwargs=self._connect_kwargs,
+                    budget=self.budget,
+                    make_room=self.make_room,
+                )
+                logging.debug("[pg_pool] pool pronto per %s (max %d, budget %d)",
+                              dbname, pool.maxconn, self.budget.limit)
+            else:
+                self._pools.move_to_end(dbname)       # più recente in coda
+            return pool
+
+    def make_room(self, requester: TenantPool) -> bool:
+        """
+        Libera una connessione inattiva dal tenant meno recente (≠ requester).
+        Ritorna True se almeno un posto del budget è stato liberato.
+        """
+        with self._lock:
+            candidates = [p for p in self._pools.values() if p is not requester]
+        for pool in candidates:                      # ordine LRU
+            if pool.close_idle(limit=1):
+                self.evicted_connections += 1
+                logging.debug("[pg_pool] budget pieno: chiusa connessione inattiva di %s",
+                              pool.dbname)
+                return True
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = list(self._pools.items())
+        per_pool = {db: pool.stats() for db, pool in pools}
+        return {
+            "budget": {
+                "limit": self.budget.limit,
+                "used": self.budget.used,
+                "denied": self.budget.denied,
+                "evicted_connections": self.evicted_connections,
+                "tenants": len(pools),
+                "tenants_connected": sum(1 for st in per_pool.values() if st["size"]),
+            },
+            "pools": per_pool,
+        }
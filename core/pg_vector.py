@@ -0,0 +1,52 @@
+# core/pg_vector.py
+"""
+Adattatore psycopg2 per i parametri pgvector.
+
+psycopg2 parla solo il protocollo testuale (niente parametri binari), quindi
+il vettore arriva comunque a Postgres come letterale '[..]'. Quello che si
+può togliere è il costo lato Python: invece di un f-string per ogni float,
+VectorParam usa una stringa di formato precompilata per dimensione
+(un solo `%` su una tupla) e l'adattatore registrato la inserisce già
+castata a ::vector.
+
+    cur.execute("SELECT … embedding <=> %s …", (VectorParam(emb),))
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Sequence
+
+from psycopg2.extensions import AsIs, register_adapter
+
+# %.8g: float32 ha ~7,2 cifre significative, 8 bastano per il round trip
+_FLOAT_FMT = "%.8g"
+
+
+@lru_cache(maxsize=8)
+def _vector_format(dim: int) -> str:
+    return "'[" + ",".join([_FLOAT_FMT] * dim) + "]'::vector"
+
+
+class VectorParam:
+    """Embedding da passare come parametro di query (lista, tupla o array numpy)."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Sequence[float]):
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def literal(self) -> str:
+        vals = self.values
+        if hasattr(vals, "tolist"):              # numpy → float Python
+            vals = vals.tolist()
+        return _vector_format(len(vals)) % tuple(vals)
+
+
+def _adapt_vector(v: VectorParam) -> AsIs:
+    return AsIs(v.literal())
+
+
+register_adapter(VectorParam, _adapt_vector)
@@ -0,0 +1,285 @@
+# core/prompt_budget.py
+"""
+Budget di token per le sezioni variabili del system prompt.
+────────────────────────────────────────────────────────────────────
+chat_service inserisce nel prompt piatti confermati, carrello, recensioni
+e cronologia: senza un tetto il prefill su vLLM (e quindi il tempo al
+primo token) cresce con la conversazione. Qui, per ogni sezione:
+
+• i token sono contati con il tokenizer del modello servito
+  (LLM_TOKENIZER: tokenizer.json locale, libreria `tokenizers`); senza
+  tokenizer si usa una stima per caratteri (PROMPT_CHARS_PER_TOKEN);
+• il costo di un item è quello della sua riga resa dal template compilato
+  (core/prompt_template.py), cioè il testo che finirà davvero nel prompt;
+• oltre budget: prima si accorciano i campi descrittivi degli item con
+  score più basso, poi si scartano quegli item (il carrello non perde mai
+  prodotti: solo descrizioni e ingredienti);
+• cronologia: si tengono i messaggi più recenti, a partire da un turno
+  utente (i chat template come quello di Gemma vogliono user/assistant
+  alternati).
+
+Token per sezione nei log (debug) e, aggregati, in /stats (prompt_budget).
+"""
+
+from __future__ import annotations
+import logging, math, os, threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+from core.pg_pool import parse_kv
+from core.prompt_template import PreparedPrompt, prepare_prompt
+
+LLM_TOKENIZER          = os.getenv("LLM_TOKENIZER", "")      # file tokenizer.json o cartella che lo contiene
+PROMPT_BUDGET_ENABLED  = os.getenv("PROMPT_BUDGET_ENABLED", "1") == "1"
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "3.5"))
+PROMPT_TRUNCATE_TOKENS = int(os.getenv("PROMPT_TRUNCATE_TOKENS", "40"))
+# token per sezione; 0 = nessun limite
+PROMPT_BUDGETS: Dict[str, int] = {
+    "menu": 1200, "cart": 1500, "reviews": 1200, "history": 6000,
+    **{k: int(v) for k, v in parse_kv(os.getenv("PROMPT_BUDGETS")).items()},
+}
+
+# sezione → (loop nel template, campi accorciabili, item scartabili)
+_SECTIONS = {
+    "menu":    ("menu",          ("description",),                True),
+    "cart":    ("products_cart", ("description", "ingredients"),  False),
+    "reviews": ("reviews",       ("snippet",),                    True),
+}
+
+
+# ───────────────────────────────────────────────────────────────────
+# Tokenizer (caricato una volta, al primo uso)
+_TOKENIZER: Any = None
+_TOKENIZER_LOADED = False
+_LOCK = threading.Lock()
+
+
+def _get_tokenizer():
+    global _TOKENIZER, _TOKENIZER_LOADED
+    if _TOKENIZER_LOADED:
+        return _TOKENIZER
+    with _LOCK:
+        if not _TOKENIZER_LOADED:
+            path = Path(LLM_TOKENIZER) if LLM_TOKENIZER else None
+            if path is not None and path.is_dir():
+                path = path / "tokenizer.json"
+            if path is None:
+                logging.info("[prompt_budget] LLM_TOKENIZER non impostato: stima %.1f caratteri/token",
+                             PROMPT_CHARS_PER_TOKEN)
+            else:
+                try:
+                    from tokenizers import Tokenizer
+                    _TOKENIZER = Tokenizer.from_file(str(path))
+                    _TOKENIZER.no_truncation()           # tokenizer.json può averla attiva
+                    _TOKENIZER.no_padding()
+                    logging.info("[prompt_budget] tokenizer caricato da %s", path)
+                except Exception as exc:
+                    logging.warning("[prompt_budget] tokenizer %s non caricabile (%s): "
+                                    "uso la stima per caratteri", path, exc)
+            _TOKENIZER_LOADED = True
+    return _TOKENIZER
+
+
+def count_tokens_many(texts: Sequence[str]) -> List[int]:
+    tok = _get_tokenizer()
+    if tok is None:
+        return [math.ceil(len(t) / PROMPT_CHARS_PER_TOKEN) for t in texts]
+    return [len(e.ids) for e in tok.encode_batch(list(texts), add_special_tokens=False)]
+
+
+def count_tokens(text: str) -> int:
+    return count_tokens_many([text])[0] if text else 0
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """`text` accorciato a `max_tokens` token (con "…" se tagliato)."""
+    if max_tokens <= 0:
+        return ""
+    tok = _get_tokenizer()
+    if tok is None:
+        limit = int(max_tokens * PROMPT_CHARS_PER_TOKEN)
+        return text if len(text) <= limit else text[:limit].rstrip() + "…"
+    enc = tok.encode(text, add_special_tokens=False)
+    if len(enc.ids) <= max_tokens:
+        return text
+    return text[:enc.offsets[max_tokens - 1][1]].rstrip() + "…"
+
+
+def _truncate_list(values: list, max_tokens: int) -> list:
+    """Primi elementi di `values` che stanno in `max_tokens` token (contati come "a, b, c")."""
+    text = ", ".join(map(str, values))
+    short = truncate_tokens(text, max_tokens)
+    if short == text:
+        return values
+    kept, end = [], 0
+    for v in values:
+        end += len(str(v)) + (2 if kept else 0)
+        if end > len(short) - 1:                 # senza il "…" finale
+            break
+        kept.append(v)
+    return kept
+
+
+# ───────────────────────────────────────────────────────────────────
+def fit_items(items: List[Dict[str, Any]], budget: int,
+              cost: Callable[[List[Dict[str, Any]]], List[int]],
+              scores: Sequence[float] | None = None,
+              shrink_fields: Sequence[str] = (),
+              droppable: bool = True) -> Dict[str, Any]:
+    """
+    Adatta `items` a `budget` token (0 = nessun limite); `cost` dà i token
+    di una lista di item (un solo batch di tokenizzazione).
+
+    Gli item con score più basso (default: gli ultimi della lista) vengono
+    prima accorciati nei `shrink_fields` (le liste perdono gli ultimi
+    elementi), poi, se `droppable`, scartati.
+    Restituisce {"items", "tokens", "truncated", "dropped"}; l'ordine
+    originale degli item tenuti è preservato.
+    """
+    items = [dict(it) for it in items]
+    costs = cost(items) if items else []
+    total = sum(costs)
+    res = {"items": items, "tokens": total, "truncated": 0, "dropped": 0}
+    if budget <= 0 or total <= budget:
+        return res
+
+    if scores is None:
+        scores = [-i for i in range(len(items))]
+    order = sorted(range(len(items)), key=lambda i: (scores[i], -i))   # peggiori prima
+
+    for i in order:
+        if total <= budget:
+            break
+        changed = False
+        for fld in shrink_fields:
+            val = items[i].get(fld)
+            limit = PROMPT_TRUNCATE_TOKENS if droppable else 0
+            if isinstance(val, list) and val:    # resta una lista (meno elementi)
+                short = _truncate_list(val, limit)
+            elif isinstance(val, str) and val:
+                short = truncate_tokens(val, limit)
+            else:
+                continue
+            if short != val:
+                items[i][fld] = short
+                changed = True
+        if changed:
+            new_cost = cost([items[i]])[0]
+            total += new_cost - costs[i]
+            costs[i] = new_cost
+            res["truncated"] += 1
+
+    keep = [True] * len(items)
+    if droppable:
+        for i in order:
+            if total <= budget:
+                break
+            keep[i] = False
+            total -= costs[i]
+            res["dropped"] += 1
+
+    res["items"] = [it for it, k in zip(items, keep) if k]
+    res["tokens"] = total
+    return res
+
+
+def fit_history(messages: List[Dict[str, Any]], budget: int) -> Dict[str, Any]:
+    """
+    Messaggi più recenti che stanno in `budget` token. L'ultimo messaggio
+    è sempre tenuto; la parte tenuta inizia da un messaggio utente.
+    """
+    costs = count_tokens_many([str(m.get("content", "")) if isinstance(m, dict) else ""
+                               for m in messages])
+    total = sum(costs)
+    if budget <= 0 or total <= budget or len(messages) <= 1:
+        return {"items": list(messages), "tokens": total, "truncated": 0, "dropped": 0}
+
+    start, used = len(messages) - 1, costs[-1]
+    while start > 0 and used + costs[start - 1] <= budget:
+        start -= 1
+        used += costs[start]
+    while start < len(messages) - 1 and not (isinstance(messages[start], dict)
+                                            and messages[start].get("role") == "user"):
+        used -= costs[start]
+        start += 1
+    return {"items": messages[start:], "tokens": used, "truncated": 0, "dropped": start}
+
+
+# ───────────────────────────────────────────────────────────────────
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[str, Dict[str, int]] = {}
+_TURNS = 0
+
+
+def _item_cost(prompt: PreparedPrompt, loop: str) -> Callable[[List[Dict[str, Any]]], List[int]]:
+    compiled = prompt.compiled
+
+    def line(item: Dict[str, Any]) -> str:
+        text = compiled.render_item(loop, item) if compiled is not None else None
+        if text is None:
+            text = " ".join(", ".join(map(str, v)) if isinstance(v, list) else str(v)
+                            for v in item.values()) + "\n"
+        return text
+    return lambda items: count_tokens_many([line(it) for it in items])
+
+
+def apply_budget(template: PreparedPrompt | str, sections: Dict[str, List[Dict[str, Any]]],
+                 history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Applica i budget a `sections` (menu, cart, reviews: item dei loop del
+    template) e alla cronologia. Restituisce {"sections": {nome: items},
+    "history": messaggi, "report": {nome: {tokens, items, truncated, dropped}}}.
+    """
+    if not PROMPT_BUDGET_ENABLED:
+        return {"sections": dict(sections), "history": history, "report": {}}
+    if isinstance(template, str):
+        template = prepare_prompt(template)
+
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    report: Dict[str, Dict[str, int]] = {}
+    for name, items in sections.items():
+        loop, shrink, droppable = _SECTIONS[name]
+        scores = None
+        if items and all(isinstance(it.get("score"), (int, float)) for it in items):
+            scores = [float(it["score"]) for it in items]
+        res = fit_items(items, PROMPT_BUDGETS.get(name, 0), _item_cost(template, loop),
+                        scores=scores, shrink_fields=shrink, droppable=droppable)
+        out[name] = res.pop("items")
+        report[name] = {"items": len(out[name]), **res}
+
+    res = fit_history(history, PROMPT_BUDGETS.get("history", 0))
+    kept = res.pop("items")
+    report["history"] = {"items": len(kept), **res}
+
+    global _TURNS
+    with _STATS_LOCK:
+        _TURNS += 1
+        for name, r in report.items():
+            agg = _STATS.setdefault(name, {"tokens": 0, "max_tokens": 0, "truncated": 0, "dropped": 0})
+            agg["tokens"] += r["tokens"]
+            agg["max_tokens"] = max(agg["max_tokens"], r["tokens"])
+            agg["truncated"] += r["truncated"]
+            agg["dropped"] += r["dropped"]
+    return {"sections": out, "history": kept, "report": report}
+
+
+def record_system_tokens(tokens: int):
+    with _STATS_LOCK:
+        agg = _STATS.setdefault("system", {"tokens": 0, "max_tokens": 0, "truncated": 0, "dropped": 0})
+        agg["tokens"] += tokens
+        agg["max_tokens"] = max(agg["max_tokens"], tokens)
+
+
+def prompt_budget_stats() -> dict:
+    with _STATS_LOCK:
+        turns = _TURNS
+        sections = {name: {"avg_tokens": round(agg["tokens"] / turns, 1) if turns else 0.0,
+                           **{k: v for k, v in agg.items() if k != "tokens"}}
+                    for name, agg in _STATS.items()}
+    return {
+        "enabled": PROMPT_BUDGET_ENABLED,
+        "tokenizer": "model" if _TOKENIZER is not None else "chars",
+        "budgets": PROMPT_BUDGETS,
+        "turns": turns,
+        "sections": sections,
+    }
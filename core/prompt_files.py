@@ -0,0 +1,101 @@
+# core/prompt_files.py
+"""
+Lettura dei prompt su file (prompts/*.json, prompts/*.txt) con cache per
+percorso + firma di os.stat (mtime_ns, dimensione, inode).
+
+Criteri e review query leggevano e facevano json.loads del proprio file a
+ogni turno (due volte per turno), chat_service rileggeva DEFAULT_PROMPT_FILE
+ogni volta che il DB non aveva un prompt. Qui:
+
+• ogni chiamata costa una stat() per file: una modifica al file (es. volume
+  montato in docker-compose) è vista alla richiesta successiva;
+• lettura, parsing e log ("caricato", errori di parsing, fallback) solo
+  quando la firma di almeno un file candidato cambia.
+
+Contatori in /stats (prompt_files).
+"""
+
+from __future__ import annotations
+import json, logging, os, threading
+from typing import Any, Dict, Sequence, Tuple
+
+Signature = Tuple[int, int, int] | None
+
+_CACHE: Dict[Tuple[Any, ...], Tuple[Tuple[Signature, ...], Any]] = {}
+_LOCK = threading.Lock()
+_STATS = {"hits": 0, "loads": 0}
+
+
+def _signature(path: str) -> Signature:
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _cached(key: Tuple[Any, ...], paths: Sequence[str], load):
+    sig = tuple(_signature(p) for p in paths)
+    hit = _CACHE.get(key)
+    if hit is not None and hit[0] == sig:
+        _STATS["hits"] += 1
+        return hit[1]
+    with _LOCK:                                  # un solo reload per file modificato
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        value = load()
+        _CACHE[key] = (sig, value)
+        _STATS["loads"] += 1
+        return value
+
+
+def read_text(path: "os.PathLike[str] | str") -> str:
+    """Contenuto di `path` (FileNotFoundError se manca), riletto solo se cambia."""
+    path = os.fspath(path)
+
+    def load():
+        if _signature(path) is None:
+            return None
+        with open(path, "r", encoding="utf-8") as fp:
+            text = fp.read()
+        logging.info("[prompt_files] prompt caricato da %s (%d chars)", path, len(text))
+        return text
+
+    text = _cached(("text", path), [path], load)
+    if text is None:
+        raise FileNotFoundError(path)
+    return text
+
+
+def load_json_prompt(candidates: Sequence["os.PathLike[str] | str"], field: str = "prompt",
+                     tag: str = "prompt_files") -> str | None:
+    """
+    Campo `field` (stringa non vuota) del primo file JSON valido tra
+    `candidates`; None se nessuno lo è (il chiamante usa il suo fallback).
+    """
+    candidates = [os.fspath(p) for p in candidates]
+    name = os.path.basename(candidates[0]) if candidates else "?"
+
+    def load():
+        for path in candidates:
+            try:
+                with open(path, "r", encoding="utf-8") as fp:
+                    obj = json.loads(fp.read())
+                val = obj.get(field)
+                if isinstance(val, str) and val.strip():
+                    logging.info("[%s] Caricato '%s' da %s[%s] (%d chars)",
+                                 tag, name, path, field, len(val))
+                    return val
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logging.error("[%s] Errore parsing %s: %s", tag, path, e)
+        logging.warning("[%s] Uso fallback per '%s' (non trovato/valido)", tag, name)
+        return None
+
+    return _cached(("json", field, *candidates), candidates, load)
+
+
+def prompt_files_stats() -> dict:
+    return {"files": len(_CACHE), **_STATS}
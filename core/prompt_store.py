@@ -1,24 +1,70 @@
 # core/prompt_store.py
-import functools, logging
+"""
+Prompt per progetto (tabella `prompt` del DB tenant), in cache per processo.
+
+• chiave (db, progetto, versione della tabella `prompt`): il trigger di
+  core/data_version.py incrementa la versione a ogni modifica, quindi
+  tutti i worker passano al prompt nuovo al più entro DATA_VERSION_TTL_S;
+  con il listener (core/pg_listener.py) subito: la NOTIFY scarta la
+  versione in cache e le voci vecchie diventano irraggiungibili;
+• LRU limitata (PROMPT_CACHE_SIZE) con TTL (PROMPT_CACHE_TTL_S), di
+  riserva se la tabella è stata creata dopo l'installazione dei trigger;
+• ogni voce tiene testo e forme compilate (core/prompt_template.py);
+• un tenant con almeno una voce in cache ha una sottoscrizione al listener,
+  rilasciata quando l'LRU scarta (o fa scadere) la sua ultima voce;
+• versione sconosciuta (trigger non installato, ruolo senza accesso a
+  data_version): chiave (db, progetto, None), riletto solo alla scadenza
+  del TTL dell'LRU.
+
+Contatori hit/miss in /stats (prompt_store).
+"""
+
+from __future__ import annotations
+import logging, os, threading
+from typing import Dict
 from psycopg2.errors import UndefinedTable
+from core.data_version import get_version
+from core.lru import LRUCache
+from core.pg_listener import get_listener
+from core.prompt_template import PreparedPrompt
 from core.vector_client import _run
 from core.db_router     import map_project_to_db, set_current_db, get_current_db
 
-@functools.lru_cache(maxsize=8)
-def get_prompt(project: str | None) -> str:
+PROMPT_CACHE_SIZE  = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+PROMPT_CACHE_TTL_S = float(os.getenv("PROMPT_CACHE_TTL_S", "300"))
+
+_EMPTY = PreparedPrompt("")
+_ENTRIES: Dict[str, int] = {}            # db → voci in cache (sottoscrizione se > 0)
+_ENTRIES_LOCK = threading.Lock()
+
+
+def _track(db_name: str, delta: int):
+    with _ENTRIES_LOCK:
+        before = _ENTRIES.get(db_name, 0)
+        after = before + delta
+        if after > 0:
+            _ENTRIES[db_name] = after
+        else:
+            _ENTRIES.pop(db_name, None)
+        listener = get_listener()
+        if listener is None:
+            return
+        if before == 0 and after > 0:
+            listener.subscribe(db_name)          # NOTIFY → versione invalidata subito
+        elif before > 0 and after <= 0:
+            listener.unsubscribe(db_name)
+
+
+_CACHE = LRUCache(PROMPT_CACHE_SIZE, ttl=PROMPT_CACHE_TTL_S,
+                  on_evict=lambda key, _value: _track(key[0], -1))
+
+
+def _load(project: str | None) -> str:
     """
-    Restituisce il prompt più aggiornato per il progetto richiesto.
-    • Mappa alias comuni ('sushi', 'demo') → DB di default
-    • ORDER BY updated_at DESC così, se togli il UNIQUE e tieni versioni,
+    • ORDER BY created_at DESC così, se togli il UNIQUE e tieni versioni,
       pescherai sempre la più fresca.
     • Se la tabella non esiste, ritorna "" e il chiamante userà il payload.
     """
-    # Normalizza/mappa progetto → DB
-    db_name  = map_project_to_db(project)
-    # Se il chiamante non ha ancora impostato il DB, fallo tu (safe-reuse).
-    if get_current_db() != db_name:
-        set_current_db(project)
-
     sql = """
         SELECT prompt_txt
         FROM   prompt
@@ -30,5 +76,39 @@ def get_prompt(project: str | None) -> str:
         rows = _run(sql, (project or "sushi",))
         return rows[0][0] if rows else ""
     except UndefinedTable:
-        logging.warning("Tabella prompt assente in DB %s – fallback al payload", db_name)
+        logging.warning("Tabella prompt assente in DB %s – fallback al payload", get_current_db())
         return ""
+
+
+def get_prepared_prompt(project: str | None) -> PreparedPrompt | None:
+    """
+    Prompt più aggiornato per il progetto richiesto, con le forme compilate
+    (None se il progetto non ha un prompt nel DB).
+    • Mappa alias comuni ('sushi', 'demo') → DB di default
+    """
+    # Normalizza/mappa progetto → DB
+    db_name  = map_project_to_db(project)
+    # Se il chiamante non ha ancora impostato il DB, fallo tu (safe-reuse).
+    if get_current_db() != db_name:
+        set_current_db(project)
+
+    version = get_version("prompt")              # None: vale solo il TTL dell'LRU
+    key = (db_name, project or "sushi", version)
+    prepared = _CACHE.get(key)
+    if prepared is None:
+        text = _load(project)
+        prepared = PreparedPrompt(text) if text else _EMPTY
+        _track(db_name, +1)                      # prima del put: un'eviction dello stesso
+        if not _CACHE.put(key, prepared):        # tenant non chiude la connessione LISTEN
+            _track(db_name, -1)                  # chiave già presente (miss concorrente)
+    return prepared if prepared.text else None
+
+
+def get_prompt(project: str | None) -> str:
+    """Testo del prompt più aggiornato per il progetto ("" se assente)."""
+    prepared = get_prepared_prompt(project)
+    return prepared.text if prepared else ""
+
+
+def prompt_store_stats() -> dict:
+    return _CACHE.stats()
@@ -0,0 +1,369 @@
+# core/prompt_template.py
+"""
+Template del system prompt compilati una volta e resi in un solo passaggio.
+
+La pipeline storica (core/prompt_utils.py + chat_service) per ogni turno:
+fill_prompt_loop per ogni loop (regex + un str.replace per campo per item),
+process_conditional_blocks (riscansione completa dopo ogni [if]) e altri
+replace globali ({delivery_*}, {cart_total}) su tutto il prompt.
+
+Qui il template è analizzato una volta in nodi
+    testo statico · {segnaposto} · [loop nome=1]…[/loop] · [if cond]…[/if]
+e messo in cache per hash (sha1) del prompt; render() produce il risultato
+con un unico "".join.
+
+Semantica identica byte per byte alla pipeline storica:
+• loop, poi condizionali, poi sostituzioni globali (stesso ordine);
+• {campo} nel loop: valore dell'item (liste → "a, b"), altrimenti la
+  sostituzione globale, altrimenti resta letterale;
+• {x} fuori dai loop: sostituzione globale o letterale.
+I casi in cui la pipeline storica dipende dalle riscansioni (if annidati,
+loop dentro altri blocchi, "{{x}}", valori che contengono { } [ ]) usano
+la pipeline storica; ogni template compilato è verificato contro di essa
+alla compilazione.
+
+Layout "prefix" (PROMPT_LAYOUT=prefix in chat_service): il blocco
+<dynamic_data> viene spostato in fondo, dopo identità e istruzioni, così
+il testo iniziale resta identico tra turni e utenti dello stesso tenant e
+la prefix cache di vLLM lo riusa (split_prefix).
+
+Microbenchmark: tools/bench_prompt_render.py, tools/bench_prefix_cache.py
+"""
+
+from __future__ import annotations
+import hashlib, itertools, logging, re, threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+from core.lru import LRUCache
+from core.prompt_utils import fill_prompt_loop, process_conditional_blocks
+
+_IF_RE    = re.compile(r'\[if\s+([^\]]+)\](.*?)\[/if\]', re.DOTALL)
+_PH_RE    = re.compile(r'\{([^{}]*)\}')
+_SENTINEL = "\x00"
+_SLOT_RE  = re.compile(r'\x00(\d+)\x00')
+_UNSAFE   = re.compile(r'[{}\[\]\x00]')
+
+# nodi: ("t", testo) · ("v", nome) · ("l", indice loop) · ("if", cond, nodi)
+Node = Tuple[Any, ...]
+
+_DYNAMIC_RE = re.compile(r'<dynamic_data>.*?</dynamic_data>', re.DOTALL)
+
+_CACHE = LRUCache(maxsize=64)
+_SPLITS = LRUCache(maxsize=64)
+_LOCK = threading.Lock()
+
+
+# ───────────────────────────────────────────────────────────────────
+# Pipeline storica (riferimento e fallback)
+def render_legacy(template: str, loops: Dict[str, List[Dict[str, Any]]],
+                  conditions: Dict[str, Any], replacements: Dict[str, str]) -> str:
+    text = template
+    for name, items in loops.items():
+        text = fill_prompt_loop(text, items, name)
+    text = process_conditional_blocks(text, conditions)
+    for key, value in replacements.items():
+        text = text.replace(f"{{{key}}}", value)
+    return text
+
+
+# ───────────────────────────────────────────────────────────────────
+def _parse_text(text: str, slots: bool = True) -> List[Node] | None:
+    """Testo → nodi statici, segnaposto e (se slots) riferimenti ai loop."""
+    nodes: List[Node] = []
+    pos = 0
+    pattern = _SLOT_RE if slots else None
+    for m in _PH_RE.finditer(text):
+        nodes.extend(_split_slots(text[pos:m.start()], pattern))
+        nodes.append(("v", m.group(1)))
+        pos = m.end()
+    nodes.extend(_split_slots(text[pos:], pattern))
+
+    # un segnaposto attaccato a [ ] { } può formare nuova sintassi dopo la sostituzione
+    for i, node in enumerate(nodes):
+        if node[0] != "v":
+            continue
+        before = nodes[i - 1][1] if i and nodes[i - 1][0] == "t" else ""
+        after = nodes[i + 1][1] if i + 1 < len(nodes) and nodes[i + 1][0] == "t" else ""
+        if before[-1:] in ("[", "{") or after[:1] in ("]", "}"):
+            return None
+    return nodes
+
+
+def _split_slots(text: str, pattern) -> List[Node]:
+    if not text:
+        return []
+    if pattern is None:
+        return [("t", text)]
+    out: List[Node] = []
+    pos = 0
+    for m in pattern.finditer(text):
+        if m.start() > pos:
+            out.append(("t", text[pos:m.start()]))
+        out.append(("l", int(m.group(1))))
+        pos = m.end()
+    if pos < len(text):
+        out.append(("t", text[pos:]))
+    return out
+
+
+class CompiledTemplate:
+    """Template analizzato: nodi di primo livello + corpi dei loop."""
+
+    def __init__(self, nodes: List[Node], loops: List[Tuple[str, List[Node]]]):
+        self.nodes = nodes
+        self.loops = loops
+
+    # ── render ────────────────────────────────────────────────────────
+    @staticmethod
+    def _cond_ok(cond: str, conditions: Dict[str, Any]) -> bool:
+        if '=' in cond:
+            k, v = [x.strip() for x in cond.split('=', 1)]
+            return conditions.get(k) == v
+        return bool(conditions.get(cond.strip()))
+
+    def _emit(self, nodes: Sequence[Node], out: List[str], rendered_loops: List[str],
+              conditions: Dict[str, Any], replacements: Dict[str, str], values: List[str]):
+        for node in nodes:
+            kind = node[0]
+            if kind == "t":
+                out.append(node[1])
+            elif kind == "v":
+                name = node[1]
+                if name in replacements:
+                    values.append(replacements[name])
+                    out.append(replacements[name])
+                else:
+                    out.append("{" + name + "}")
+            elif kind == "l":
+                out.append(rendered_loops[node[1]])
+            elif self._cond_ok(node[1], conditions):
+                self._emit(node[2], out, rendered_loops, conditions, replacements, values)
+
+    @staticmethod
+    def _render_loop(body: List[Node], items: List[Dict[str, Any]],
+                     replacements: Dict[str, str], values: List[str]) -> str:
+        out: List[str] = []
+        for itm in items:
+            values.extend(itm)                   # anche le chiavi: "{k}" nella pipeline storica
+            for node in body:
+                if node[0] == "t":
+                    out.append(node[1])
+                    continue
+                name = node[1]
+                if name in itm:
+                    v = itm[name]
+                    v = ", ".join(v) if isinstance(v, list) else str(v)
+                elif name in replacements:
+                    v = replacements[name]
+                else:
+                    v = "{" + name + "}"
+                    out.append(v)
+                    continue
+                values.append(v)
+                out.append(v)
+            out.append("\n")
+        return "".join(out)
+
+    def render(self, loops: Dict[str, List[Dict[str, Any]]], conditions: Dict[str, Any],
+               replacements: Dict[str, str]) -> str | None:
+        """Prompt reso; None se un valore contiene { } [ ] (serve la pipeline storica)."""
+        values: List[str] = []
+        rendered = [self._render_loop(body, loops.get(name) or [], replacements, values)
+                    for name, body in self.loops]
+        out: List[str] = []
+        self._emit(self.nodes, out, rendered, conditions, replacements, values)
+        if _UNSAFE.search("".join(values)):
+            return None
+        return "".join(out)
+
+
+    def render_item(self, loop: str, item: Dict[str, Any],
+                    replacements: Dict[str, str] | None = None) -> str | None:
+        """Riga resa per un singolo item del loop `loop` (None se il loop non c'è)."""
+        for name, body in self.loops:
+            if name == loop:
+                return self._render_loop(body, [item], replacements or {}, [])
+        return None
+
+
+def compile_template(template: str, loop_names: Sequence[str]) -> CompiledTemplate | None:
+    """
+    Analizza il template; None se serve la pipeline storica
+    (costrutti che dipendono dalle riscansioni successive).
+    """
+    if _SENTINEL in template or "{{" in template or "}}" in template:
+        return None
+    text = template
+    loops: List[Tuple[str, List[Node]]] = []
+    for name in loop_names:
+        m = re.search(rf'\[loop\s+{re.escape(name)}=1\](.*?)\[/loop\]', text, re.DOTALL)
+        if not m:
+            continue
+        block = m.group(1)
+        if _SENTINEL in block or "[loop" in block or "[if" in block or "[/if]" in block:
+            return None
+        body = _parse_text(block, slots=False)
+        if body is None:
+            return None
+        # come fill_prompt_loop: sostituisce tutte le occorrenze identiche del blocco
+        text = text.replace(m.group(0), f"{_SENTINEL}{len(loops)}{_SENTINEL}")
+        loops.append((name, body))
+
+    nodes: List[Node] = []
+    pos = 0
+    while (m := _IF_RE.search(text, pos)):
+        cond, body = m.group(1), m.group(2)
+        if "[if" in body or _SENTINEL in cond:
+            return None                                   # if annidati
+        before, inner = _parse_text(text[pos:m.start()]), _parse_text(body)
+        if before is None or inner is None:
+            return None
+        nodes.extend(before)
+        nodes.append(("if", cond, inner))
+        pos = m.end()
+    tail = _parse_text(text[pos:])
+    if tail is None:
+        return None
+    nodes.extend(tail)
+    return CompiledTemplate(nodes, loops)
+
+
+# ───────────────────────────────────────────────────────────────────
+def _probe_ok(compiled: CompiledTemplate, template: str, loop_names: Sequence[str]) -> bool:
+    """Confronto con la pipeline storica su tutte le combinazioni delle condizioni."""
+    conds = sorted({c for c in re.findall(r'\[if\s+([^\]]+)\]', template)})
+    keys = sorted({(c.split('=', 1)[0] if '=' in c else c).strip() for c in conds})[:6]
+    values = {k: sorted({c.split('=', 1)[1].strip() for c in conds
+                         if '=' in c and c.split('=', 1)[0].strip() == k} | {""}) for k in keys}
+    fields = {m for m in _PH_RE.findall(template)}
+    item = {f: f"<{f}>" for f in fields}
+    repl = {f: f"<<{f}>>" for f in sorted(fields)[::2]}
+    for combo in itertools.product(*(values[k] for k in keys)):
+        conditions = dict(zip(keys, combo))
+        for n in (0, 2):
+            loops = {name: [item] * n for name in loop_names}
+            if compiled.render(loops, conditions, repl) != \
+                    render_legacy(template, loops, conditions, repl):
+                return False
+    return True
+
+
+def get_compiled(template: str, loop_names: Sequence[str]) -> CompiledTemplate | None:
+    """Template compilato (in cache per hash del prompt e nomi dei loop)."""
+    key = (hashlib.sha1(template.encode("utf-8")).hexdigest(), tuple(loop_names))
+    cached = _CACHE.get(key, _CACHE)
+    if cached is not _CACHE:
+        return cached
+    with _LOCK:
+        cached = _CACHE.get(key, _CACHE)
+        if cached is not _CACHE:
+            return cached
+        compiled = compile_template(template, loop_names)
+        if compiled is not None and not _probe_ok(compiled, template, loop_names):
+            logging.warning("[prompt_template] template %s… non compilabile in modo "
+                            "equivalente: uso la pipeline storica", key[0][:8])
+            compiled = None
+        _CACHE.put(key, compiled)
+        return compiled
+
+
+# ───────────────────────────────────────────────────────────────────
+# Layout prefix-cache
+def split_prefix(template: str) -> Tuple[str, str] | None:
+    """
+    (parte statica, blocco <dynamic_data>) del template; None se il blocco
+    manca, è ripetuto o se fuori da esso ci sono [loop]/[if] (la parte
+    statica non sarebbe più costante).
+    """
+    key = hashlib.sha1(template.encode("utf-8")).hexdigest()
+    cached = _SPLITS.get(key, _SPLITS)
+    if cached is not _SPLITS:
+        return cached
+    blocks = _DYNAMIC_RE.findall(template)
+    split = None
+    if len(blocks) == 1:
+        before, after = _DYNAMIC_RE.split(template)
+        static = before.rstrip("\n") + "\n\n" + after.lstrip("\n")
+        if "[loop" not in static and "[if" not in static:
+            split = (static.rstrip("\n") + "\n\n", blocks[0])
+    _SPLITS.put(key, split)
+    return split
+
+
+def render_prompt(template: str, loops: Dict[str, List[Dict[str, Any]]],
+                  conditions: Dict[str, Any], replacements: Dict[str, str],
+                  layout: str = "inline") -> str:
+    """
+    Equivale a: fill_prompt_loop per ogni loop (nell'ordine di `loops`),
+    process_conditional_blocks(conditions), poi str.replace("{k}", v) per
+    ogni sostituzione (nell'ordine di `replacements`).
+
+    layout="prefix": parte statica (identica a ogni turno) + blocco
+    <dynamic_data> reso, in coda. Se il template non si presta (vedi
+    split_prefix, o un segnaposto sostituito fuori dal blocco) si usa
+    il layout inline.
+    """
+    if layout == "prefix":
+        split = split_prefix(template)
+        if split is not None and not any(f"{{{k}}}" in split[0] for k in replacements):
+            return split[0] + render_prompt(split[1], loops, conditions, replacements)
+    return _render_with(get_compiled(template, tuple(loops)), template,
+                        loops, conditions, replacements)
+
+
+def _render_with(compiled: CompiledTemplate | None, template: str,
+                 loops: Dict[str, List[Dict[str, Any]]], conditions: Dict[str, Any],
+                 replacements: Dict[str, str]) -> str:
+    text = compiled.render(loops, conditions, replacements) if compiled is not None else None
+    if text is None:
+        return render_legacy(template, loops, conditions, replacements)
+    return text
+
+
+# ───────────────────────────────────────────────────────────────────
+PROMPT_LOOPS = ("menu", "products_cart", "reviews")     # loop del prompt chat (chat_service)
+
+
+class PreparedPrompt:
+    """
+    Testo del prompt con le forme compilate (layout inline e prefix)
+    calcolate una volta: chi lo tiene in cache (core/prompt_store.py)
+    non ripaga hash e lookup a ogni turno.
+    """
+
+    __slots__ = ("text", "loop_names", "compiled", "split", "dynamic")
+
+    def __init__(self, text: str, loop_names: Sequence[str] = PROMPT_LOOPS):
+        self.text = text
+        self.loop_names = tuple(loop_names)
+        self.compiled = get_compiled(text, self.loop_names)
+        self.split = split_prefix(text)
+        self.dynamic = get_compiled(self.split[1], self.loop_names) if self.split else None
+
+    def render(self, loops: Dict[str, List[Dict[str, Any]]], conditions: Dict[str, Any],
+               replacements: Dict[str, str], layout: str = "inline") -> str:
+        """Come render_prompt(self.text, ...)."""
+        if tuple(loops) != self.loop_names:
+            return render_prompt(self.text, loops, conditions, replacements, layout)
+        if layout == "prefix" and self.split is not None \
+                and not any(f"{{{k}}}" in self.split[0] for k in replacements):
+            return self.split[0] + _render_with(self.dynamic, self.split[1],
+                                                loops, conditions, replacements)
+        return _render_with(self.compiled, self.text, loops, conditions, replacements)
+
+
+_PREPARED = LRUCache(maxsize=64)
+
+
+def prepare_prompt(text: str) -> PreparedPrompt:
+    """PreparedPrompt per un testo qualsiasi (payload, file), in cache per hash."""
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    prepared = _PREPARED.get(key)
+    if prepared is None:
+        prepared = PreparedPrompt(text)
+        _PREPARED.put(key, prepared)
+    return prepared
+
+
+def prompt_template_stats() -> dict:
+    return _CACHE.stats()
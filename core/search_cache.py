@@ -0,0 +1,81 @@
+# core/search_cache.py
+"""
+Cache dei risultati delle ricerche vettoriali (search_table / search_table_many).
+
+Le stesse query popolari ("ramen", "mochi") tornano migliaia di volte al giorno
+per ristorante: il risultato dipende solo da testo, parametri e dati della
+tabella, quindi si può riusare finché la tabella non cambia.
+
+• chiave: (db, tabella, versione dati, testo normalizzato, k, campi,
+  extra score, candidati, filtri); il testo è normalizzato con la stessa
+  funzione della cache embedding (normalize_text: spazi e maiuscole), così
+  due testi con la stessa chiave condividono embedding e risultato;
+• invalidazione: la versione della tabella (core/data_version.py, incrementata
+  dai trigger a ogni scrittura dei loader) fa parte della chiave, le voci
+  vecchie non sono più raggiungibili e scadono per LRU/TTL;
+• una LRUCache per tabella (SEARCH_CACHE_SIZE voci, TTL SEARCH_CACHE_TTL_S):
+  hit rate per tabella in /stats per dimensionarla.
+"""
+
+from __future__ import annotations
+import os, threading
+from typing import Any, Dict, Hashable, List, Sequence
+
+from core.data_version import get_version
+from core.db_router import get_current_db
+from core.embedding_cache import normalize_text
+from core.lru import LRUCache
+
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") == "1"
+SEARCH_CACHE_SIZE    = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL_S   = float(os.getenv("SEARCH_CACHE_TTL_S", "300"))
+
+_CACHES: Dict[str, LRUCache] = {}
+_LOCK = threading.Lock()
+
+
+def _cache(table: str) -> LRUCache:
+    cache = _CACHES.get(table)
+    if cache is None:
+        with _LOCK:
+            cache = _CACHES.setdefault(table, LRUCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_S))
+    return cache
+
+
+def cache_keys(table: str, queries: Sequence[str], *params: Hashable) -> List[Hashable] | None:
+    """
+    Chiavi di cache per i testi `queries` nel DB corrente (None = cache spenta
+    o versione della tabella non leggibile: si va sempre su Postgres).
+    """
+    if not SEARCH_CACHE_ENABLED:
+        return None
+    version = get_version(table)
+    if version is None:
+        return None
+    db = get_current_db()
+    return [(db, version, normalize_text(q), params) for q in queries]
+
+
+def get(table: str, key: Hashable) -> List[Dict[str, Any]] | None:
+    rows = _cache(table).get(key)
+    return None if rows is None else [dict(r) for r in rows]   # copie: i chiamanti possono modificarle
+
+
+def put(table: str, key: Hashable, rows: List[Dict[str, Any]]):
+    _cache(table).put(key, [dict(r) for r in rows])
+
+
+def clear():
+    for cache in list(_CACHES.values()):
+        cache.clear()
+
+
+def search_cache_stats() -> dict:
+    """Hit/miss/eviction per tabella (per /stats)."""
+    if not SEARCH_CACHE_ENABLED:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "ttl_s": SEARCH_CACHE_TTL_S,
+        "tables": {t: c.stats() for t, c in list(_CACHES.items())},
+    }
@@ -1,63 +1,116 @@
 # core/vector_client.py
 """
 Gestisce:
-• Connessione al database PostgreSQL (con pool condiviso)
+• Connessione al database PostgreSQL (pool thread-safe per tenant, vedi core/pg_pool.py)
+• Statement preparati per connessione (_run_prepared) per le query ripetute
 • Encoding vettoriale via microservizio HTTP (no SentenceTransformer in RAM)
+• Embedding bulk (get_embeddings) e micro-batching delle richieste singole
+• Cache embedding a due livelli (LRU in-process + Redis), vedi core/embedding_cache.py
+• Encode opzionale in processi separati (EMBEDDING_EXECUTION=pool), vedi core/embedding_pool.py
 """
 
 from __future__ import annotations
 import logging, os, math, functools, json
 import psycopg2, psycopg2.extras
-from psycopg2.pool import SimpleConnectionPool
 import requests
 from typing import List, Any
 from core.config import Config
 from core.db_router import get_current_db
-from psycopg2.sql import Composed
-import os, logging
-import math
-from typing import List, Any
-from sentence_transformers  import SentenceTransformer
-import openai
+from psycopg2.sql import Composed, SQL
+from core.pg_pool import PoolRegistry, TenantPool, statement_timeout_ms
+from core.vector_index import ann_settings_sql
+import threading
+from typing import Dict, Sequence
+from core.embedding_batcher import EmbeddingBatcher
+from core.embedding_cache import EmbeddingCache, EMB_CACHE_ENABLED, normalize_text
+from core.embedding_providers import EMBEDDING_PROVIDER, get_provider, provider_class
 
 # ------------- Pool PostgreSQL (uno per DB) -------------
-_POOLS: dict[str, SimpleConnectionPool] = {}
 _PG_STATIC = {
     "user":     Config.DB_USER,
     "password": Config.DB_PASS,
     "host":     Config.DB_HOST,
     "port":     Config.DB_PORT,
 }
+_REGISTRY = PoolRegistry(connect_kwargs=_PG_STATIC)
+PG_PREPARED_ENABLED = os.getenv("PG_PREPARED_ENABLED", "1") == "1"
+
+# Configurazione: il provider (local_cpu | openai) carica le proprie dipendenze
+# solo al primo encode, vedi core/embedding_providers.py
+EMBEDDING_MODEL = provider_class().model
+
+def get_pool() -> TenantPool:
+    """
+    Pool thread-safe del DB corrente. I pool partono vuoti e condividono
+    il budget globale PG_GLOBAL_MAX_CONN (eviction LRU dei tenant inattivi).
+    """
+    return _REGISTRY.get(get_current_db())
+
+def pool_stats() -> dict:
+    """Budget globale + metriche per tenant (in uso, in attesa, latenza di acquisizione)."""
+    return _REGISTRY.stats()
+
+def _local_settings(query_class: str, ann_k: int = 0) -> str:
+    """statement_timeout + parametri ANN (ef_search / probes) della classe di query."""
+    return (f"SET LOCAL statement_timeout = {statement_timeout_ms(query_class)}; "
+            + ann_settings_sql(query_class, ann_k))
+
+def _with_statement_timeout(sql: str | Composed, query_class: str,
+                            ann_k: int = 0) -> str | Composed:
+    """
+    Antepone i SET LOCAL della classe di query (statement_timeout, ANN):
+    stesso round trip, valgono solo per la transazione corrente (putconn fa rollback).
+    """
+    prefix = _local_settings(query_class, ann_k)
+    if isinstance(sql, Composed):
+        return Composed([SQL(prefix), sql])
+    return prefix + sql
+
+def _run(sql: str | Composed, args: Any = None, dict_cursor: bool = False,
+         query_class: str = "default", ann_k: int = 0) -> list[Any]:
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        factory = psycopg2.extras.RealDictCursor if dict_cursor else None
+        with conn.cursor(cursor_factory=factory) as cur:
+            cur.execute(_with_statement_timeout(sql, query_class, ann_k), args)
+            return cur.fetchall()
+    finally:
+        pool.putconn(conn)
+
+def _run_prepared(name: str, sql: str | Composed, param_types: Sequence[str],
+                  args: Sequence[Any], dict_cursor: bool = False,
+                  query_class: str = "default", ann_k: int = 0) -> list[Any]:
+    """
+    Come _run, ma la query (segnaposto $1, $2 …) viene preparata lato server
+    una sola volta per connessione (PREPARE) e poi soltanto eseguita (EXECUTE):
+    niente parse/plan a ogni chiamata. SET LOCAL, PREPARE ed EXECUTE viaggiano
+    nello stesso round trip.
 
-# Configurazione
-EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "local_cpu") # local_cpu | openai
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Carica il modello in memoria solo se necessario (singleton)
-_LOCAL_MODEL = None
-
-def _get_local_model():
-    global _LOCAL_MODEL
-    if _LOCAL_MODEL is None:
-        logging.info("Caricamento modello embedding locale (CPU)...")
-        # Usa un modello molto leggero ma efficace
-        _LOCAL_MODEL = SentenceTransformer("all-MiniLM-L6-v2") 
-    return _LOCAL_MODEL
-
-def get_pool() -> SimpleConnectionPool:
-    dbname = get_current_db()
-    if dbname not in _POOLS:
-        _POOLS[dbname] = SimpleConnectionPool(5, 40, dbname=dbname, **_PG_STATIC)
-        logging.debug("[vector_client] PG pool ready for %s", dbname)
-    return _POOLS[dbname]
-
-def _run(sql: str | Composed, args: Any = None, dict_cursor: bool = False) -> list[Any]:
+    PREPARE non è transazionale: dopo un errore non sappiamo se lo statement
+    esiste, quindi la connessione viene segnata e ripulita al prossimo uso.
+    """
     pool = get_pool()
     conn = pool.getconn()
     try:
         factory = psycopg2.extras.RealDictCursor if dict_cursor else None
         with conn.cursor(cursor_factory=factory) as cur:
-            cur.execute(sql, args)
+            parts = [_local_settings(query_class, ann_k)]
+            if conn.prepared_stale:
+                parts.append("DEALLOCATE ALL; ")
+                conn.prepared.clear()
+                conn.prepared_stale = False
+            if name not in conn.prepared:
+                body = sql.as_string(conn) if isinstance(sql, Composed) else sql
+                parts.append(f"PREPARE {name} ({', '.join(param_types)}) AS "
+                             f"{body.replace('%', '%%')}; ")
+            parts.append(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})")
+            try:
+                cur.execute("".join(parts), tuple(args))
+            except Exception:
+                conn.prepared_stale = True
+                raise
+            conn.prepared.add(name)
             return cur.fetchall()
     finally:
         pool.putconn(conn)
@@ -105,19 +158,146 @@ def _embed_one_cached(text: str) -> tuple[float, ...]:
                       e, EMB_URL, json.dumps(payload, ensure_ascii=False))
         return tuple()  # evita crash: il chiamante potrà gestire embedding vuoto
 
-def get_embedding(text: str) -> List[float]:
-    text = text.replace("\n", " ")
-    
-    if EMBEDDING_PROVIDER == "openai":
-        # Uso OpenAI (richiede API Key)
-        if not OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY mancante")
-        client = openai.Client(api_key=OPENAI_API_KEY)
-        resp = client.embeddings.create(input=[text], model="text-embedding-3-small")
-        return resp.data[0].embedding
-        
+# ───────── Embedding (bulk + micro-batching) ─────────
+EMB_BATCH_ENABLED  = os.getenv("EMB_BATCH_ENABLED", "1") == "1"
+EMB_BATCH_MAX_SIZE = int(os.getenv("EMB_BATCH_MAX_SIZE", "32"))
+EMB_BATCH_MAX_WAIT_MS = float(os.getenv("EMB_BATCH_MAX_WAIT_MS", "5"))
+# inline = encode nel processo corrente | pool = processi dedicati (core/embedding_pool.py)
+EMBEDDING_EXECUTION = os.getenv("EMBEDDING_EXECUTION", "inline")
+
+_BATCHER: EmbeddingBatcher | None = None
+_CACHE: EmbeddingCache | None = None
+_WORKER_POOL = None
+_BATCHER_LOCK = threading.Lock()
+
+def _clean_text(text: str | None) -> str:
+    return (text or "").replace("\n", " ")
+
+def _encode_batch(texts: Sequence[str]) -> List[List[float]]:
+    """
+    Codifica un blocco di testi con il provider configurato (una sola chiamata).
+    """
+    if not texts:
+        return []
+    if EMBEDDING_EXECUTION == "pool":
+        return get_worker_pool().encode(texts)
+    return get_provider().encode(texts, batch_size=EMB_BATCH_MAX_SIZE)
+
+def get_worker_pool():
+    """
+    Pool di processi per l'encode (solo con EMBEDDING_EXECUTION=pool).
+    Conviene avviarlo in create_app(), prima che partano i thread delle richieste.
+    """
+    global _WORKER_POOL
+    if _WORKER_POOL is None:
+        with _BATCHER_LOCK:
+            if _WORKER_POOL is None:
+                from core.embedding_pool import EmbeddingWorkerPool
+                _WORKER_POOL = EmbeddingWorkerPool(EMBEDDING_PROVIDER,
+                                                   max_batch=EMB_BATCH_MAX_SIZE)
+    _WORKER_POOL.start()
+    return _WORKER_POOL
+
+def embedding_pool_stats() -> dict:
+    """Attesa in coda vs tempo di encode del pool di processi (per /stats)."""
+    if _WORKER_POOL is None:
+        return {"enabled": EMBEDDING_EXECUTION == "pool", "started": False}
+    return {"enabled": True, "started": True, **_WORKER_POOL.as_dict()}
+
+def _get_batcher() -> EmbeddingBatcher:
+    global _BATCHER
+    if _BATCHER is None:
+        with _BATCHER_LOCK:
+            if _BATCHER is None:
+                _BATCHER = EmbeddingBatcher(
+                    _encode_batch,
+                    max_batch_size=EMB_BATCH_MAX_SIZE,
+                    max_wait_ms=EMB_BATCH_MAX_WAIT_MS,
+                )
+    return _BATCHER
+
+def _get_cache() -> EmbeddingCache:
+    global _CACHE
+    if _CACHE is None:
+        with _BATCHER_LOCK:
+            if _CACHE is None:
+                _CACHE = EmbeddingCache(EMBEDDING_PROVIDER, EMBEDDING_MODEL)
+    return _CACHE
+
+def embedding_cache_stats() -> dict:
+    """Contatori hit/miss/eviction della cache embedding (per /stats)."""
+    if not EMB_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **_get_cache().stats()}
+
+def _encode_chunked(texts: Sequence[str]) -> List[List[float]]:
+    out: List[List[float]] = []
+    for i in range(0, len(texts), EMB_BATCH_MAX_SIZE):
+        out.extend(_encode_batch(texts[i:i + EMB_BATCH_MAX_SIZE]))
+    return out
+
+def get_embeddings(texts: Sequence[str], cache: bool = True) -> List[List[float]]:
+    """
+    API bulk: restituisce un embedding per ogni testo, nello stesso ordine.
+    I testi vengono codificati a blocchi di EMB_BATCH_MAX_SIZE.
+
+    Con cache=True (query) i testi sono cercati in L1/L2 per chiave
+    normalizzata (normalize_text); al modello va comunque il testo originale.
+    I loader passano cache=False per non riempire la cache con i documenti.
+    """
+    if not (cache and EMB_CACHE_ENABLED):
+        return _encode_chunked([_clean_text(t) for t in texts])
+
+    keys = [normalize_text(t) for t in texts]
+    originals: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        originals.setdefault(key, text)
+    emb_cache = _get_cache()
+    found = emb_cache.get_many(keys)
+    missing = [k for k in originals if k not in found]
+    if missing:
+        fresh = dict(zip(missing, _encode_chunked([_clean_text(originals[k]) for k in missing])))
+        emb_cache.put_many(fresh)
+        found.update(fresh)
+    return [list(found[k]) for k in keys]
+
+def get_embedding(text: str, cache: bool = True) -> List[float]:
+    """
+    Embedding di un singolo testo. Con EMB_BATCH_ENABLED le richieste
+    concorrenti vengono accorpate dal batcher in background; con la cache
+    attiva il vettore viene prima cercato in L1/L2 (chiave normalize_text).
+    """
+    if cache and EMB_CACHE_ENABLED:
+        key = normalize_text(text)
+        emb_cache = _get_cache()
+        vec = emb_cache.get(key)
+        if vec is not None:
+            return vec
+        vec = _embed_one(_clean_text(text))
+        emb_cache.put(key, vec)
+        return vec
+    return _embed_one(_clean_text(text))
+
+def _embed_one(text: str) -> List[float]:
+    if EMB_BATCH_ENABLED:
+        return list(_get_batcher().embed(text))
+    return _encode_batch([text])[0]
+
+def warmup_embeddings(background: bool = True):
+    """
+    Carica il provider configurato (modello/client) fuori dal percorso
+    della prima richiesta. Con background=True non blocca l'avvio.
+    """
+    def _load():
+        try:
+            if EMBEDDING_EXECUTION == "pool":
+                get_worker_pool()
+            else:
+                get_provider().load()
+        except Exception as exc:
+            logging.error("[vector_client] warmup embedding fallito: %s", exc)
+
+    if background:
+        threading.Thread(target=_load, name="embedding-warmup", daemon=True).start()
     else:
-        # Uso CPU Locale (Gratis, funziona su ogni PC)
-        model = _get_local_model()
-        vec = model.encode(text, normalize_embeddings=True)
-        return vec.tolist()
+        _load()
@@ -0,0 +1,132 @@
+# core/vector_index.py
+"""
+Indici ANN pgvector (HNSW o IVFFlat) sulle colonne `embedding`.
+
+• ciclo di vita gestito dai loader: drop_vector_indexes() prima del bulk
+  insert, ensure_vector_index() dopo (costruire l'indice a tabella piena
+  è molto più veloce che aggiornarlo riga per riga; IVFFlat inoltre calcola
+  i centroidi sui dati presenti);
+• operatore vector_cosine_ops: le query devono ordinare per
+  `embedding <=> q` (crescente) perché Postgres usi l'indice;
+• recall/latency per classe di query: ann_settings_sql() restituisce i
+  SET LOCAL hnsw.ef_search / ivfflat.probes da anteporre alla query.
+
+Misura della recall: tools/eval_ann_recall.py
+"""
+
+from __future__ import annotations
+import logging, math, os
+from typing import Dict
+
+from core.pg_pool import parse_kv
+
+VECTOR_INDEX_KIND    = os.getenv("VECTOR_INDEX_KIND", "hnsw").lower()   # hnsw | ivfflat | none
+HNSW_M               = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS        = int(os.getenv("IVFFLAT_LISTS", "0"))             # 0 = automatico
+VECTOR_INDEX_BUILD_MEM = os.getenv("VECTOR_INDEX_BUILD_MEM", "256MB")
+
+# Parametri di ricerca per classe di query (le classi assenti usano i default pgvector)
+PG_ANN_EF_SEARCH: Dict[str, int] = {
+    "search": 64,
+    **{k: int(v) for k, v in parse_kv(os.getenv("PG_ANN_EF_SEARCH")).items()},
+}
+# ef_search minimo per le ricerche filtrate: i filtri si applicano alle righe
+# restituite dall'indice, con un ef basso resterebbero meno di k risultati
+PG_ANN_FILTERED_EF = int(os.getenv("PG_ANN_FILTERED_EF", "200"))
+PG_ANN_PROBES: Dict[str, int] = {
+    "search": 10,
+    **{k: int(v) for k, v in parse_kv(os.getenv("PG_ANN_PROBES")).items()},
+}
+
+VECTOR_TABLES = ("menu", "recensioni")
+# Documento full-text dei piatti (ricerca ibrida, menu_services/hybrid_search.py):
+# query e indice GIN devono usare la stessa espressione
+MENU_TSV_SQL = ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(description, '')), 'B')")
+_PGVECTOR_EF_DEFAULT = 40
+_KINDS = ("hnsw", "ivfflat")
+
+
+def index_name(table: str, kind: str) -> str:
+    return f"{table}_embedding_{kind}_idx"
+
+
+def ivfflat_lists(rows: int) -> int:
+    """Euristica pgvector: righe/1000 fino a 1M, poi √righe."""
+    if IVFFLAT_LISTS > 0:
+        return IVFFLAT_LISTS
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def ann_settings_sql(query_class: str | None, ann_k: int = 0) -> str:
+    """
+    SET LOCAL dei parametri di ricerca ANN per la classe di query ('' se nessuno).
+    HNSW restituisce al massimo ef_search righe: con `ann_k` (righe attese
+    dalla scansione dell'indice, es. i candidati del rerank) ef_search ≥ ann_k.
+    """
+    qc = query_class or "default"
+    if VECTOR_INDEX_KIND == "hnsw" and (qc in PG_ANN_EF_SEARCH or ann_k):
+        ef = max(PG_ANN_EF_SEARCH.get(qc, _PGVECTOR_EF_DEFAULT), ann_k)
+        return f"SET LOCAL hnsw.ef_search = {min(ef, 1000)}; "
+    if VECTOR_INDEX_KIND == "ivfflat" and qc in PG_ANN_PROBES:
+        return f"SET LOCAL ivfflat.probes = {PG_ANN_PROBES[qc]}; "
+    return ""
+
+
+def _check_table(table: str):
+    if table not in VECTOR_TABLES:
+        raise ValueError(f"Invalid table: {table}")
+
+
+def ensure_filter_indexes(cur, table: str):
+    """
+    Indici B-tree per i filtri strutturati di core/vector_table.py (tipo, prezzo)
+    e per il passo lessicale della ricerca ibrida (nome esatto, full-text).
+    """
+    _check_table(table)
+    if table == "menu":
+        cur.execute("CREATE INDEX IF NOT EXISTS menu_type_lower_idx ON menu (lower(type))")
+        cur.execute("CREATE INDEX IF NOT EXISTS menu_price_idx ON menu (price)")
+        cur.execute("CREATE INDEX IF NOT EXISTS menu_name_lower_idx ON menu (lower(name))")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS menu_text_idx ON menu USING gin (({MENU_TSV_SQL}))")
+
+
+def drop_vector_indexes(cur, table: str, keep: str | None = None):
+    """Rimuove gli indici ANN gestiti su `table` (tranne `keep`)."""
+    _check_table(table)
+    for kind in _KINDS:
+        name = index_name(table, kind)
+        if name != keep:
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def ensure_vector_index(cur, table: str, kind: str | None = None) -> str | None:
+    """
+    Crea (se manca) l'indice ANN di `table` e rimuove quello dell'altro tipo.
+    IVFFlat viene sempre ricostruito: i centroidi dipendono dai dati.
+    Ritorna il nome dell'indice, None con kind "none".
+    """
+    _check_table(table)
+    kind = (kind or VECTOR_INDEX_KIND).lower()
+    if kind not in _KINDS:
+        drop_vector_indexes(cur, table)
+        return None
+
+    name = index_name(table, kind)
+    drop_vector_indexes(cur, table, keep=None if kind == "ivfflat" else name)
+    if kind == "hnsw":
+        options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    else:
+        cur.execute(f"SELECT count(*) FROM {table} WHERE embedding IS NOT NULL")
+        options = f"lists = {ivfflat_lists(cur.fetchone()[0])}"
+
+    cur.execute(f"SET LOCAL maintenance_work_mem = '{VECTOR_INDEX_BUILD_MEM}'")
+    cur.execute(
+        f'CREATE INDEX IF NOT EXISTS "{name}" ON {table} '
+        f"USING {kind} (embedding vector_cosine_ops) WITH ({options})"
+    )
+    logging.info("[vector_index] %s pronto (%s)", name, options)
+    return name
@@ -1,12 +1,17 @@
 # core/vector_table.py
 from __future__ import annotations
 
-import logging
-from typing import Any, Dict, List, Sequence
+import hashlib, logging
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Sequence
 
 from psycopg2 import sql as psql
 
-from core.vector_client import get_embedding, _run
+from core import search_cache
+from core.pg_vector import VectorParam
+from core.vector_index import PG_ANN_FILTERED_EF
+from core.vector_client import (PG_PREPARED_ENABLED, get_embedding, get_embeddings,
+                                _run, _run_prepared)
 
 ALLOWED_TABLES = {"menu", "recensioni"}
 
@@ -28,6 +33,61 @@ _ALLOWED_EXTRA_SCORE_SQL: dict[str, set[str]] = {
 }
 
 
+
+def _norm_ingredients(values: Any) -> list[str] | None:
+    if isinstance(values, str):
+        values = [values]
+    out = sorted({str(v).strip().lower() for v in values or [] if str(v).strip()})
+    return out or None
+
+
+# Filtri strutturati ammessi: nome → (condizione SQL con {p}, tipo per PREPARE, normalizzatore).
+# Nessun SQL arriva dal chiamante: solo i valori, sempre come parametri.
+_ALLOWED_FILTERS: dict[str, dict[str, tuple[str, str, Callable[[Any], Any]]]] = {
+    "menu": {
+        "type":                ("lower(type) = lower({p})", "text",
+                                lambda v: str(v).strip() or None),
+        "price_min":           ("price >= {p}", "numeric", float),
+        "price_max":           ("price <= {p}", "numeric", float),
+        # ingredienti salvati in minuscolo (data/menu.json)
+        "exclude_ingredients": ("NOT (coalesce(ingredients, '{{}}') && {p}::text[])", "text[]",
+                                _norm_ingredients),
+    },
+    "recensioni": {},
+}
+
+
+def _parse_filters(table: str, filters: Dict[str, Any] | None) -> tuple[tuple[str, Any], ...]:
+    """Valida e normalizza i filtri → ((nome, valore), …) ordinati, senza valori vuoti."""
+    if not filters:
+        return ()
+    allowed = _ALLOWED_FILTERS.get(table, {})
+    unknown = set(filters) - set(allowed)
+    if unknown:
+        raise ValueError(f"Invalid filter(s) for table '{table}': {sorted(unknown)}")
+    out = []
+    for name in sorted(filters):
+        value = filters[name]
+        if value is None or value == "" or value == []:
+            continue
+        try:
+            value = allowed[name][2](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for filter '{name}': {value!r}") from None
+        if value is not None:
+            out.append((name, value))
+    return tuple(out)
+
+
+def _where_sql(table: str, names: Sequence[str],
+               placeholders: Sequence[psql.Composable]) -> psql.Composable:
+    if not names:
+        return psql.SQL("")
+    conds = [psql.SQL(_ALLOWED_FILTERS[table][n][0]).format(p=p)
+             for n, p in zip(names, placeholders)]
+    return psql.SQL("WHERE ") + psql.SQL(" AND ").join(conds)
+
+
 def _parse_fields(table: str, fields: str | Sequence[str] | None) -> list[str]:
     if not fields or fields == "*":
         return list(_DEFAULT_FIELDS[table])
@@ -45,34 +105,12 @@ def _parse_fields(table: str, fields: str | Sequence[str] | None) -> list[str]:
     return cols
 
 
-def search_table(
-    query: str,
-    *,
-    table: str,
-    fields: str | Sequence[str] | None = "*",
-    k: int = 5,
-    extra_score_sql: str = "",
-) -> List[Dict[str, Any]]:
-    """
-    Cerca corrispondenze semantiche in una tabella Postgres con colonna pgvector.
-
-    - table e columns sono whitelistati (no SQL injection)
-    - embedding e k sono parametrici
-    - extra_score_sql è allowlistato (evita SQL fragment arbitrari)
-    """
-    if table not in ALLOWED_TABLES:
-        raise ValueError(f"Invalid table: {table}")
-
-    cols = _parse_fields(table, fields)
+def _search_sql(table: str, cols: Sequence[str], extra_score_sql: str,
+                emb: psql.Composable, k: psql.Composable,
+                candidates: psql.Composable | None = None,
+                where: psql.Composable = psql.SQL("")) -> psql.Composed:
     fields_sql = psql.SQL(", ").join(psql.Identifier(c) for c in cols)
-
-    # embedding: lo passiamo come stringa vettore e castiamo a ::vector in SQL
-    emb = get_embedding(query)
-    emb_str = "[" + ",".join(f"{x:.6f}" for x in emb) + "]"
-
-    sim_expr = psql.SQL("(1 - (embedding <=> {emb}::vector))").format(
-        emb=psql.Placeholder("emb")
-    )
+    sim_expr = psql.SQL("(1 - (embedding <=> {emb}))").format(emb=emb)
 
     if extra_score_sql:
         if extra_score_sql not in _ALLOWED_EXTRA_SCORE_SQL.get(table, set()):
@@ -84,22 +122,284 @@ def search_table(
     else:
         score_expr = sim_expr
 
-    stmt = psql.SQL(
+    if extra_score_sql and candidates is not None:
+        # Due fasi: i `candidates` più vicini per pura distanza (servibili
+        # dall'indice ANN), poi il rerank con l'extra score solo su quelli.
+        # Lo score è la stessa espressione della versione a una fase.
+        return psql.SQL(
+            """
+            SELECT {fields},
+                   (1 - dist)                AS cos_sim,
+                   ((1 - dist) + ({extra}))  AS score
+            FROM  (SELECT {all_cols}, embedding <=> {emb} AS dist
+                   FROM   {table}
+                   {where}
+                   ORDER  BY embedding <=> {emb}
+                   LIMIT  {candidates}) AS c
+            ORDER  BY score DESC
+            LIMIT  {k}
+            """
+        ).format(
+            fields=fields_sql,
+            extra=psql.SQL(extra_score_sql),
+            all_cols=psql.SQL(", ").join(psql.Identifier(c)
+                                         for c in sorted(_ALLOWED_FIELDS[table])),
+            emb=emb,
+            table=psql.Identifier(table),
+            where=where,
+            candidates=candidates,
+            k=k,
+        )
+
+    # Senza extra score l'ordinamento è per distanza crescente (stesso ranking
+    # di score DESC): è la forma che un indice HNSW/IVFFlat può servire.
+    order_sql = (psql.SQL("score DESC") if extra_score_sql
+                 else psql.SQL("embedding <=> {emb}").format(emb=emb))
+
+    return psql.SQL(
         """
         SELECT {fields},
                {sim}   AS cos_sim,
                {score} AS score
         FROM   {table}
-        ORDER  BY score DESC
-        LIMIT  {k};
+        {where}
+        ORDER  BY {order}
+        LIMIT  {k}
         """
     ).format(
         fields=fields_sql,
         sim=sim_expr,
         score=score_expr,
         table=psql.Identifier(table),
-        k=psql.Placeholder("k"),
+        where=where,
+        order=order_sql,
+        k=k,
     )
 
-    logging.debug("[vector_table] search %s query_len=%d k=%d", table, len(query or ""), k)
-    return _run(stmt, {"emb": emb_str, "k": k}, dict_cursor=True)
+
+def _statement_name(prefix: str, table: str, *key: Any) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:10]
+    return f"{prefix}_{table}_{digest}"
+
+
+def _build(many: bool, table: str, cols: Sequence[str], extra_score_sql: str,
+           two_stage: bool, filter_names: Sequence[str],
+           ph: Dict[str, psql.Composable]) -> psql.Composed:
+    """Statement completo; `ph` mappa emb, k, n, f_<filtro> sui segnaposto."""
+    where = _where_sql(table, filter_names, [ph[f"f_{n}"] for n in filter_names])
+    candidates = ph["n"] if two_stage else None
+    if many:
+        return _search_many_sql(table, cols, extra_score_sql, embs=ph["emb"], k=ph["k"],
+                                candidates=candidates, where=where)
+    return _search_sql(table, cols, extra_score_sql, emb=ph["emb"], k=ph["k"],
+                       candidates=candidates, where=where)
+
+
+@lru_cache(maxsize=128)
+def _prepared_search(many: bool, table: str, cols: tuple[str, ...], extra_score_sql: str,
+                     two_stage: bool, filter_names: tuple[str, ...]
+                     ) -> tuple[str, psql.Composed, tuple[str, ...], tuple[str, ...]]:
+    """
+    Statement preparato per (tabella, colonne, extra score, due fasi, filtri):
+    il nome dipende dalla combinazione, così ogni connessione lo prepara una
+    sola volta. Ritorna (nome, statement, ordine dei parametri, tipi).
+    """
+    order = ["emb", "k"] + (["n"] if two_stage else []) + [f"f_{n}" for n in filter_names]
+    types = (["vector[]" if many else "vector", "int"] + (["int"] if two_stage else [])
+             + [_ALLOWED_FILTERS[table][n][1] for n in filter_names])
+    ph = {key: psql.SQL(f"${i}") for i, key in enumerate(order, start=1)}
+    stmt = _build(many, table, cols, extra_score_sql, two_stage, filter_names, ph)
+    name = _statement_name("vtm" if many else "vt", table,
+                           cols, extra_score_sql, two_stage, filter_names)
+    return name, stmt, tuple(order), tuple(types)
+
+
+def _execute(many: bool, emb_param: Any, table: str, cols: Sequence[str], k: int,
+             extra_score_sql: str, candidates: int,
+             filters: tuple[tuple[str, Any], ...], prepared: bool | None) -> list:
+    two_stage = bool(extra_score_sql) and candidates > 0
+    n = max(candidates, k) if two_stage else k          # righe attese dalla scansione
+    # i filtri sono applicati dopo la scansione dell'indice: serve un ef_search più ampio
+    ann_k = max(n, PG_ANN_FILTERED_EF) if filters else n
+    names = tuple(name for name, _ in filters)
+    values = {"emb": emb_param, "k": k, "n": n, **{f"f_{name}": v for name, v in filters}}
+
+    if PG_PREPARED_ENABLED if prepared is None else prepared:
+        name, stmt, order, types = _prepared_search(many, table, tuple(cols), extra_score_sql,
+                                                    two_stage, names)
+        return _run_prepared(name, stmt, types, [values[o] for o in order],
+                             dict_cursor=True, query_class="search", ann_k=ann_k)
+
+    ph = {key: psql.Placeholder(key) for key in values}
+    if many:
+        ph["emb"] = psql.SQL("{}::vector[]").format(ph["emb"])
+    stmt = _build(many, table, cols, extra_score_sql, two_stage, names, ph)
+    return _run(stmt, values, dict_cursor=True, query_class="search", ann_k=ann_k)
+
+
+def search_table_by_embedding(
+    emb: Sequence[float],
+    *,
+    table: str,
+    fields: str | Sequence[str] | None = "*",
+    k: int = 5,
+    extra_score_sql: str = "",
+    candidates: int = 0,
+    filters: Dict[str, Any] | None = None,
+    prepared: bool | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Come search_table, ma con l'embedding già calcolato.
+    prepared=None segue PG_PREPARED_ENABLED.
+    """
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Invalid table: {table}")
+
+    cols = _parse_fields(table, fields)
+    return _execute(False, VectorParam(emb), table, cols, k, extra_score_sql, candidates,
+                    _parse_filters(table, filters), prepared)
+
+
+def search_table(
+    query: str,
+    *,
+    table: str,
+    fields: str | Sequence[str] | None = "*",
+    k: int = 5,
+    extra_score_sql: str = "",
+    candidates: int = 0,
+    filters: Dict[str, Any] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Cerca corrispondenze semantiche in una tabella Postgres con colonna pgvector.
+
+    - table e columns sono whitelistati (no SQL injection)
+    - embedding e k sono parametrici (embedding via VectorParam, core/pg_vector.py)
+    - extra_score_sql è allowlistato (evita SQL fragment arbitrari)
+    - candidates > 0 con extra_score_sql: ricerca a due fasi (top `candidates`
+      per distanza via indice ANN, poi rerank con l'extra score); il ranking
+      è identico a quello esatto se il vero top-k è tra i candidati
+    - filters: filtri strutturati whitelistati (_ALLOWED_FILTERS), es.
+      {"type": "uramaki", "price_max": 12, "exclude_ingredients": ["avocado"]},
+      applicati nella stessa query dell'ordinamento vettoriale
+    - con PG_PREPARED_ENABLED la query è preparata una volta per connessione
+    - risultati in cache per tenant e versione della tabella (core/search_cache.py)
+    """
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Invalid table: {table}")
+
+    keys = search_cache.cache_keys(table, [query], *_cache_params(
+        table, fields, k, extra_score_sql, candidates, filters))
+    if keys:
+        cached = search_cache.get(table, keys[0])
+        if cached is not None:
+            return cached
+
+    logging.debug("[vector_table] search %s query_len=%d k=%d filters=%s",
+                  table, len(query or ""), k, filters)
+    rows = search_table_by_embedding(get_embedding(query), table=table, fields=fields,
+                                     k=k, extra_score_sql=extra_score_sql,
+                                     candidates=candidates, filters=filters)
+    if keys:
+        search_cache.put(table, keys[0], rows)
+    return rows
+
+
+def _cache_params(table: str, fields, k: int, extra_score_sql: str, candidates: int,
+                  filters: Dict[str, Any] | None) -> tuple:
+    """Parametri che, oltre al testo, determinano il risultato (chiave di cache)."""
+    return (tuple(_parse_fields(table, fields)), int(k), extra_score_sql, int(candidates),
+            _parse_filters(table, filters))
+
+
+# ───────────────────────────────────────────────────────────────────
+# Più query in un solo round trip
+# ───────────────────────────────────────────────────────────────────
+def _search_many_sql(table: str, cols: Sequence[str], extra_score_sql: str,
+                     embs: psql.Composable, k: psql.Composable,
+                     candidates: psql.Composable | None = None,
+                     where: psql.Composable = psql.SQL("")) -> psql.Composed:
+    """UNNEST dei vettori con ordinalità + top-k LATERAL per ciascuno."""
+    inner = _search_sql(table, cols, extra_score_sql, emb=psql.SQL("q.emb"), k=k,
+                        candidates=candidates, where=where)
+    return psql.SQL(
+        """
+        SELECT q.ord AS query_idx, t.*
+        FROM   unnest({embs}) WITH ORDINALITY AS q(emb, ord)
+        CROSS  JOIN LATERAL ({inner}) t
+        ORDER  BY q.ord, t.score DESC
+        """
+    ).format(embs=embs, inner=inner)
+
+
+def search_table_many_by_embedding(
+    embs: Sequence[Sequence[float]],
+    *,
+    table: str,
+    fields: str | Sequence[str] | None = "*",
+    k: int = 5,
+    extra_score_sql: str = "",
+    candidates: int = 0,
+    filters: Dict[str, Any] | None = None,
+    prepared: bool | None = None,
+) -> List[List[Dict[str, Any]]]:
+    """Come search_table_by_embedding per una lista di embedding: una lista di risultati per vettore."""
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Invalid table: {table}")
+    if not embs:
+        return []
+
+    cols = _parse_fields(table, fields)
+    rows = _execute(True, [VectorParam(e) for e in embs], table, cols, k, extra_score_sql,
+                    candidates, _parse_filters(table, filters), prepared)
+
+    grouped: List[List[Dict[str, Any]]] = [[] for _ in embs]
+    for r in rows:
+        r = dict(r)
+        grouped[r.pop("query_idx") - 1].append(r)
+    return grouped
+
+
+def search_table_many(
+    queries: Sequence[str],
+    *,
+    table: str,
+    fields: str | Sequence[str] | None = "*",
+    k: int = 5,
+    extra_score_sql: str = "",
+    candidates: int = 0,
+    filters: Dict[str, Any] | None = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Ricerca semantica di più testi insieme: gli embedding sono calcolati in
+    un solo batch (get_embeddings) e le ricerche girano in un'unica query SQL.
+    Restituisce una lista di risultati per ogni query, nello stesso ordine.
+    Solo i testi assenti dalla cache dei risultati vanno su Postgres.
+    """
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Invalid table: {table}")
+    if not queries:
+        return []
+
+    queries = list(queries)
+    keys = search_cache.cache_keys(table, queries, *_cache_params(
+        table, fields, k, extra_score_sql, candidates, filters))
+    out: List[List[Dict[str, Any]] | None] = [None] * len(queries)
+    if keys:
+        for i, key in enumerate(keys):
+            out[i] = search_cache.get(table, key)
+    missing = [i for i, rows in enumerate(out) if rows is None]
+    if not missing:
+        return out
+
+    logging.debug("[vector_table] search_many %s n=%d (in cache %d) k=%d",
+                  table, len(queries), len(queries) - len(missing), k)
+    results = search_table_many_by_embedding(get_embeddings([queries[i] for i in missing]),
+                                             table=table, fields=fields, k=k,
+                                             extra_score_sql=extra_score_sql,
+                                             candidates=candidates, filters=filters)
+    for i, rows in zip(missing, results):
+        out[i] = rows
+        if keys:
+            search_cache.put(table, keys[i], rows)
+    return out
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+install_data_version.py
+───────────────────────────────────────────────────────────────────────────────
+Installa tabella `data_version` e trigger di versione (core/data_version.py)
+su DB tenant già esistenti, senza ricaricare i dati. Serve un ruolo
+proprietario delle tabelle e Postgres ≥ 14; l'app non esegue DDL.
+
+Esempio di esecuzione:
+    python data/install_data_version.py                    # DB_NAME
+    python data/install_data_version.py tenant_001 tenant_002
+"""
+
+import os, sys
+from pathlib import Path
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.data_version import VERSIONED_TABLES, ensure_data_version
+
+DB = dict(
+    user     = os.getenv("DB_USER", "postgres"),
+    password = os.getenv("DB_PASS", "postgres"),
+    host     = os.getenv("DB_HOST", "localhost"),
+    port     = int(os.getenv("DB_PORT", "5432")),
+)
+
+failed = 0
+for dbname in sys.argv[1:] or [os.getenv("DB_NAME", "demo_restaurant")]:
+    try:
+        with psycopg2.connect(dbname=dbname, **DB) as con, con.cursor() as cur:
+            ensure_data_version(cur)
+            cur.execute("SELECT t FROM unnest(%s::text[]) AS t WHERE to_regclass(t) IS NOT NULL",
+                        (list(VERSIONED_TABLES),))
+            print(f"✓ {dbname}: trigger su {', '.join(r[0] for r in cur.fetchall()) or 'nessuna tabella'}")
+    except Exception as e:
+        failed += 1
+        print(f"ERRORE SQL su {dbname}: {e}")
+sys.exit(1 if failed else 0)
@@ -22,7 +22,10 @@ import psycopg2, psycopg2.extras
 # AGGIUNTA FONDAMENTALE: Aggiunge la root del progetto al path per importare 'core'
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from core.vector_client import get_embedding  # <--- Usa il client centralizzato
+from core.vector_client import get_embeddings  # <--- Usa il client centralizzato
+from core.data_version import ensure_data_version
+from core.vector_index import drop_vector_indexes, ensure_filter_indexes, ensure_vector_index
+from core.embedding_texts import menu_text
 
 # Configurazione DB
 DB = dict(
@@ -42,22 +45,21 @@ with MENU_JSON.open(encoding="utf-8") as f:
 
 print(f"  Trovati {len(raw_menu)} piatti. Calcolo embedding via Provider configurato...")
 
-rows = []
 start = time.time()
 
-for item in raw_menu:
-    # Crea il testo da vettorizzare
-    txt = " | ".join([
-        item.get("name", ""),
-        item.get("type", ""),
-        item.get("description", ""),
-        ", ".join(item.get("ingredients", []))
-    ])
-    
-    # CHIAMA OPENAI (o il modello locale leggero) TRAMITE IL CLIENT UNIFICATO
-    # Gestisce automaticamente i ritentativi e la logica
-    vector = get_embedding(txt) 
+# Crea i testi da vettorizzare
+texts = [
+    menu_text(item.get("name", ""), item.get("type", ""),
+              item.get("description", ""), item.get("ingredients", []))
+    for item in raw_menu
+]
+
+# CHIAMA OPENAI (o il modello locale leggero) TRAMITE IL CLIENT UNIFICATO
+# Un'unica chiamata bulk: il client codifica i testi a blocchi
+vectors = get_embeddings(texts, cache=False)
 
+rows = []
+for item, vector in zip(raw_menu, vectors):
     rows.append((
         item.get("name", ""),
         item.get("type", ""),
@@ -76,8 +78,11 @@ VALUES %s
 
 try:
     with psycopg2.connect(**DB) as con, con.cursor() as cur:
+        # Trigger di versione: le app in esecuzione ricaricano indici e cache
+        ensure_data_version(cur)
         # Svuota la tabella prima di ricaricare per evitare duplicati
         cur.execute("TRUNCATE TABLE menu;")
+        drop_vector_indexes(cur, "menu")   # ricostruito dopo il bulk insert
         
         psycopg2.extras.execute_values(
             cur,
@@ -86,5 +91,8 @@ try:
             template="(%s,%s,%s,%s,%s,%s::vector)"
         )
         print(f"✓ Inseriti {len(rows)} record in tabella menu")
+        idx = ensure_vector_index(cur, "menu")
+        ensure_filter_indexes(cur, "menu")       # tipo / prezzo per le ricerche filtrate
+        print(f"✓ Indice vettoriale: {idx or 'nessuno (VECTOR_INDEX_KIND=none)'}")
 except Exception as e:
     print(f"ERRORE SQL: {e}")
\ No newline at end of file
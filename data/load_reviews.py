@@ -14,15 +14,17 @@ Esempio di esecuzione:
 """
 
 #!/usr/bin/env python3
-import os, sys, time
-import pandas as pd
+import csv, os, sys, time
 from pathlib import Path
 import psycopg2, psycopg2.extras
 
 # AGGIUNTA FONDAMENTALE
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from core.vector_client import get_embedding
+from core.vector_client import get_embeddings
+from core.data_version import ensure_data_version
+from core.vector_index import drop_vector_indexes, ensure_vector_index
+from core.embedding_texts import review_text
 
 DB = dict(
     dbname   = os.getenv("DB_NAME", "demo_restaurant"),
@@ -35,24 +37,23 @@ DATA_DIR   = Path(__file__).resolve().parent
 CSV_PATH   = Path(os.getenv("REVIEWS_CSV", DATA_DIR / "recensioni.csv"))
 
 print(f"• Apro {CSV_PATH} …")
-df = pd.read_csv(CSV_PATH)
-print(f"  Trovate {len(df)} recensioni. Calcolo embedding...")
+with CSV_PATH.open(encoding="utf-8", newline="") as f:
+    records = [r for r in csv.DictReader(f)]
+print(f"  Trovate {len(records)} recensioni. Calcolo embedding...")
 
-rows = []
 start = time.time()
 
-for _, row in df.iterrows():
-    txt = row["recensione"]
-    if isinstance(row["piatti"], str):
-        txt += " | Piatti: " + row["piatti"]
-    
-    vector = get_embedding(txt)
+texts = [review_text(row["recensione"], row.get("piatti")) for row in records]
+
+vectors = get_embeddings(texts, cache=False)
 
+rows = []
+for row, vector in zip(records, vectors):
     rows.append((
         row["id"],
         int(row["voto"]),
         row["recensione"],
-        row["piatti"],
+        row.get("piatti") or None,
         vector
     ))
 
@@ -65,7 +66,9 @@ VALUES %s
 
 try:
     with psycopg2.connect(**DB) as con, con.cursor() as cur:
+        ensure_data_version(cur)          # bump della versione → invalida le cache
         cur.execute("TRUNCATE TABLE recensioni;")
+        drop_vector_indexes(cur, "recensioni")   # ricostruito dopo il bulk insert
         psycopg2.extras.execute_values(
             cur,
             INSERT_SQL,
@@ -73,5 +76,7 @@ try:
             template="(%s,%s,%s,%s,%s::vector)"
         )
         print(f"✓ Inseriti {len(rows)} record in tabella recensioni")
+        idx = ensure_vector_index(cur, "recensioni")
+        print(f"✓ Indice vettoriale: {idx or 'nessuno (VECTOR_INDEX_KIND=none)'}")
 except Exception as e:
     print(f"ERRORE: {e}")
@@ -4,12 +4,17 @@ import os
 from flask import Flask
 from core.config import Config                  # Configurazione centralizzata dell'app
 from core.db import init_db                     # Funzione per inizializzare il database
+from core.vector_client import warmup_embeddings, get_worker_pool  # Preload / pool embedding
+from menu_services.menu_index import MENU_INDEX_ENABLED, warmup_menu_index  # Indice menu in RAM
+from menu_services.ingredient_similarity import bootstrap_async as warmup_ingredients  # Sostituzioni
 from routes.menu import menu_bp                 # Blueprint per le rotte del menu
 from routes.ingredients import ingredients_bp   # Blueprint per le rotte degli ingredienti
 from routes.cart import cart_bp                 # Blueprint per le rotte del carrello
 from routes.chat import chat_bp                 # Blueprint per la chat AI
+from chat_services.chat_service import warmup_prefix_cache  # Prefix cache vLLM per tenant
+from routes.stats import stats_bp               # Blueprint per le metriche runtime
 
-import logging, sys
+import logging, sys, threading
 
 # Configurazione del logging globale dell'applicazione
 logging.basicConfig(
@@ -40,5 +45,30 @@ def create_app() -> Flask:
     app.register_blueprint(ingredients_bp, url_prefix=api_prefix) # Rotte per gli ingredienti
     app.register_blueprint(cart_bp, url_prefix=api_prefix)        # Rotte per il carrello
     app.register_blueprint(chat_bp, url_prefix=api_prefix)        # Rotte per la chat AI
+    app.register_blueprint(stats_bp, url_prefix=api_prefix)       # Metriche (cache, pool, ...)
+
+    # Il modello embedding si carica al primo utilizzo; con EMBEDDING_WARMUP=1
+    # viene caricato in background subito dopo l'avvio (senza bloccare /menu, /cart)
+    if os.getenv("EMBEDDING_EXECUTION", "inline") == "pool":
+        # il pool di processi va creato (fork) prima dei thread delle richieste
+        get_worker_pool()
+    elif os.getenv("EMBEDDING_WARMUP", "0") == "1":
+        warmup_embeddings(background=True)
+
+    # Indice vettoriale del menu (tenant di default) caricato in background
+    if MENU_INDEX_ENABLED:
+        threading.Thread(target=warmup_menu_index, name="menu-index-warmup",
+                         daemon=True).start()
+    # L'indice degli ingredienti calcola gli embedding (e quindi carica il
+    # modello): all'avvio solo su richiesta, come EMBEDDING_WARMUP
+    if os.getenv("INGREDIENT_INDEX_WARMUP", "0") == "1":
+        warmup_ingredients()
+
+    # LLM_PREFIX_WARMUP=sushi,pizza: parte statica del prompt di ogni tenant
+    # già in prefix cache su vLLM prima del primo utente (PROMPT_LAYOUT=prefix)
+    warm_projects = [p.strip() for p in os.getenv("LLM_PREFIX_WARMUP", "").split(",") if p.strip()]
+    if warm_projects:
+        threading.Thread(target=warmup_prefix_cache, args=(warm_projects,),
+                         name="llm-prefix-warmup", daemon=True).start()
 
     return app
@@ -0,0 +1,98 @@
+# menu_services/fuzzy_matcher.py
+"""
+Matcher fuzzy dei nomi del menu, costruito una volta per snapshot del menu.
+────────────────────────────────────────────────────────────────────
+Stesso punteggio di search_service._token_overlap_score
+(difflib ratio + 0.1 × token in comune, 0 senza token in comune), ma:
+
+• nomi già normalizzati e tokenizzati alla costruzione;
+• indice invertito token → righe: si valutano solo i piatti che hanno
+  almeno un token in comune con la richiesta (gli altri avrebbero score 0);
+  il conteggio dei token in comune arriva dall'indice stesso;
+• potatura top-k: i candidati sono visitati per numero di token in comune
+  decrescente e SequenceMatcher.ratio() è calcolato solo se i limiti
+  superiori economici (real_quick_ratio, quick_ratio) possono ancora
+  battere il k-esimo miglior punteggio.
+
+Benchmark contro la scansione lineare: tools/bench_fuzzy_match.py
+"""
+
+from __future__ import annotations
+import difflib, heapq
+from collections import defaultdict
+from typing import Any, Dict, List, Sequence, Tuple
+
+_OVERLAP_BONUS = 0.1
+
+
+def _normalize(text: str | None) -> str:
+    return (text or "").lower().strip()
+
+
+class FuzzyMatcher:
+    """Indice invertito sui token dei nomi + scorer difflib sui soli candidati."""
+
+    def __init__(self, rows: Sequence[Dict[str, Any]], field: str = "name"):
+        self.rows: List[Dict[str, Any]] = []
+        self.names: List[str] = []
+        self._index: Dict[str, List[int]] = defaultdict(list)
+        for row in rows:
+            name = _normalize(row.get(field))
+            if not name:
+                continue
+            pos = len(self.rows)
+            self.rows.append(row)
+            self.names.append(name)
+            for tok in set(name.split()):
+                self._index[tok].append(pos)
+        self._index = dict(self._index)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _overlaps(self, tokens: set[str]) -> Dict[int, int]:
+        counts: Dict[int, int] = defaultdict(int)
+        for tok in tokens:
+            for pos in self._index.get(tok, ()):
+                counts[pos] += 1
+        return counts
+
+    def top_k(self, query: str, k: int = 3) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        I `k` piatti con punteggio più alto (> 0), come (riga, score) ordinati
+        per score decrescente; a pari merito vince l'ordine del menu.
+        """
+        q = _normalize(query)
+        if not q or k <= 0:
+            return []
+        counts = self._overlaps(set(q.split()))
+        if not counts:
+            return []
+
+        # più token in comune prima: soglia alta presto, più candidati potati
+        order = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        heap: List[Tuple[float, int]] = []        # min-heap di (score, -pos)
+        sm = difflib.SequenceMatcher(None, q)
+        for pos, overlap in order:
+            bonus = _OVERLAP_BONUS * overlap
+            if len(heap) == k:
+                # ratio ≤ 1: da qui in poi nessun candidato può entrare
+                if heap[0][0] > 1.0 + bonus:
+                    break
+                floor = heap[0][0] - bonus
+                sm.set_seq2(self.names[pos])
+                if sm.real_quick_ratio() < floor or sm.quick_ratio() < floor:
+                    continue
+            else:
+                sm.set_seq2(self.names[pos])
+            item = (sm.ratio() + bonus, -pos)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+        return [(self.rows[-p], score) for score, p in sorted(heap, reverse=True)]
+
+    def best(self, query: str) -> Dict[str, Any] | None:
+        top = self.top_k(query, 1)
+        return top[0][0] if top else None
@@ -0,0 +1,215 @@
+# menu_services/hybrid_search.py
+"""
+Ricerca ibrida (lessicale + vettoriale) dei piatti per nome.
+────────────────────────────────────────────────────────────────────
+I nomi dei prodotti richiesti in chat ("uramaki sunburn") sono quasi sempre
+nomi del menu o alias: per questi l'embedding è un costo inutile e la sola
+similarità vettoriale a volte preferisce un piatto "simile" a quello giusto.
+
+• passo lessicale (nessun embedding): match esatto sul nome (o sul nome
+  canonico dell'alias, core/aliases.py) + full-text su nome (peso A) e
+  descrizione (peso B), token in OR con match per prefisso; sullo snapshot
+  in memoria di menu_index.py se disponibile, altrimenti una query SQL;
+• match esatto → risposta immediata: il piatto trovato seguito dagli altri
+  risultati lessicali, senza calcolare l'embedding;
+• altrimenti fusione dei due ranking con Reciprocal Rank Fusion:
+  score = Σ 1 / (MENU_RRF_K + rank), sui primi MENU_HYBRID_CANDIDATES di
+  ciascuna lista.
+
+MENU_SEARCH_MODE=vector torna alla sola ricerca vettoriale.
+"""
+
+from __future__ import annotations
+import logging, os, re
+from typing import Any, Dict, List, Sequence
+
+from psycopg2 import sql as psql
+
+from core.aliases import resolve as resolve_alias
+from core.vector_client import _run
+from core.vector_index import MENU_TSV_SQL
+from core.vector_table import _parse_filters, _where_sql
+from menu_services import vector_db
+
+MENU_SEARCH_MODE       = os.getenv("MENU_SEARCH_MODE", "hybrid").lower()   # hybrid | vector
+MENU_HYBRID_CANDIDATES = int(os.getenv("MENU_HYBRID_CANDIDATES", "20"))
+MENU_RRF_K             = int(os.getenv("MENU_RRF_K", "60"))
+
+_FIELDS = ("id", "name", "type", "ingredients", "description", "price")
+_TOKEN = re.compile(r"\w+")
+_MAX_TOKENS = 16
+
+_LEXICAL_ROW = """
+    SELECT {fields},
+           lower(m.name) IN ({n1}, {n2}) AS exact,
+           coalesce(ts_rank_cd({tsv}, q.q), 0) AS lex
+    FROM (SELECT * FROM menu {where}) m,
+         LATERAL (SELECT to_tsquery('simple', {tsq}) AS q) q
+    WHERE lower(m.name) IN ({n1}, {n2}) OR {tsv} @@ q.q
+    ORDER BY exact DESC, lex DESC, m.id
+    LIMIT {limit}
+"""
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def _query_terms(text: str) -> List[tuple[str, bool]]:
+    """Token distinti (≥ 2 caratteri) come (token, prefisso): prefisso dai 3 caratteri."""
+    tokens = list(dict.fromkeys(_TOKEN.findall(_normalize(text))))[:_MAX_TOKENS]
+    return [(t, len(t) >= 3) for t in tokens if len(t) >= 2]
+
+
+def _tsquery_text(text: str) -> str | None:
+    """'Uramaki sunburn' → "uramaki:* | sunburn:*" (token ≥ 3 caratteri per prefisso)."""
+    terms = [f"{t}:*" if prefix else t for t, prefix in _query_terms(text)]
+    return " | ".join(terms) or None
+
+
+def _lexical_params(query: str) -> tuple[str, str, str | None]:
+    name = _normalize(query)
+    return name, _normalize(resolve_alias(name)), _tsquery_text(name)
+
+
+def _filters_sql(filters: Dict[str, Any] | None) -> tuple[psql.Composable, list[Any]]:
+    parsed = _parse_filters("menu", filters)
+    names = [n for n, _ in parsed]
+    where = _where_sql("menu", names, [psql.Placeholder()] * len(names))
+    return where, [v for _, v in parsed]
+
+
+def _lexical_sql(n1, n2, tsq, where: psql.Composable, limit: int) -> psql.Composable:
+    return psql.SQL(_LEXICAL_ROW).format(
+        fields=psql.SQL(", ").join(psql.SQL("m.") + psql.Identifier(f) for f in _FIELDS),
+        tsv=psql.SQL(MENU_TSV_SQL),          # stessa espressione dell'indice GIN
+        n1=n1, n2=n2, tsq=tsq, where=where, limit=psql.Literal(int(limit)),
+    )
+
+
+def lexical_search_menu_many(queries: Sequence[str], k: int = MENU_HYBRID_CANDIDATES,
+                             filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+    """
+    Passo lessicale per più testi: sull'indice in memoria del tenant se
+    caricato, altrimenti con una sola query (UNNEST + LATERAL).
+    Ogni riga ha `exact` (nome o alias identico) e `lex` (ts_rank_cd).
+    """
+    if not queries:
+        return []
+    index = vector_db._menu_index_or_none()
+    if index is not None:
+        names = [_normalize(q) for q in queries]
+        return index.lexical_search_many(
+            [(n, _normalize(resolve_alias(n)), _query_terms(n)) for n in names], k, filters=filters)
+
+    where, fargs = _filters_sql(filters)
+    inner = _lexical_sql(psql.SQL("u.n1"), psql.SQL("u.n2"), psql.SQL("u.tsq"), where, k)
+    stmt = psql.SQL(
+        "SELECT u.idx AS query_idx, r.* "
+        "FROM unnest(%s::text[], %s::text[], %s::text[]) WITH ORDINALITY AS u(n1, n2, tsq, idx) "
+        "CROSS JOIN LATERAL ({inner}) r "
+        "ORDER BY u.idx"
+    ).format(inner=inner)
+    params = [_lexical_params(q) for q in queries]
+    args = [[p[0] for p in params], [p[1] for p in params], [p[2] for p in params], *fargs]
+    # i segnaposto dei filtri stanno nella subquery laterale, dopo gli array
+    rows = _run(stmt, args, dict_cursor=True, query_class="search")
+
+    out: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    for r in rows:
+        r = dict(r)
+        out[r.pop("query_idx") - 1].append(r)
+    return out
+
+
+def lexical_search_menu(query: str, k: int = MENU_HYBRID_CANDIDATES,
+                        filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+    return lexical_search_menu_many([query], k, filters)[0]
+
+
+# ───────────────────────────────────────────────────────────────────
+def _rrf_weight(rank: int) -> float:
+    return 1.0 / (MENU_RRF_K + rank)
+
+
+def _exact_result(lexical: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    out = []
+    for rank, r in enumerate(lexical[:k], start=1):
+        row = {f: r[f] for f in _FIELDS}
+        row["score"] = _rrf_weight(rank)
+        row["match"] = "exact" if rank == 1 else "lexical"
+        out.append(row)
+    return out
+
+
+def fuse_rankings(lexical: List[Dict[str, Any]], vector: List[Dict[str, Any]],
+                  k: int) -> List[Dict[str, Any]]:
+    """Reciprocal Rank Fusion di due liste di piatti (chiave `id`)."""
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for source in (lexical, vector):
+        for rank, r in enumerate(source[:MENU_HYBRID_CANDIDATES], start=1):
+            row = fused.get(r["id"])
+            if row is None:
+                row = fused[r["id"]] = {f: r[f] for f in _FIELDS}
+                row["score"] = 0.0
+                row["cos_sim"] = None
+            row["score"] += _rrf_weight(rank)
+            if "cos_sim" in r:
+                row["cos_sim"] = r["cos_sim"]
+    ranked = sorted(fused.values(),
+                    key=lambda r: (-r["score"], -(r["cos_sim"] if r["cos_sim"] is not None else -1.0)))
+    for r in ranked:
+        r["match"] = "hybrid"
+    return ranked[:k]
+
+
+def hybrid_search_menu_many(queries: Sequence[str], k: int = 5,
+                            filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+    """
+    Ricerca ibrida di più testi: un passo lessicale per tutti, poi la ricerca
+    vettoriale (un solo batch di embedding) solo per i testi senza match esatto.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+    lexical = lexical_search_menu_many(queries, max(k, MENU_HYBRID_CANDIDATES), filters)
+
+    out: List[List[Dict[str, Any]] | None] = [None] * len(queries)
+    pending = []
+    for i, rows in enumerate(lexical):
+        if rows and rows[0]["exact"]:
+            out[i] = _exact_result(rows, k)
+        else:
+            pending.append(i)
+
+    if pending:
+        vectors = vector_db.search_menu_many([queries[i] for i in pending],
+                                             max(k, MENU_HYBRID_CANDIDATES), filters)
+        for i, vec in zip(pending, vectors):
+            out[i] = fuse_rankings(lexical[i], vec, k)
+
+    logging.debug("[hybrid_search] %d query, %d match esatti", len(queries),
+                  len(queries) - len(pending))
+    return out
+
+
+def hybrid_search_menu(query: str, k: int = 5,
+                       filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+    return hybrid_search_menu_many([query], k, filters)[0]
+
+
+# ───────────────────────────────────────────────────────────────────
+def search_products(query: str, k: int = 5,
+                    filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+    """Ricerca di un prodotto per nome secondo MENU_SEARCH_MODE."""
+    if MENU_SEARCH_MODE == "hybrid":
+        return hybrid_search_menu(query, k, filters)
+    return vector_db.search_menu(query, k, filters)
+
+
+def search_products_many(queries: Sequence[str], k: int = 5,
+                         filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+    """Come search_products per più nomi (una ricerca lessicale + un batch vettoriale)."""
+    if MENU_SEARCH_MODE == "hybrid":
+        return hybrid_search_menu_many(queries, k, filters)
+    return vector_db.search_menu_many(list(queries), k, filters)
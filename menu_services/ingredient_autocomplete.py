@@ -0,0 +1,94 @@
+# menu_services/ingredient_autocomplete.py
+"""
+Elenco ingredienti e autocompletamento per prefisso (route /ingredienti).
+────────────────────────────────────────────────────────────────────
+• per tenant, ricostruito solo quando cambia la versione del menu
+  (core/data_version.py): niente DISTINCT UNNEST sulla tabella a ogni
+  richiesta né a ogni tasto premuto nel frontend;
+• trie sugli id normalizzati (normalize_id: "Salsa di Soia" → "salsadisoia");
+  ogni nodo tiene gli indici delle voci sotto di sé già in ordine
+  alfabetico, quindi una ricerca costa O(len(prefisso) + limit).
+"""
+
+from __future__ import annotations
+import logging, re, threading, unicodedata
+from typing import Dict, List
+
+from core.data_version import get_version
+from core.db_router import get_current_db
+from menu_services.vector_db import list_unique_ingredients
+
+
+def normalize_id(name: str) -> str:
+    """
+    Normalizza un nome in un ID leggibile e privo di simboli, adatto a URL o frontend.
+    Esempio: "Salsa di Soia" → "salsadisoia"
+    """
+    txt = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-zA-Z0-9]", "", txt).lower()
+
+
+class _Node:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.entries: List[int] = []
+
+
+class IngredientTrie:
+    """Voci {"id", "nome"} ordinate per nome + trie sugli id."""
+
+    def __init__(self, version: int | None, names: List[str]):
+        self.version = version
+        self.entries = sorted(({"id": normalize_id(n), "nome": n} for n in names if n),
+                              key=lambda x: x["nome"].lower())
+        self._root = _Node()
+        for pos, entry in enumerate(self.entries):     # in ordine: liste dei nodi già ordinate
+            node = self._root
+            node.entries.append(pos)
+            for ch in entry["id"]:
+                node = node.children.setdefault(ch, _Node())
+                node.entries.append(pos)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Voci il cui id inizia con normalize_id(prefix), in ordine alfabetico."""
+        node = self._root
+        for ch in normalize_id(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return [self.entries[i] for i in node.entries[:max(0, limit)]]
+
+
+# ───────────────────────────────────────────────────────────────────
+_TRIES: Dict[str, IngredientTrie] = {}
+_LOCKS: Dict[str, threading.Lock] = {}
+_GUARD = threading.Lock()
+
+
+def get_ingredient_trie() -> IngredientTrie:
+    """
+    Trie del tenant corrente, ricostruito se la versione del menu è cambiata
+    (a ogni chiamata se la versione è sconosciuta).
+    """
+    dbname = get_current_db()
+    version = get_version("menu")
+    if version is None:
+        return IngredientTrie(None, list_unique_ingredients())
+    trie = _TRIES.get(dbname)
+    if trie is not None and trie.version == version:
+        return trie
+
+    with _GUARD:
+        lock = _LOCKS.setdefault(dbname, threading.Lock())
+    with lock:                                   # una sola ricostruzione per tenant
+        trie = _TRIES.get(dbname)
+        if trie is None or trie.version != version:
+            trie = _TRIES[dbname] = IngredientTrie(version, list_unique_ingredients())
+            logging.debug("[ingredient_autocomplete] %s: %d ingredienti (v%d)",
+                          dbname, len(trie), version)
+        return trie
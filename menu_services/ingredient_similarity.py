@@ -1,59 +1,171 @@
 # menu_services/ingredient_similarity.py
 """
-    file non utilizzato al momento
+Ingredienti simili (sostituzioni: "niente tofu, cosa c'è di simile?").
+────────────────────────────────────────────────────────────────────
+• per tenant: matrice float32 contigua degli embedding normalizzati di
+  tutti gli ingredienti del menu, calcolati in un solo batch;
+• ricaricata quando cambia la versione del menu (core/data_version.py),
+  come l'indice dei piatti (menu_index.py); a versione sconosciuta
+  (trigger mancante) dopo INGREDIENT_INDEX_TTL_S secondi;
+• al massimo INGREDIENT_INDEX_MAX_TENANTS tenant in memoria (LRU);
+• top-n: prodotto matrice-vettore + argpartition (niente sort completo);
+• ingrediente già nel menu → si usa la sua riga della matrice, senza
+  calcolare l'embedding.
+
+Esposto da routes/ingredients.py come GET /ingredients/similar.
 """
 
 from __future__ import annotations
-import logging, threading
-from typing import List
-from sklearn.metrics.pairwise import cosine_similarity
+import logging, os, threading, time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from core.data_version import get_version
+from core.db_router import get_current_db
+from core.lru import LRUCache
+from core.vector_client import get_embedding, get_embeddings
 from menu_services.vector_db import list_unique_ingredients
-from core.vector_client import get_embedding
 
-# Cache globale: lista ingredienti e relativi embedding
-_raw_ing: list[str] = []
-_raw_emb: list[list[float]] = []
+INGREDIENT_INDEX_TTL_S       = float(os.getenv("INGREDIENT_INDEX_TTL_S", "300"))
+INGREDIENT_INDEX_MAX_TENANTS = int(os.getenv("INGREDIENT_INDEX_MAX_TENANTS", "64"))
 
-# Flag che indica se il preload è stato completato (thread-safe)
-_ready = threading.Event()         
 
+def _key(name: str) -> str:
+    return " ".join((name or "").lower().split())
 
-def _loader():
-    """
-    Carica tutti gli ingredienti dal DB e ne calcola gli embedding.
-    Operazione eseguita in background all'avvio.
-    """
-    global _raw_ing, _raw_emb
-    logging.debug("[ingredient_similarity] start preload …")
-    try:
-        _raw_ing = list_unique_ingredients()
-        _raw_emb = [get_embedding(i) for i in _raw_ing]
-        logging.debug("[ingredient_similarity] %d ingredienti caricati", len(_raw_ing))
-    finally:
-        _ready.set()                
-    logging.debug("[ingredient_similarity] preload done")
 
+class IngredientIndex:
+    """Nomi degli ingredienti + matrice (n, dim) float32 normalizzata."""
 
-def bootstrap_async():
+    def __init__(self, version: int | None, names: List[str], matrix: np.ndarray):
+        self.version = version
+        self.names = names
+        self.matrix = matrix
+        self.loaded_at = time.time()
+        self._pos = {_key(n): i for i, n in enumerate(names)}
+
+    @classmethod
+    def from_names(cls, version: int | None, names: Sequence[str],
+                   vectors: Sequence[Sequence[float]]) -> "IngredientIndex":
+        names = list(names)
+        dim = len(vectors[0]) if len(vectors) else 0
+        matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(len(names), dim))
+        matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        return cls(version, names, matrix)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def vector_for(self, name: str) -> np.ndarray | None:
+        pos = self._pos.get(_key(name))
+        return None if pos is None else self.matrix[pos]
+
+    def similar(self, emb: Sequence[float], top_n: int = 3,
+                exclude: str | None = None) -> List[Dict[str, Any]]:
+        """I `top_n` ingredienti più simili a `emb` (escluso `exclude`), con score coseno."""
+        if not len(self.names) or top_n <= 0:
+            return []
+        q = np.asarray(emb, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        sims = self.matrix @ q
+        skip = self._pos.get(_key(exclude)) if exclude else None
+        if skip is not None:
+            sims[skip] = -np.inf
+        n = min(top_n, len(sims) - (skip is not None))
+        if n <= 0:
+            return []
+        top = np.argpartition(-sims, n - 1)[:n] if n < len(sims) else np.arange(len(sims))
+        top = top[np.argsort(-sims[top], kind="stable")][:n]
+        return [{"nome": self.names[i], "score": float(sims[i])} for i in top]
+
+
+# ───────────────────────────────────────────────────────────────────
+# Cache per tenant: dbname → IngredientIndex (ricaricato al cambio di versione del menu)
+_LOCKS: Dict[str, threading.Lock] = {}
+_GUARD = threading.Lock()
+
+
+def _drop_lock(dbname: str, _value):
+    with _GUARD:
+        _LOCKS.pop(dbname, None)
+
+
+_INDEXES = LRUCache(INGREDIENT_INDEX_MAX_TENANTS, on_evict=_drop_lock)
+
+
+def _fresh(index: IngredientIndex | None, version: int | None) -> bool:
+    if index is None or index.version != version:
+        return False
+    return version is not None or time.time() - index.loaded_at < INGREDIENT_INDEX_TTL_S
+
+
+def _load(version: int | None) -> IngredientIndex:
+    t0 = time.perf_counter()
+    names = [n for n in list_unique_ingredients() if n]
+    # nomi codificati così come sono, come i documenti dei loader: la cache
+    # delle query non va riempita con l'elenco ingredienti di ogni tenant
+    vectors = get_embeddings(names, cache=False) if names else []
+    index = IngredientIndex.from_names(version, names, vectors)
+    logging.info("[ingredient_similarity] %s: %d ingredienti (v%s) in %.1f ms",
+                 get_current_db(), len(index), version, (time.perf_counter() - t0) * 1000)
+    return index
+
+
+def get_ingredient_index() -> IngredientIndex:
     """
-    Lanciato una sola volta all’avvio dell’app (non blocca).
+    Indice del tenant corrente, ricaricato se la versione del menu è cambiata
+    (ogni INGREDIENT_INDEX_TTL_S secondi se la versione è sconosciuta).
     """
-    if not _ready.is_set():
-        threading.Thread(target=_loader, daemon=True).start()
+    dbname = get_current_db()
+    version = get_version("menu")
+    index = _INDEXES.get(dbname)
+    if _fresh(index, version):
+        return index
 
+    with _GUARD:
+        lock = _LOCKS.setdefault(dbname, threading.Lock())
+    with lock:                                   # un solo reload per tenant
+        index = _INDEXES.get(dbname)
+        if not _fresh(index, version):
+            index = _load(version)
+            _INDEXES.put(dbname, index)
+        return index
 
-def get_similar(ing: str, top_n: int = 3) -> List[str]:
+
+def similar_ingredients(ing: str, top_n: int = 3) -> List[Dict[str, Any]]:
     """
-    Restituisce i top-N ingredienti più simili.  
-    Se il preload non è ancora finito ⇒ attende al massimo 3 s
-    (nel peggiore dei casi tornerà lista vuota).
+    Ingredienti del menu più simili a `ing` (escluso `ing` stesso),
+    come [{"nome": ..., "score": ...}] per score decrescente.
     """
-    _ready.wait(timeout=3)          # attesa max 3 s
-    if not _raw_emb:
-        logging.warning("ingredient_similarity non disponibile (init non completato)")
+    if not (ing or "").strip():
         return []
+    index = get_ingredient_index()
+    emb = index.vector_for(ing)
+    if emb is None:
+        emb = get_embedding(ing)
+    return index.similar(emb, top_n, exclude=ing)
+
+
+def get_similar(ing: str, top_n: int = 3) -> List[str]:
+    """Solo i nomi dei top-N ingredienti più simili."""
+    return [r["nome"] for r in similar_ingredients(ing, top_n)]
+
+
+def bootstrap_async():
+    """Carica in background l'indice del tenant corrente (non blocca)."""
+    def warmup():
+        try:
+            get_ingredient_index()
+        except Exception as exc:
+            logging.warning("[ingredient_similarity] warmup fallito su %s: %s",
+                            get_current_db(), exc)
+    threading.Thread(target=warmup, name="ingredient-index-warmup", daemon=True).start()
+
 
-    emb   = get_embedding(ing)
-    sims  = cosine_similarity([emb], _raw_emb)[0]
-    top   = sorted(zip(_raw_ing, sims), key=lambda x: x[1], reverse=True)[:top_n]
-    return [w for w, _ in top]
+def ingredient_index_stats() -> dict:
+    return {
+        db: {"version": ix.version, "ingredients": len(ix),
+             "age_s": round(time.time() - ix.loaded_at, 1)}
+        for db, ix in _INDEXES.items()
+    }
@@ -0,0 +1,256 @@
+# menu_services/menu_index.py
+"""
+Indice vettoriale in memoria per la tabella `menu` (uno per tenant).
+────────────────────────────────────────────────────────────────────
+Un menu ha al massimo qualche centinaio di piatti: invece di un round trip
+a Postgres con scansione coseno sequenziale, gli embedding stanno in una
+matrice float32 contigua (righe già normalizzate) e una ricerca è un
+prodotto matrice-vettore + argpartition per il top-k.
+
+• load/refresh: quando cambia la versione del menu (core/data_version.py)
+• al massimo MENU_INDEX_MAX_TENANTS tenant in memoria (LRU, come gli
+  snapshot del menu in search_service.py)
+• fallback a pgvector: MENU_INDEX_ENABLED=0 o menu oltre MENU_INDEX_MAX_ROWS
+• risultati nello stesso formato di search_table (campi + cos_sim + score)
+• passo lessicale di hybrid_search.py sulle stesse righe (nome esatto +
+  token di nome/descrizione), senza query SQL
+• stessi filtri strutturati di search_table (tipo, prezzo, ingredienti esclusi),
+  applicati come maschera prima del top-k
+"""
+
+from __future__ import annotations
+import bisect, logging, os, re, threading, time
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from core.data_version import get_version
+from core.db_router import get_current_db
+from core.lru import LRUCache
+from core.vector_client import _run
+from core.vector_table import _parse_filters
+
+MENU_INDEX_ENABLED  = os.getenv("MENU_INDEX_ENABLED", "1") == "1"
+MENU_INDEX_MAX_ROWS = int(os.getenv("MENU_INDEX_MAX_ROWS", "5000"))
+MENU_INDEX_MAX_TENANTS = int(os.getenv("MENU_INDEX_MAX_TENANTS", "64"))
+
+_FIELDS = ("id", "name", "type", "ingredients", "description", "price")
+_TOKEN = re.compile(r"\w+")
+_LEX_WEIGHTS = (1.0, 0.4)        # nome, descrizione: pesi A e B di default di ts_rank_cd
+
+
+class MenuIndex:
+    """Matrice (n, dim) float32 normalizzata + metadati delle righe."""
+
+    def __init__(self, version: int, rows: List[Dict[str, Any]], matrix: np.ndarray):
+        self.version = version
+        self.rows = rows
+        self.matrix = matrix
+        self.loaded_at = time.time()
+        # colonne per i filtri, precalcolate una volta
+        self._types = np.array([(r.get("type") or "").lower() for r in rows], dtype=object)
+        self._prices = np.array([float(r["price"]) if r.get("price") is not None else np.nan
+                                 for r in rows], dtype=np.float64)
+        self._ingredients = [frozenset(i or []) for i in (r.get("ingredients") for r in rows)]
+        # passo lessicale: nome in minuscolo → righe e indice invertito
+        # token → righe per nome e descrizione (come to_tsvector('simple', ...))
+        self._names: Dict[str, List[int]] = {}
+        postings: Tuple[Dict[str, List[int]], ...] = ({}, {})
+        for i, r in enumerate(rows):
+            self._names.setdefault((r.get("name") or "").lower(), []).append(i)
+            for field, post in zip(("name", "description"), postings):
+                for tok in set(_TOKEN.findall((r.get(field) or "").lower())):
+                    post.setdefault(tok, []).append(i)
+        self._postings = tuple({t: np.asarray(ix) for t, ix in p.items()} for p in postings)
+        self._vocab = tuple(sorted(p) for p in postings)
+        self._id_rank = np.empty(len(rows), dtype=np.int64)
+        self._id_rank[sorted(range(len(rows)), key=lambda i: rows[i]["id"])] = np.arange(len(rows))
+
+    @classmethod
+    def from_rows(cls, version: int, rows: List[Dict[str, Any]]) -> "MenuIndex":
+        vectors = [r.pop("embedding") for r in rows]
+        dim = len(vectors[0]) if vectors else 0
+        matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(len(rows), dim))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.clip(norms, 1e-12, None)
+        return cls(version, rows, matrix)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _mask(self, filters: Dict[str, Any] | None) -> np.ndarray | None:
+        """Maschera booleana delle righe che rispettano i filtri (None = tutte)."""
+        parsed = dict(_parse_filters("menu", filters))
+        if not parsed:
+            return None
+        mask = np.ones(len(self.rows), dtype=bool)
+        if "type" in parsed:
+            mask &= self._types == parsed["type"].lower()
+        if "price_min" in parsed:
+            mask &= self._prices >= parsed["price_min"]        # NaN → escluso, come in SQL
+        if "price_max" in parsed:
+            mask &= self._prices <= parsed["price_max"]
+        if "exclude_ingredients" in parsed:
+            excluded = set(parsed["exclude_ingredients"])
+            mask &= np.fromiter((not (ing & excluded) for ing in self._ingredients),
+                                dtype=bool, count=len(self.rows))
+        return mask
+
+    def _top_k(self, sims: np.ndarray, k: int, fields: Sequence[str],
+               mask: np.ndarray | None = None) -> List[Dict[str, Any]]:
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            sims = sims[candidates]
+        n = len(sims)
+        if k < n:
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top], kind="stable")]
+        else:
+            top = np.argsort(-sims, kind="stable")
+        out = []
+        for i in top:
+            row = {f: self.rows[candidates[i] if mask is not None else i][f] for f in fields}
+            row["cos_sim"] = row["score"] = float(sims[i])
+            out.append(row)
+        return out
+
+    def search(self, emb: Sequence[float], k: int = 5,
+               fields: Sequence[str] = _FIELDS,
+               filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+        return self.search_many([emb], k, fields, filters)[0]
+
+    def search_many(self, embs: Sequence[Sequence[float]], k: int = 5,
+                    fields: Sequence[str] = _FIELDS,
+                    filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+        """Tutte le query con un solo prodotto matrice-matrice (n × dim · dim × q)."""
+        mask = self._mask(filters)
+        if not len(self.rows) or k <= 0 or (mask is not None and not mask.any()):
+            return [[] for _ in embs]
+        q = np.asarray(embs, dtype=np.float32).reshape(len(embs), -1)
+        q /= np.clip(np.linalg.norm(q, axis=1, keepdims=True), 1e-12, None)
+        sims = self.matrix @ q.T
+        return [self._top_k(sims[:, j], k, fields, mask) for j in range(sims.shape[1])]
+
+    def _term_hits(self, field: int, token: str, prefix: bool) -> np.ndarray:
+        """Maschera delle righe con `token` (o un token che inizia per `token`) nel campo."""
+        hits = np.zeros(len(self.rows), dtype=bool)
+        if not prefix:
+            hits[self._postings[field].get(token, [])] = True
+            return hits
+        vocab = self._vocab[field]
+        for j in range(bisect.bisect_left(vocab, token), len(vocab)):
+            if not vocab[j].startswith(token):
+                break
+            hits[self._postings[field][vocab[j]]] = True
+        return hits
+
+    def lexical_search_many(self, queries: Sequence[Tuple[str, str, Sequence[Tuple[str, bool]]]],
+                            k: int, fields: Sequence[str] = _FIELDS,
+                            filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+        """
+        Passo lessicale di hybrid_search.py in memoria. Ogni query è (nome,
+        nome canonico dell'alias, [(token, prefisso)]); righe nello stesso
+        ordine della query SQL: `exact` prima, poi `lex` (pesi A/B), poi id.
+        """
+        mask = self._mask(filters)
+        out = []
+        for n1, n2, terms in queries:
+            exact = np.zeros(len(self.rows), dtype=bool)
+            for name in {n1, n2}:
+                exact[self._names.get(name, [])] = True
+            lex = np.zeros(len(self.rows), dtype=np.float64)
+            for token, prefix in terms:
+                for field, weight in enumerate(_LEX_WEIGHTS):
+                    lex += weight * self._term_hits(field, token, prefix)
+            keep = exact | (lex > 0)
+            if mask is not None:
+                keep &= mask
+            cand = np.flatnonzero(keep)
+            top = cand[np.lexsort((self._id_rank[cand], -lex[cand], ~exact[cand]))][:max(k, 0)]
+            rows = []
+            for i in top:
+                row = {f: self.rows[i][f] for f in fields}
+                row["exact"], row["lex"] = bool(exact[i]), float(lex[i])
+                rows.append(row)
+            out.append(rows)
+        return out
+
+
+# ───────────────────────────────────────────────────────────────────
+# Cache per tenant: dbname → (versione, MenuIndex | None = menu troppo grande, usa pgvector)
+_LOCKS: Dict[str, threading.Lock] = {}
+_GUARD = threading.Lock()
+
+
+def _drop_lock(dbname: str, _value):
+    with _GUARD:
+        _LOCKS.pop(dbname, None)
+
+
+_INDEXES = LRUCache(MENU_INDEX_MAX_TENANTS, on_evict=_drop_lock)
+
+
+def _load(version: int) -> MenuIndex | None:
+    count = _run("SELECT count(*) FROM menu WHERE embedding IS NOT NULL",
+                 query_class="list")[0][0]
+    if count > MENU_INDEX_MAX_ROWS:
+        logging.info("[menu_index] %s: %d piatti > MENU_INDEX_MAX_ROWS, uso pgvector",
+                     get_current_db(), count)
+        return None
+    t0 = time.perf_counter()
+    rows = _run(
+        f"SELECT {', '.join(_FIELDS)}, embedding::real[] AS embedding "
+        "FROM menu WHERE embedding IS NOT NULL ORDER BY id",
+        dict_cursor=True, query_class="list",
+    )
+    index = MenuIndex.from_rows(version, [dict(r) for r in rows])
+    logging.info("[menu_index] %s: %d piatti caricati (v%d) in %.1f ms",
+                 get_current_db(), len(index), version, (time.perf_counter() - t0) * 1000)
+    return index
+
+
+def get_menu_index() -> MenuIndex | None:
+    """
+    Indice del tenant corrente, ricaricato se la versione del menu è cambiata.
+    Ritorna None se disabilitato o se il menu supera la soglia.
+    """
+    if not MENU_INDEX_ENABLED:
+        return None
+    dbname = get_current_db()
+    version = get_version("menu")
+    if version is None:                          # non si saprebbe quando ricaricarlo
+        return None
+    cached = _INDEXES.get(dbname)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _GUARD:
+        lock = _LOCKS.setdefault(dbname, threading.Lock())
+    with lock:                                   # un solo reload per tenant
+        cached = _INDEXES.get(dbname)
+        if cached and cached[0] == version:
+            return cached[1]
+        index = _load(version)
+        _INDEXES.put(dbname, (version, index))
+        return index
+
+
+def warmup_menu_index():
+    """Carica l'indice del tenant corrente (errori solo loggati: si userà pgvector)."""
+    try:
+        get_menu_index()
+    except Exception as exc:
+        logging.warning("[menu_index] warmup fallito su %s: %s", get_current_db(), exc)
+
+
+def menu_index_stats() -> dict:
+    return {
+        "enabled": MENU_INDEX_ENABLED,
+        "max_rows": MENU_INDEX_MAX_ROWS,
+        "max_tenants": MENU_INDEX_MAX_TENANTS,
+        "tenants": {
+            db: ({"version": v, "rows": len(ix), "age_s": round(time.time() - ix.loaded_at, 1)}
+                 if ix is not None else {"version": v, "fallback": "pgvector"})
+            for db, (v, ix) in _INDEXES.items()
+        },
+    }
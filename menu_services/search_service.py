@@ -3,37 +3,190 @@
 Wrapper attorno a `vector_db.search_menu()`.
 Include:
 • Ricerca semantica principale (demandata a vector_db, che usa pgvector)
-• Fallback leggero (token overlap + difflib), senza modelli locali
+• Fallback leggero (token overlap + difflib), senza modelli locali,
+  servito da un FuzzyMatcher indicizzato per snapshot (fuzzy_matcher.py)
+
+Snapshot del menu per tenant (core.db_router):
+• stale-while-revalidate: scaduto il TTL (o alla NOTIFY di una modifica
+  del menu, core/pg_listener.py) si continua a servire lo snapshot vecchio
+  mentre un thread in background ricarica list_menu() e il matcher;
+  solo il primo accesso di un tenant carica in modo sincrono;
+• al massimo MENU_SNAPSHOT_MAX_TENANTS tenant in memoria (LRU).
 """
 
-import logging, difflib, threading, time
+import logging, difflib, os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
+from core.db_router import get_current_db, set_current_db
+from core.pg_listener import get_listener
+from menu_services.fuzzy_matcher import FuzzyMatcher
 from menu_services.vector_db import list_menu
 
-_MENU_CACHE_TTL = 300.0  # seconds
+_MENU_CACHE_TTL = float(os.getenv("MENU_SNAPSHOT_TTL_S", "300"))  # seconds
+MENU_SNAPSHOT_MAX_TENANTS = int(os.getenv("MENU_SNAPSHOT_MAX_TENANTS", "64"))
+
+
+class _Snapshot:
+    """Menu di un tenant + matcher fuzzy costruito sugli stessi item."""
+
+    def __init__(self, items: List[Dict[str, Any]], refresh_ms: float):
+        self.items = items
+        self.matcher = FuzzyMatcher(items)
+        self.loaded_at = time.time()
+        self.refresh_ms = refresh_ms
+        self.dirty = False              # NOTIFY ricevuta: ricaricare anche prima del TTL
+        self.refreshing = False
+        self.refreshes = 0
+        self.errors = 0
+
+
 _MENU_CACHE_LOCK = threading.Lock()
-_MENU_CACHE: dict[str, Any] = {"items": [], "ts": 0.0}
+_MENU_CACHE: "OrderedDict[str, _Snapshot]" = OrderedDict()
+_LOAD_LOCKS: Dict[str, threading.Lock] = {}
+_REFRESHER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="menu-snapshot")
+
+
+def _load(dbname: str) -> _Snapshot:
+    t0 = time.perf_counter()
+    items = list_menu()
+    snap = _Snapshot(items, (time.perf_counter() - t0) * 1000)
+    logging.debug("[search_service] %s: snapshot menu caricato (%d items, %.1f ms)",
+                  dbname, len(items), snap.refresh_ms)
+    return snap
+
+
+def _store(dbname: str, snap: _Snapshot, previous: "_Snapshot | None" = None):
+    evicted = []
+    with _MENU_CACHE_LOCK:
+        if previous is not None:
+            if _MENU_CACHE.get(dbname) is not previous:   # invalidato o scartato nel frattempo
+                return
+            snap.refreshes = previous.refreshes + 1
+            snap.errors = previous.errors
+            snap.dirty = previous.dirty           # NOTIFY arrivata durante il caricamento
+        added = dbname not in _MENU_CACHE
+        _MENU_CACHE[dbname] = snap
+        _MENU_CACHE.move_to_end(dbname)
+        while len(_MENU_CACHE) > MENU_SNAPSHOT_MAX_TENANTS:
+            evicted.append(_MENU_CACHE.popitem(last=False)[0])
+    _update_subscriptions([dbname] if added else [], evicted)
+
+
+def _update_subscriptions(added: List[str], removed: List[str]):
+    """Una sottoscrizione al listener per ogni tenant con uno snapshot in memoria."""
+    listener = get_listener()
+    if listener is not None:
+        for db in added:
+            listener.subscribe(db)
+        for db in removed:
+            listener.unsubscribe(db)
+
+
+def _refresh(dbname: str, previous: _Snapshot):
+    """Ricarica in background (il contextvar del DB va impostato nel thread)."""
+    set_current_db(dbname)
+    previous.dirty = False
+    try:
+        _store(dbname, _load(dbname), previous)
+    except Exception as exc:
+        previous.errors += 1
+        logging.warning("[search_service] refresh menu di %s fallito: %s", dbname, exc)
+    finally:
+        previous.refreshing = False
+
+
+def _schedule_refresh(dbname: str, snap: _Snapshot):
+    with _MENU_CACHE_LOCK:
+        if snap.refreshing:
+            return
+        snap.refreshing = True
+    _REFRESHER.submit(_refresh, dbname, snap)
+
+
+def _get_snapshot() -> _Snapshot:
+    dbname = get_current_db()
+    with _MENU_CACHE_LOCK:
+        snap = _MENU_CACHE.get(dbname)
+        if snap is not None:
+            _MENU_CACHE.move_to_end(dbname)
+
+    if snap is None:
+        with _MENU_CACHE_LOCK:
+            lock = _LOAD_LOCKS.setdefault(dbname, threading.Lock())
+        with lock:                              # primo accesso: un solo caricamento per tenant
+            snap = _MENU_CACHE.get(dbname)
+            if snap is None:
+                snap = _load(dbname)
+                _store(dbname, snap)
+        return snap
+
+    if snap.dirty or time.time() - snap.loaded_at > _MENU_CACHE_TTL:
+        _schedule_refresh(dbname, snap)
+    return snap
 
 
 def _get_menu_snapshot() -> List[Dict[str, Any]]:
     """
-    Restituisce una copia cache del menu completo (refreshed ogni TTL).
+    Restituisce una copia cache del menu completo del tenant corrente
+    (ricaricata in background dopo il TTL o alla modifica del menu).
     """
-    now = time.time()
-    if now - _MENU_CACHE["ts"] > _MENU_CACHE_TTL or not _MENU_CACHE["items"]:
-        with _MENU_CACHE_LOCK:
-            if now - _MENU_CACHE["ts"] > _MENU_CACHE_TTL or not _MENU_CACHE["items"]:
-                items = list_menu()
-                _MENU_CACHE["items"] = items
-                _MENU_CACHE["ts"] = time.time()
-                logging.debug("[search_service] refreshed menu cache (%d items)", len(items))
-    return _MENU_CACHE["items"]
+    return _get_snapshot().items
+
+
+def _get_matcher() -> FuzzyMatcher:
+    """Matcher dello snapshot corrente (ricostruito insieme allo snapshot)."""
+    return _get_snapshot().matcher
+
+
+def invalidate_menu_cache(dbname: str | None = None):
+    """Scarta gli snapshot (di un tenant o di tutti): il prossimo accesso ricarica."""
+    with _MENU_CACHE_LOCK:
+        if dbname is None:
+            removed = list(_MENU_CACHE)
+            _MENU_CACHE.clear()
+        else:
+            removed = [dbname] if _MENU_CACHE.pop(dbname, None) is not None else []
+    _update_subscriptions([], removed)
 
 
-def invalidate_menu_cache():
+def _on_data_version(dbname: str, table: str | None):
+    """NOTIFY dal DB: il menu è cambiato (table=None: forse, dopo una riconnessione)."""
+    if table not in (None, "menu"):
+        return
     with _MENU_CACHE_LOCK:
-        _MENU_CACHE["items"] = []
-        _MENU_CACHE["ts"] = 0.0
+        snap = _MENU_CACHE.get(dbname)
+        if snap is None:
+            return
+        snap.dirty = True
+    _schedule_refresh(dbname, snap)
+
+
+_listener = get_listener()
+if _listener is not None:
+    _listener.add_callback(_on_data_version)
+
+
+def menu_snapshot_stats() -> dict:
+    """Età, durata dell'ultimo caricamento e refresh per tenant (per /stats)."""
+    now = time.time()
+    with _MENU_CACHE_LOCK:
+        snaps = list(_MENU_CACHE.items())
+    return {
+        "ttl_s": _MENU_CACHE_TTL,
+        "max_tenants": MENU_SNAPSHOT_MAX_TENANTS,
+        "tenants": {
+            db: {
+                "items": len(s.items),
+                "age_s": round(now - s.loaded_at, 1),
+                "refresh_ms": round(s.refresh_ms, 1),
+                "refreshes": s.refreshes,
+                "errors": s.errors,
+                "refreshing": s.refreshing,
+            }
+            for db, s in snaps
+        },
+    }
 
 def _token_overlap_score(a: str, b: str) -> float:
     """
@@ -52,6 +205,17 @@ def _token_overlap_score(a: str, b: str) -> float:
     ratio = difflib.SequenceMatcher(None, a, b).ratio()
     return ratio + 0.1 * overlap
 
+def best_menu_matches(request_name: str, k: int = 3) -> List[Dict[str, Any]]:
+    """
+    I `k` piatti più simili con euristica leggera (stesso punteggio di
+    _token_overlap_score), ognuno con il campo `score`.
+    """
+    name = (request_name or "").strip()
+    if not name:
+        return []
+    return [{**row, "score": sc} for row, sc in _get_matcher().top_k(name, k)]
+
+
 def best_menu_match(request_name: str) -> Dict[str, Any] | None:
     """
     Restituisce il piatto più simile con euristica leggera
@@ -61,18 +225,4 @@ def best_menu_match(request_name: str) -> Dict[str, Any] | None:
     name = (request_name or "").strip()
     if not name:
         return None
-
-    candidates = _get_menu_snapshot()
-    best = None
-    best_sc = 0.0
-
-    for row in candidates:
-        cand = (row.get("name") or "").strip()
-        if not cand:
-            continue
-        sc = _token_overlap_score(name, cand)
-        if sc > best_sc:
-            best_sc = sc
-            best = row
-
-    return best
+    return _get_matcher().best(name)
@@ -3,17 +3,32 @@
 Funzioni di dominio per operare sulla tabella `menu` nel database.
 ────────────────────────────────────────────────────────────────────
 • search_menu(query, k):           restituisce i k piatti più simili a un testo
+                                   (indice in memoria se attivo, vedi menu_index.py)
+• search_menu_many(queries, k):    come search_menu per più testi (un batch, una query)
 • list_menu(dish_type=None):       restituisce tutto il menu o solo piatti di un tipo
 • list_unique_ingredients():       restituisce una lista di tutti gli ingredienti unici
 """
 
 from __future__ import annotations
+import logging
 from typing import List, Dict, Any
-from core.vector_table  import search_table     # Funzione di similarità semantica
-from core.vector_client import _run             # Funzione per eseguire query SQL (con pool condiviso)
+from core.vector_table  import search_table, search_table_many  # Similarità semantica
+from core.vector_client import _run, get_embedding, get_embeddings  # Query SQL (pool) ed embedding
+from menu_services.menu_index import get_menu_index  # Indice NumPy per tenant
+
+_MENU_FIELDS = "id,name,type,ingredients,description,price"
+
+
+def _menu_index_or_none():
+    try:
+        return get_menu_index()
+    except Exception as exc:                    # indice non disponibile → pgvector
+        logging.warning("[vector_db] indice menu non disponibile: %s", exc)
+        return None
 
 # ───────────────────────────────────────────────────────────────────
-def search_menu(query: str, k: int = 5) -> List[Dict[str, Any]]:
+def search_menu(query: str, k: int = 5,
+                filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
     """
     Ricerca semantica nel menu usando similarità vettoriale.
     Restituisce i `k` piatti più simili al testo `query`.
@@ -21,18 +36,41 @@ def search_menu(query: str, k: int = 5) -> List[Dict[str, Any]]:
     Args:
         query: testo di input dell'utente (es. "qualcosa col salmone")
         k: numero massimo di risultati
+        filters: vincoli opzionali applicati insieme alla ricerca, es.
+                 {"type": "uramaki", "price_min": 5, "price_max": 12,
+                  "exclude_ingredients": ["avocado"]}
 
     Returns:
         Lista di dizionari con i piatti più rilevanti
     """
+    index = _menu_index_or_none()
+    if index is not None:
+        return index.search(get_embedding(query), k, filters=filters)
+
     return search_table(
         query           = query,
         table           = "menu",
-        fields          = "id,name,type,ingredients,description,price",
+        fields          = _MENU_FIELDS,
         k               = k,
-        extra_score_sql = ""          # solo similarità
+        extra_score_sql = "",         # solo similarità
+        filters         = filters,
     )
 
+# ───────────────────────────────────────────────────────────────────
+def search_menu_many(queries: List[str], k: int = 5,
+                     filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+    """
+    Ricerca semantica di più testi in una volta: embedding in un solo batch
+    e un'unica query SQL (o l'indice in memoria). Un elenco di piatti per query.
+    """
+    if not queries:
+        return []
+    index = _menu_index_or_none()
+    if index is not None:
+        return index.search_many(get_embeddings(queries), k, filters=filters)
+
+    return search_table_many(queries, table="menu", fields=_MENU_FIELDS, k=k, filters=filters)
+
 # ───────────────────────────────────────────────────────────────────
 def list_menu(dish_type: str | None = None) -> List[Dict[str, Any]]:
     """
@@ -50,7 +88,7 @@ def list_menu(dish_type: str | None = None) -> List[Dict[str, Any]]:
         sql += " WHERE LOWER(type)=LOWER(%s)"
         args.append(dish_type)
     sql += " ORDER BY id"
-    return _run(sql, args, dict_cursor=True)
+    return _run(sql, args, dict_cursor=True, query_class="list")
 
 # ───────────────────────────────────────────────────────────────────
 def list_unique_ingredients() -> List[str]:
@@ -69,6 +107,6 @@ def list_unique_ingredients() -> List[str]:
         ) sub
         ORDER  BY LOWER(ing);
     """
-    rows = _run(sql)
+    rows = _run(sql, query_class="list")
     return [r[0] for r in rows]
 
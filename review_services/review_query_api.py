@@ -8,6 +8,7 @@ from __future__ import annotations
 import os, json, logging, re, pathlib, requests
 from typing import List, Dict, Any
 from core.llm_formatting import format_messages_for_vllm
+from core.prompt_files import load_json_prompt
 
 MODE = os.getenv("REVIEW_API_MODE", "local").lower()   # 'local' | 'remote'
 LLM_URL   = os.getenv("LLM_URL",   "http://localhost:8000/v1/chat/completions")
@@ -25,27 +26,13 @@ if os.getenv("REMOTE_API_KEY"):
 _FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.I)
 
 def _load_json_prompt(basename: str, field: str = "prompt", fallback: str = "") -> str:
-    candidates = [
+    # file letto e parsato solo quando cambia (core/prompt_files.py)
+    val = load_json_prompt([
         PROMPTS_DIR / basename,
         PROMPTS_DIR / f"{basename}.json",
         PROMPTS_DIR / f"{basename}.txt",
-    ]
-    for path in candidates:
-        try:
-            with open(path, "r", encoding="utf-8") as fp:
-                raw = fp.read()
-            obj = json.loads(raw)
-            val = obj.get(field)
-            if isinstance(val, str) and val.strip():
-                logging.info("[reviews_prompt] Caricato '%s' da %s[%s] (%d chars)",
-                             basename, path, field, len(val))
-                return val
-        except FileNotFoundError:
-            continue
-        except Exception as e:
-            logging.error("[reviews_prompt] Errore parsing %s: %s", path, e)
-    logging.warning("[reviews_prompt] Uso fallback per '%s' (non trovato/valido)", basename)
-    return fallback or '{"needs_reviews": false, "review_queries": []}'
+    ], field=field, tag="reviews_prompt")
+    return val or fallback or '{"needs_reviews": false, "review_queries": []}'
 
 def _call_llm(msgs: List[Dict[str,str]], json_mode=True, max_tok=384) -> str:
     payload = {
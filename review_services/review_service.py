@@ -2,14 +2,14 @@
 """
 Modulo di orchestrazione per le recensioni:
 - Riceve le query generate dal modello LLM
-- Esegue ricerche semantiche su ogni query
+- Esegue le ricerche semantiche di tutte le query insieme (un batch, una query SQL)
 - Restituisce una lista `reviews_items` compatibile con i prompt loop dell'AI
 """
 
 from __future__ import annotations
 import logging, json
 from typing import List, Dict, Any
-from review_services.vector_db_reviews import search_reviews
+from review_services.vector_db_reviews import search_reviews_many
 import json
 
 import json
@@ -36,10 +36,13 @@ def fetch_reviews(review_queries: List[Dict[str, Any]],
 
     Returns:
         Lista di dict del tipo:
-        {"voto": "4", "snippet": "<testo intero recensione>", "dish": "Portofino"}
+        {"voto": "4", "snippet": "<testo intero recensione>", "dish": "Portofino",
+         "score": 0.87}
     """
     items: List[Dict[str, str]] = []
 
+    # Prima raccoglie i testi validi, poi li cerca tutti insieme
+    prepared: List[tuple[str, str]] = []
     for q in review_queries:
         dish   = (q.get("dish") or "").title()
         kw     = " ".join(q.get("keywords", []))
@@ -49,9 +52,11 @@ def fetch_reviews(review_queries: List[Dict[str, Any]],
         if not query_text:
             logging.debug("[review_service] query vuota – skip")
             continue
+        prepared.append((dish, query_text))
 
-        rows = search_reviews(query_text, k=top_k_per_query)
+    results = search_reviews_many([t for _, t in prepared], k=top_k_per_query)
 
+    for (dish, query_text), rows in zip(prepared, results):
         # Log semplificato per debug
         logging.debug(
             "[review_service] reviews per '%s' ➜ %s",
@@ -69,7 +74,8 @@ def fetch_reviews(review_queries: List[Dict[str, Any]],
             items.append({
                 "dish": dish or ", ".join(_safe_piatti(r.get("piatti"))),
                 "voto": str(r["voto"]),
-                "snippet": r["recensione"]
+                "snippet": r["recensione"],
+                "score": float(r.get("score") or 0.0),   # per il budget del prompt
             })
 
     logging.debug("[review_service] produced %d review-items", len(items))
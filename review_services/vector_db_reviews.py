@@ -6,14 +6,19 @@ Usa lo stesso sistema di vettori SBERT del resto dell’app,
 ma include anche un peso sul voto (per favorire recensioni positive).
 """
 from __future__ import annotations
-import logging
+import logging, os
 from typing import List, Dict, Any
-from core.vector_table import search_table
+from core.vector_table import search_table, search_table_many
 from psycopg2.errors import UndefinedTable
 
 # Scoring personalizzato: 70% similarità + 30% voto (scala 1–5)
 _EXTRA_SCORE = "(voto / 5.0) * 0.3"
 
+# Il boost sul voto non è servibile da un indice vettoriale: prima i
+# REVIEW_RERANK_CANDIDATES più vicini (via indice ANN), poi il rerank col voto.
+# 0 = scansione esatta di tutta la tabella.
+REVIEW_RERANK_CANDIDATES = int(os.getenv("REVIEW_RERANK_CANDIDATES", "100"))
+
 # ───────────────────────────────────────────────────────────────────
 def search_reviews(query: str, k: int = 5) -> List[Dict[str, Any]]:
     """
@@ -32,10 +37,30 @@ def search_reviews(query: str, k: int = 5) -> List[Dict[str, Any]]:
             table = "recensioni",
             fields= "id,voto,recensione,piatti",
             k     = k,
-            extra_score_sql = _EXTRA_SCORE
+            extra_score_sql = _EXTRA_SCORE,
+            candidates      = REVIEW_RERANK_CANDIDATES,
         )
     except UndefinedTable:
         logging.warning("Tabella recensioni assente; ritorno lista vuota")
         return []
 
+# ───────────────────────────────────────────────────────────────────
+def search_reviews_many(queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+    """
+    Come search_reviews per più query: un batch di embedding e una sola
+    query SQL. Restituisce una lista di recensioni per ogni query.
+    """
+    try:
+        return search_table_many(
+            queries,
+            table = "recensioni",
+            fields= "id,voto,recensione,piatti",
+            k     = k,
+            extra_score_sql = _EXTRA_SCORE,
+            candidates      = REVIEW_RERANK_CANDIDATES,
+        )
+    except UndefinedTable:
+        logging.warning("Tabella recensioni assente; ritorno liste vuote")
+        return [[] for _ in queries]
+
 logging.debug("[reviews_db] ready – reuses shared pool & SBERT")
@@ -1,41 +1,82 @@
 # routes/ingredients.py
 from flask import Blueprint, jsonify, request
-from menu_services.vector_db import list_unique_ingredients # Recupera tutti gli ingredienti unici presenti nel menu
-import unicodedata, re, logging
+from menu_services.ingredient_autocomplete import get_ingredient_trie, normalize_id as _normalize_id  # Elenco + trie per tenant
+from menu_services.ingredient_similarity import similar_ingredients  # Sostituzioni (indice NumPy per tenant)
+import logging
 from core.db_router import set_current_db
+from core.http_cache import cached_json_response  # Corpo JSON precalcolato + ETag/304 + gzip
 
 
 # Definizione del Blueprint per il modulo ingredienti
 ingredients_bp = Blueprint("ingredients_bp", __name__)
 
-def _normalize_id(name: str) -> str:
-    """
-    Normalizza un nome in un ID leggibile e privo di simboli, adatto a URL o frontend.
-    Esempio: "Salsa di Soia" → "salsadisoia"
-    """
-    txt = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
-    return re.sub(r"[^a-zA-Z0-9]", "", txt).lower()
+_AUTOCOMPLETE_LIMIT, _AUTOCOMPLETE_MAX = 10, 100
+
 
 def _safe_entries() -> list[dict]:
     """
     Elabora la lista di ingredienti:
     - rimuove valori nulli o vuoti
     - restituisce una lista ordinata con campo `id` normalizzato e `nome` originale
+    (tenuta in memoria per tenant, ricostruita quando cambia il menu)
     """
-    raw = list_unique_ingredients()              
-    clean = [r for r in raw if r]                
-    data = [{"id": _normalize_id(n), "nome": n} for n in clean]
-    return sorted(data, key=lambda x: x["nome"].lower())
+    return get_ingredient_trie().entries
 
 
 @ingredients_bp.route("/ingredienti", methods=["GET"])
 @ingredients_bp.route("/ingredients",   methods=["GET"])  # alias
 def ingredients():
+    """
+    Tutti gli ingredienti, oppure con ?q= solo quelli il cui id inizia col
+    prefisso (autocompletamento), al massimo ?limit= (default 10, max 100).
+    """
     project = request.args.get("project") or request.headers.get("X-Project")
     set_current_db(project)                               # <— NEW
 
+    prefix = request.args.get("q")
+    limit = _AUTOCOMPLETE_LIMIT
+    if prefix is not None:                                # ?limit= conta solo con ?q=
+        try:
+            limit = min(max(int(request.args.get("limit", _AUTOCOMPLETE_LIMIT)), 1),
+                        _AUTOCOMPLETE_MAX)
+        except ValueError:
+            return jsonify({"error": "parametro 'limit' non valido"}), 400
+
     try:
-        return jsonify({"ingredienti": _safe_entries()}), 200
+        if prefix is not None:
+            return jsonify({"ingredienti": get_ingredient_trie().complete(prefix, limit)}), 200
+        return cached_json_response("menu", ("ingredienti",),
+                                    lambda: {"ingredienti": _safe_entries()})
     except Exception as exc:
         logging.exception("Errore nella route /ingredienti")
         return jsonify({"error": str(exc)}), 500
+
+
+@ingredients_bp.route("/ingredienti/simili", methods=["GET"])
+@ingredients_bp.route("/ingredients/similar", methods=["GET"])  # alias
+def similar_ingredients_route():
+    """
+    Ingredienti del menu simili a ?q= (sostituzioni), al massimo ?n= (default 3, max 20).
+    Esempio: /api/ingredients/similar?q=tofu&n=5
+    """
+    project = request.args.get("project") or request.headers.get("X-Project")
+    set_current_db(project)
+
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "parametro 'q' mancante"}), 400
+    try:
+        top_n = min(max(int(request.args.get("n", 3)), 1), 20)
+    except ValueError:
+        return jsonify({"error": "parametro 'n' non valido"}), 400
+
+    try:
+        rows = similar_ingredients(query, top_n)
+        return jsonify({
+            "ingrediente": query,
+            "simili": [{"id": _normalize_id(r["nome"]), "nome": r["nome"],
+                        "score": round(r["score"], 4)} for r in rows],
+        }), 200
+    except Exception as exc:
+        logging.exception("Errore nella route /ingredients/similar")
+        return jsonify({"error": str(exc)}), 500
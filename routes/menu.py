@@ -1,7 +1,8 @@
 # routes/menu.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
 from menu_services.vector_db import list_menu  # Funzione per recuperare i piatti dal menu (filtrati o meno)
 from core.db_router import set_current_db
+from core.http_cache import cached_json_response  # Corpo JSON precalcolato + ETag/304 + gzip
 
 # Definizione del Blueprint per il modulo menu
 menu_bp = Blueprint("menu_bp", __name__)
@@ -14,13 +15,14 @@ def menu():
     set_current_db(project)                       # <— NEW
 
     dish_type = request.args.get("type")          # filtro facoltativo
-    items     = list_menu(dish_type)
 
-    # Decimal → float per JSON
-    for it in items:
-        if it["price"] is not None:
-            it["price"] = float(it["price"])
+    def build():
+        items = list_menu(dish_type)
+        # Decimal → float per JSON
+        for it in items:
+            if it["price"] is not None:
+                it["price"] = float(it["price"])
+        return {"menu": items}
 
-    return jsonify({"menu": items}), 200
-
-    return jsonify({"menu": items}), 200
+    # Serializzato una volta per tenant, tipo e versione del menu
+    return cached_json_response("menu", ("menu", (dish_type or "").lower()), build)
@@ -0,0 +1,37 @@
+# routes/stats.py
+from flask import Blueprint, jsonify
+from core.vector_client import embedding_cache_stats, embedding_pool_stats, pool_stats
+from core.http_cache import http_cache_stats
+from core.pg_listener import pg_listener_stats
+from core.prompt_budget import prompt_budget_stats
+from core.prompt_files import prompt_files_stats
+from core.prompt_store import prompt_store_stats
+from core.search_cache import search_cache_stats
+from menu_services.ingredient_similarity import ingredient_index_stats
+from menu_services.menu_index import menu_index_stats
+from menu_services.search_service import menu_snapshot_stats
+
+# Definizione del Blueprint per le statistiche interne (cache, pool, ...)
+stats_bp = Blueprint("stats_bp", __name__)
+
+
+@stats_bp.route("/stats", methods=["GET"])
+def stats():
+    """
+    Restituisce in JSON le metriche runtime del worker corrente.
+    Ogni worker gunicorn ha i propri contatori in-process.
+    """
+    return jsonify({
+        "embedding_cache": embedding_cache_stats(),
+        "embedding_pool":  embedding_pool_stats(),
+        "pg_pools":        pool_stats(),
+        "menu_index":      menu_index_stats(),
+        "ingredient_index": ingredient_index_stats(),
+        "search_cache":    search_cache_stats(),
+        "http_cache":      http_cache_stats(),
+        "menu_snapshots":  menu_snapshot_stats(),
+        "pg_listener":     pg_listener_stats(),
+        "prompt_budget":   prompt_budget_stats(),
+        "prompt_store":    prompt_store_stats(),
+        "prompt_files":    prompt_files_stats(),
+    }), 200
@@ -0,0 +1,26 @@
+import psycopg2
+
+from core import data_version
+
+
+def test_unknown_version_without_trigger_or_access(monkeypatch):
+    answers = {"trigger": False}
+
+    def run(sql, params=None, **kw):
+        if "pg_trigger" in sql:
+            return [(answers["trigger"],)]
+        if answers.get("error"):
+            raise psycopg2.errors.InsufficientPrivilege("permission denied for table data_version")
+        return [(7,)]
+
+    monkeypatch.setattr(data_version, "_run", run)
+    monkeypatch.setattr(data_version, "get_current_db", lambda: "ro_tenant")
+    assert data_version.get_version("menu", max_age=0) is None      # nessun DDL dall'app
+
+    answers["trigger"] = True
+    assert data_version.get_version("menu", max_age=0) == 7
+
+    answers["error"] = True                                          # ruolo in sola lettura
+    assert data_version.get_version("menu", max_age=0) is None
+    data_version.invalidate("ro_tenant")
+    data_version._INSTALLED.discard(("ro_tenant", "menu"))
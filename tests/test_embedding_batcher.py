@@ -0,0 +1,70 @@
+import threading
+import pytest
+from core.embedding_batcher import EmbeddingBatcher
+
+
+def _fake_encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+    return encode
+
+
+def test_embed_single_text():
+    calls = []
+    b = EmbeddingBatcher(_fake_encoder(calls), max_batch_size=8, max_wait_ms=1)
+    try:
+        assert b.embed("ramen", timeout=2) == [5.0]
+    finally:
+        b.close()
+    assert calls == [["ramen"]]
+
+
+def test_concurrent_requests_are_batched():
+    # Le richieste concorrenti devono confluire in meno chiamate encode()
+    calls = []
+    b = EmbeddingBatcher(_fake_encoder(calls), max_batch_size=64, max_wait_ms=50)
+    results = {}
+    start = threading.Barrier(10)
+
+    def worker(i):
+        start.wait()
+        results[i] = b.embed("x" * i, timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(10)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        b.close()
+
+    assert results == {i: [float(i)] for i in range(10)}
+    assert len(calls) < 10
+    assert sum(len(c) for c in calls) == 10
+
+
+def test_batch_size_limit_and_dedup():
+    calls = []
+    b = EmbeddingBatcher(_fake_encoder(calls), max_batch_size=2, max_wait_ms=20)
+    try:
+        futs = [b.submit(t) for t in ["a", "a", "bb", "ccc"]]
+        assert [f.result(timeout=2) for f in futs] == [[1.0], [1.0], [2.0], [3.0]]
+    finally:
+        b.close()
+    # nessun batch supera max_batch_size e i duplicati sono codificati una volta
+    assert all(len(c) <= 2 for c in calls)
+    assert sum(c.count("a") for c in calls) == 1
+
+
+def test_encoder_error_propagates():
+    def broken(texts):
+        raise RuntimeError("modello non disponibile")
+
+    b = EmbeddingBatcher(broken, max_batch_size=4, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError):
+            b.embed("mochi", timeout=2)
+    finally:
+        b.close()
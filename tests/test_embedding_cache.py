@@ -0,0 +1,96 @@
+from core import vector_client
+from core.embedding_cache import EmbeddingCache, normalize_text
+from core.lru import LRUCache
+
+
+def test_normalize_text_case_and_spaces_only():
+    # Maiuscole e spazi multipli non cambiano la chiave
+    assert normalize_text("  Tè   Verde  Freddo ") == "tè verde freddo"
+    # accenti e alias sì: il testo va al modello così com'è
+    assert normalize_text("Ramen") == "ramen"
+    assert normalize_text("te verde freddo") != normalize_text("tè verde freddo")
+
+
+def test_embeddings_use_original_text(monkeypatch):
+    seen = []
+    monkeypatch.setattr(vector_client, "EMB_CACHE_ENABLED", True)
+    monkeypatch.setattr(vector_client, "_CACHE", EmbeddingCache("t", "m", l2_enabled=False))
+    monkeypatch.setattr(vector_client, "_encode_chunked",
+                        lambda texts: seen.extend(texts) or [[float(len(t))] for t in texts])
+    out = vector_client.get_embeddings(["Mochi", " mochi ", "Edamame"])
+    assert seen == ["Mochi", "Edamame"]
+    assert out == [[5.0], [5.0], [7.0]]
+
+
+def test_lru_eviction_counter():
+    c = LRUCache(maxsize=2)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1       # "a" diventa il più recente
+    c.put("c", 3)                # scarta "b"
+    assert c.get("b") is None
+    assert c.stats()["evictions"] == 1
+    assert c.stats()["hits"] == 1
+
+
+def test_lru_on_evict_and_put_result():
+    removed = []
+    c = LRUCache(maxsize=2, on_evict=lambda k, v: removed.append((k, v)))
+    assert c.put("a", 1) and c.put("b", 2)
+    assert not c.put("a", 10)    # aggiornamento: nessuna uscita
+    c.put("c", 3)                # scarta "b"
+    c.pop("a")
+    c.clear()
+    assert removed == [("b", 2), ("a", 10), ("c", 3)]
+
+
+class _FakeRedis:
+    """Sostituto minimale di redis.Redis (solo mget/pipeline)."""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction=False):
+        store = self.data
+
+        class _Pipe:
+            def set(self, key, value, ex=None):
+                store[key] = value
+
+            def execute(self):
+                return []
+        return _Pipe()
+
+
+def test_l1_only_hit_and_miss():
+    cache = EmbeddingCache("local_cpu", "m", l1_size=4, l2_enabled=False)
+    assert cache.get("mochi yuzu") is None
+    cache.put("mochi yuzu", [0.5, 0.25])
+    assert cache.get("mochi yuzu") == [0.5, 0.25]
+    stats = cache.stats()
+    assert stats["l1"]["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_l2_shared_between_workers():
+    # Due cache (= due worker) con la stessa Redis: il secondo trova il vettore in L2
+    shared = _FakeRedis()
+    w1 = EmbeddingCache("local_cpu", "m", l2_enabled=True, redis_client=shared)
+    w2 = EmbeddingCache("local_cpu", "m", l2_enabled=True, redis_client=shared)
+    w1.put("gyoza verde", [0.5, -0.25])
+    assert w2.get("gyoza verde") == [0.5, -0.25]
+    assert w2.stats()["l2"]["hits"] == 1
+    # la voce è stata promossa in L1
+    assert w2.get("gyoza verde") == [0.5, -0.25]
+    assert w2.stats()["l1"]["hits"] == 1
+
+
+def test_l2_key_depends_on_provider_and_model():
+    shared = _FakeRedis()
+    a = EmbeddingCache("local_cpu", "m1", l2_enabled=True, redis_client=shared)
+    b = EmbeddingCache("openai", "m2", l2_enabled=True, redis_client=shared)
+    a.put("ramen", [1.0])
+    assert b.get("ramen") is None
@@ -0,0 +1,98 @@
+import multiprocessing as mp
+import os, time
+
+import pytest
+
+from core import embedding_pool, embedding_providers
+from core.embedding_providers import EmbeddingProvider
+
+pytestmark = pytest.mark.skipif("fork" not in mp.get_all_start_methods(),
+                                reason="il provider finto arriva ai worker solo via fork")
+
+
+class _FakeProvider(EmbeddingProvider):
+    """Vettore [len(testo), posizione nel batch]; 'boom' solleva, 'crash' uccide il worker."""
+    name = "fake_pool"
+    dim = 2
+
+    def _load(self):
+        pass
+
+    def _encode(self, texts, batch_size):
+        if "crash" in texts:
+            os._exit(3)
+        if "boom" in texts:
+            raise ValueError("boom")
+        if "slow" in texts:
+            time.sleep(0.5)
+        return [[float(len(t)), float(i)] for i, t in enumerate(texts)]
+
+
+def _make_pool(workers=2, max_batch=2):
+    p = embedding_pool.EmbeddingWorkerPool(_FakeProvider.name, workers=workers, queue_depth=4,
+                                           max_batch=max_batch, start_method="fork", timeout=2)
+    p._respawn_ctx = mp.get_context("fork")          # con spawn il provider finto non esiste
+    return p
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setitem(embedding_providers._PROVIDERS, _FakeProvider.name, _FakeProvider)
+    p = _make_pool()
+    yield p
+    p.close()
+
+
+def _wait_free_slots(pool, expected, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while pool._free_slots.qsize() != expected and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return pool._free_slots.qsize()
+
+
+def test_chunks_keep_order(pool):
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    out = pool.encode(texts)
+    # 3 blocchi da max_batch=2: la posizione riparte da 0 in ogni blocco
+    assert out == [[1.0, 0.0], [2.0, 1.0], [3.0, 0.0], [4.0, 1.0], [5.0, 0.0]]
+    assert pool.stats.batches == 3
+    assert _wait_free_slots(pool, 4) == 4
+
+
+def test_worker_error_frees_every_slot(pool):
+    with pytest.raises(RuntimeError, match="boom"):
+        pool.encode(["a", "b", "boom", "c", "slow", "d"])
+    assert _wait_free_slots(pool, 4) == 4            # anche il blocco lento, a fine encode
+    assert pool.encode(["ok"]) == [[2.0, 0.0]]
+
+
+def test_timeout_marks_slot_abandoned(pool):
+    pool.timeout = 0.1
+    with pytest.raises(TimeoutError):
+        pool.encode(["slow"])
+    assert pool.stats.timeouts == 1
+    assert _wait_free_slots(pool, 4) == 4
+
+
+def test_dead_worker_fails_its_request(pool):
+    t0 = time.monotonic()
+    with pytest.raises(RuntimeError, match="worker terminato"):
+        pool.encode(["crash"])
+    assert time.monotonic() - t0 < pool.timeout       # non aspetta il timeout
+    assert _wait_free_slots(pool, 4) == 4
+    assert pool.encode(["x", "yy", "zzz"]) == [[1.0, 0.0], [2.0, 1.0], [3.0, 0.0]]
+    assert sum(p.is_alive() for p in pool._procs) == 2
+
+
+def test_requests_queued_on_dead_worker_fail_fast(monkeypatch):
+    monkeypatch.setitem(embedding_providers._PROVIDERS, _FakeProvider.name, _FakeProvider)
+    pool = _make_pool(workers=1, max_batch=1)        # una sola coda: "a" resta dietro "crash"
+    try:
+        t0 = time.monotonic()
+        with pytest.raises(RuntimeError, match="worker terminato"):
+            pool.encode(["crash", "a"])
+        assert time.monotonic() - t0 < pool.timeout
+        assert _wait_free_slots(pool, 4) == 4 and pool._assigned == [0]
+        assert pool.encode(["a"]) == [[1.0, 0.0]]     # il sostituto ha una coda pulita
+    finally:
+        pool.close()
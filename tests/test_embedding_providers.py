@@ -0,0 +1,17 @@
+import pytest
+
+from core.embedding_providers import EmbeddingProvider, provider_class
+
+
+def test_incomplete_provider_fails_at_instantiation():
+    class _NoEncode(EmbeddingProvider):
+        def _load(self):
+            pass
+
+    with pytest.raises(TypeError):
+        _NoEncode()
+
+
+def test_builtin_providers_are_concrete():
+    for name in ("local_cpu", "local_onnx", "openai"):
+        assert not provider_class(name).__abstractmethods__
@@ -0,0 +1,20 @@
+from menu_services.fuzzy_matcher import FuzzyMatcher
+from menu_services.search_service import _token_overlap_score
+
+_MENU = [{"id": i, "name": n} for i, n in enumerate([
+    "Uramaki Sunburn", "Uramaki Yuzu Salmon", "Nighiri Salmone Classico",
+    "Sashimi Salmone Nordico", "Gyoza Verde", "", "Uramaki Crispy Shrimp",
+])]
+
+
+def test_same_scores_as_linear_scan():
+    m = FuzzyMatcher(_MENU)
+    for q in ["uramaki sunbrn", "salmone", "GYOZA", "uramaki", "qualcosa di fresco"]:
+        ref = sorted(((_token_overlap_score(q, r["name"]), -r["id"]) for r in _MENU
+                      if _token_overlap_score(q, r["name"]) > 0), reverse=True)[:3]
+        got = [(sc, -row["id"]) for row, sc in m.top_k(q, 3)]
+        assert got == ref, q
+
+
+def test_no_shared_token_no_match():
+    assert FuzzyMatcher(_MENU).best("ramen") is None
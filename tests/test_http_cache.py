@@ -0,0 +1,43 @@
+import gzip, json
+
+from flask import Flask
+
+from core import http_cache
+
+
+def test_etag_304_gzip_and_version(monkeypatch):
+    version = {"menu": 1}
+    calls = []
+    monkeypatch.setattr(http_cache, "get_version", lambda table: version[table])
+    monkeypatch.setattr(http_cache, "get_current_db", lambda: "demo")
+
+    app = Flask(__name__)
+
+    @app.route("/m")
+    def m():
+        def build():
+            calls.append(1)
+            return {"menu": [{"name": "Gyoza Verde", "price": 5.5}] * 100}
+        return http_cache.cached_json_response("menu", ("menu", ""), build)
+
+    c = app.test_client()
+    r = c.get("/m")
+    assert r.status_code == 200 and r.headers["Cache-Control"] == "no-cache"
+    etag = r.headers["ETag"]
+    assert c.get("/m", headers={"If-None-Match": etag}).status_code == 304
+    assert c.get("/m", headers={"If-None-Match": "W/" + etag}).status_code == 304
+
+    gz = c.get("/m", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(gz.data)) == r.get_json()
+    assert len(calls) == 1                              # serializzato una volta sola
+
+    version["menu"] = 2                                 # menu ricaricato: si ricostruisce
+    assert c.get("/m", headers={"If-None-Match": etag}).status_code == 304   # stesso contenuto
+    assert len(calls) == 2
+
+    version["menu"] = None                              # versione sconosciuta: niente cache né ETag
+    r = c.get("/m", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and "ETag" not in r.headers
+    c.get("/m")
+    assert len(calls) == 4
@@ -0,0 +1,47 @@
+import pytest
+from menu_services.hybrid_search import _tsquery_text, fuse_rankings
+
+
+def _row(i, **extra):
+    return {"id": i, "name": f"p{i}", "type": "t", "ingredients": [], "description": "",
+            "price": 1, **extra}
+
+
+def test_tsquery_text_prefix_or():
+    assert _tsquery_text("  Uramaki SUNBURN uramaki ") == "uramaki:* | sunburn:*"
+    assert _tsquery_text("roll di manzo") == "roll:* | di | manzo:*"
+    assert _tsquery_text("?! a") is None
+
+
+def test_rrf_prefers_items_in_both_lists():
+    lexical = [_row(1), _row(2)]
+    vector = [_row(3, cos_sim=0.9), _row(2, cos_sim=0.8)]
+    fused = fuse_rankings(lexical, vector, k=3)
+    assert [r["id"] for r in fused] == [2, 3, 1]          # pari merito: vince cos_sim
+    assert fused[0]["cos_sim"] == 0.8 and fused[2]["cos_sim"] is None
+    assert all(r["match"] == "hybrid" for r in fused)
+
+
+def test_lexical_pass_uses_menu_index_without_sql(monkeypatch):
+    from menu_services import hybrid_search, vector_db
+    from menu_services.menu_index import MenuIndex
+    rows = [
+        {"id": 3, "name": "Uramaki Sunburn", "type": "Uramaki", "ingredients": ["salmone"],
+         "description": "salmone scottato", "price": 12, "embedding": [1.0, 0.0]},
+        {"id": 1, "name": "Sashimi Salmone", "type": "Sashimi", "ingredients": ["salmone"],
+         "description": "", "price": 10, "embedding": [0.0, 1.0]},
+        {"id": 2, "name": "Gyoza", "type": "Antipasti", "ingredients": ["maiale"],
+         "description": "ravioli al salmone", "price": 6, "embedding": [1.0, 1.0]},
+    ]
+    index = MenuIndex.from_rows(1, rows)
+    monkeypatch.setattr(vector_db, "_menu_index_or_none", lambda: index)
+    monkeypatch.setattr(hybrid_search, "_run", lambda *a, **kw: pytest.fail("SQL non atteso"))
+    monkeypatch.setattr(hybrid_search, "resolve_alias", lambda name: name)
+
+    exact, partial, none = hybrid_search.lexical_search_menu_many(
+        ["  uramaki SUNBURN", "salm", "tempura"], k=5)
+    assert exact[0]["id"] == 3 and exact[0]["exact"] and exact[0]["lex"] == 2.0
+    # nome (peso A) prima della sola descrizione (peso B), a pari merito vince l'id
+    assert [r["id"] for r in partial] == [1, 2, 3] and not any(r["exact"] for r in partial)
+    assert none == []
+    assert [r["id"] for r in hybrid_search.lexical_search_menu("salm", 5, {"type": "antipasti"})] == [2]
@@ -0,0 +1,34 @@
+from flask import Flask
+
+from menu_services.ingredient_autocomplete import IngredientTrie, normalize_id
+from routes import ingredients as ingredients_route
+
+
+def test_normalize_id():
+    assert normalize_id("Salsa di Soia") == "salsadisoia"
+    assert normalize_id("Tè verde!") == "teverde"
+
+
+def test_complete_prefix_sorted_and_limited():
+    trie = IngredientTrie(1, ["salmone", "Salsa di Soia", "sale marino", "", "sesamo", "tè verde"])
+    assert [e["nome"] for e in trie.complete("sal", 10)] == ["sale marino", "salmone", "Salsa di Soia"]
+    assert [e["id"] for e in trie.complete("Salsa d", 10)] == ["salsadisoia"]
+    assert len(trie.complete("s", 2)) == 2
+    assert trie.complete("Te", 5) == [{"id": "teverde", "nome": "tè verde"}]
+    assert trie.complete("x", 5) == [] and len(trie.complete("", 100)) == 5
+
+
+def test_limit_only_validated_with_prefix(monkeypatch):
+    trie = IngredientTrie(1, ["salmone", "sale marino", "sesamo"])
+    monkeypatch.setattr(ingredients_route, "get_ingredient_trie", lambda: trie)
+    monkeypatch.setattr(ingredients_route, "set_current_db", lambda project: None)
+    monkeypatch.setattr(ingredients_route, "cached_json_response",
+                        lambda table, key, build: build())
+    app = Flask(__name__)
+    app.register_blueprint(ingredients_route.ingredients_bp)
+    c = app.test_client()
+
+    r = c.get("/ingredients?limit=abc")                  # elenco completo: limit ignorato
+    assert r.status_code == 200 and len(r.get_json()["ingredienti"]) == 3
+    assert c.get("/ingredients?q=s&limit=abc").status_code == 400
+    assert len(c.get("/ingredients?q=s&limit=2").get_json()["ingredienti"]) == 2
@@ -0,0 +1,49 @@
+import numpy as np
+
+from menu_services import ingredient_similarity
+from menu_services.ingredient_similarity import IngredientIndex
+
+
+def _index():
+    vectors = [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0.7, 0.7, 0]]
+    return IngredientIndex.from_names(1, ["Tofu", "tofu affumicato", "mango", "tempeh"], vectors)
+
+
+def test_similar_excludes_query_and_ranks_by_cosine():
+    ix = _index()
+    rows = ix.similar(ix.vector_for(" TOFU "), top_n=2, exclude="tofu")
+    assert [r["nome"] for r in rows] == ["tofu affumicato", "tempeh"]
+    assert rows[0]["score"] > rows[1]["score"]
+
+
+def test_similar_top_n_larger_than_index():
+    rows = _index().similar(np.array([0, 2, 0]), top_n=10)
+    assert [r["nome"] for r in rows][:1] == ["mango"] and len(rows) == 4
+    assert _index().vector_for("seitan") is None
+
+
+def test_index_embeds_raw_names_without_query_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ingredient_similarity, "list_unique_ingredients",
+                        lambda: ["edamame", "mochi", ""])
+    monkeypatch.setattr(ingredient_similarity, "get_embeddings",
+                        lambda names, cache=True: calls.append((list(names), cache))
+                        or [[1.0, 0.0], [0.0, 1.0]])
+    ix = ingredient_similarity._load(3)
+    assert calls == [(["edamame", "mochi"], False)]      # niente alias: "edamame" resta tale
+    assert ix.names == ["edamame", "mochi"] and ix.version == 3
+
+
+def test_unknown_version_reuses_index_until_ttl(monkeypatch):
+    from core.lru import LRUCache
+    loads = []
+    monkeypatch.setattr(ingredient_similarity, "_INDEXES", LRUCache(4))
+    monkeypatch.setattr(ingredient_similarity, "get_current_db", lambda: "t1")
+    monkeypatch.setattr(ingredient_similarity, "get_version", lambda table: None)
+    monkeypatch.setattr(ingredient_similarity, "_load",
+                        lambda version: loads.append(version)
+                        or IngredientIndex(version, [], np.zeros((0, 3), np.float32)))
+    first = ingredient_similarity.get_ingredient_index()
+    assert ingredient_similarity.get_ingredient_index() is first and loads == [None]
+    first.loaded_at -= ingredient_similarity.INGREDIENT_INDEX_TTL_S + 1
+    assert ingredient_similarity.get_ingredient_index() is not first and loads == [None, None]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from menu_services.menu_index import MenuIndex
+
+
+def _index():
+    rng = np.random.default_rng(0)
+    rows = [{"id": i, "name": f"p{i}", "type": "Uramaki" if i % 2 else "Nighiri",
+             "ingredients": ["avocado"] if i % 3 == 0 else ["salmone"], "description": "",
+             "price": i, "embedding": rng.normal(size=8).tolist()} for i in range(50)]
+    return MenuIndex.from_rows(1, rows)
+
+
+def test_top_k_matches_full_sort():
+    ix = _index()
+    q = np.random.default_rng(1).normal(size=8)
+    sims = ix.matrix @ (q / np.linalg.norm(q))
+    expected = [int(i) for i in np.argsort(-sims)[:5]]
+    res = ix.search(q, k=5)
+    assert [r["id"] for r in res] == expected
+    assert res[0]["score"] == res[0]["cos_sim"] >= res[-1]["score"]
+    assert "embedding" not in res[0]
+
+
+def test_k_larger_than_menu():
+    assert len(_index().search(np.ones(8), k=500)) == 50
+
+
+def test_filters_match_sql_semantics():
+    res = _index().search(np.ones(8), k=50, filters={
+        "type": "uramaki", "price_min": 10, "price_max": 30,
+        "exclude_ingredients": ["Avocado"],
+    })
+    assert res and all(r["type"] == "Uramaki" and 10 <= r["price"] <= 30
+                       and "avocado" not in r["ingredients"] for r in res)
+    assert len(res) == sum(1 for i in range(10, 31) if i % 2 and i % 3)
+
+
+def test_unknown_filter_rejected():
+    with pytest.raises(ValueError):
+        _index().search(np.ones(8), filters={"name": "x"})
+
+
+def test_least_recent_tenant_evicted(monkeypatch):
+    from core.lru import LRUCache
+    from menu_services import menu_index
+    monkeypatch.setattr(menu_index, "_INDEXES", LRUCache(2, on_evict=menu_index._drop_lock))
+    monkeypatch.setattr(menu_index, "_LOCKS", {})
+    monkeypatch.setattr(menu_index, "get_version", lambda table: 1)
+    monkeypatch.setattr(menu_index, "_load", lambda version: _index())
+    for db in ("a", "b", "c"):
+        monkeypatch.setattr(menu_index, "get_current_db", lambda db=db: db)
+        assert menu_index.get_menu_index() is not None
+    assert [db for db, _ in menu_index._INDEXES.items()] == ["b", "c"]
+    assert set(menu_index._LOCKS) == {"b", "c"}
+    assert set(menu_index.menu_index_stats()["tenants"]) == {"b", "c"}
@@ -0,0 +1,48 @@
+import time
+
+from core.db_router import set_current_db
+from menu_services import search_service as ss
+
+
+class _Listener:
+    def __init__(self):
+        self.refs = {}
+
+    def subscribe(self, db):
+        self.refs[db] = self.refs.get(db, 0) + 1
+
+    def unsubscribe(self, db):
+        self.refs[db] = self.refs.get(db, 0) - 1
+
+
+def test_snapshots_per_tenant_lru_and_stale_while_revalidate(monkeypatch):
+    from core.db_router import get_current_db
+    menus = {"a": [{"id": 1, "name": "Gyoza Verde"}], "b": [{"id": 2, "name": "Mochi Yuzu"}],
+             "c": [{"id": 3, "name": "Ramen Shoyu"}]}
+    monkeypatch.setattr(ss, "list_menu", lambda: list(menus[get_current_db()]))
+    monkeypatch.setattr(ss, "MENU_SNAPSHOT_MAX_TENANTS", 2)
+    ss.invalidate_menu_cache()
+    listener = _Listener()
+    monkeypatch.setattr(ss, "get_listener", lambda: listener)
+
+    set_current_db("a")
+    assert ss.best_menu_match("gyoza")["id"] == 1
+    set_current_db("b")
+    assert ss.best_menu_match("gyoza") is None          # niente menu di altri tenant
+    set_current_db("c")
+    ss._get_menu_snapshot()
+    assert set(ss.menu_snapshot_stats()["tenants"]) == {"b", "c"}
+    assert listener.refs == {"a": 0, "b": 1, "c": 1}     # "a" scartato dall'LRU
+
+    menus["c"] = [{"id": 4, "name": "Ramen Miso"}]
+    monkeypatch.setattr(ss, "_MENU_CACHE_TTL", 0.0)
+    assert ss._get_menu_snapshot()[0]["id"] == 3         # vecchio snapshot, refresh in background
+    for _ in range(100):
+        if ss._get_menu_snapshot()[0]["id"] == 4:
+            break
+        time.sleep(0.01)
+    assert ss._get_menu_snapshot()[0]["id"] == 4
+    assert listener.refs["c"] == 1                       # il refresh non sottoscrive di nuovo
+    ss.invalidate_menu_cache()
+    assert set(listener.refs.values()) == {0}
+    set_current_db(None)                                  # DB di default per i test successivi
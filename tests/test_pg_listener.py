@@ -0,0 +1,93 @@
+from core import pg_listener
+from core.pg_pool import ConnectionBudget
+
+
+class _FakeConn:
+    closed = False
+
+    def __init__(self, dbname):
+        self.dbname = dbname
+        self.autocommit = False
+
+    def cursor(self):
+        conn = self
+
+        class _Cur:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.listening = sql
+        return _Cur()
+
+    def close(self):
+        self.closed = True
+
+
+def _listener(monkeypatch, budget, max_conns):
+    monkeypatch.setattr(pg_listener.psycopg2, "connect", lambda dbname, **kw: _FakeConn(dbname))
+    listener = pg_listener.PgListener(connect_kwargs={"host": "x"}, budget=budget,
+                                      max_conns=max_conns)
+    listener._ensure_thread = lambda: None             # _connect_pending chiamato a mano
+    return listener
+
+
+def test_listen_connections_use_budget_and_cap(monkeypatch):
+    budget = ConnectionBudget(2)
+    listener = _listener(monkeypatch, budget, max_conns=1)
+    listener.subscribe("tenant_a")
+    listener.subscribe("tenant_b")
+    listener._connect_pending()
+    stats = listener.stats()
+    assert stats["listening"] == ["tenant_a"] and stats["ttl_only"] == ["tenant_b"]
+    assert budget.used == 1
+
+    listener.unsubscribe("tenant_a")                   # posto libero: tenant_b al prossimo giro
+    assert budget.used == 0
+    listener._pending["tenant_b"] = 0.0
+    listener._connect_pending()
+    assert listener.stats()["listening"] == ["tenant_b"] and budget.used == 1
+
+
+def test_full_budget_leaves_tenant_on_ttl(monkeypatch):
+    budget = ConnectionBudget(1)
+    assert budget.try_acquire()                        # un pool ha preso l'ultimo posto
+    listener = _listener(monkeypatch, budget, max_conns=4)
+    listener.subscribe("tenant_a")
+    listener._connect_pending()
+    assert listener.stats()["listening"] == [] and listener.stats()["ttl_only"] == ["tenant_a"]
+    assert budget.used == 1
+
+
+def test_subscriptions_are_reference_counted(monkeypatch):
+    budget = ConnectionBudget(4)
+    listener = _listener(monkeypatch, budget, max_conns=4)
+    listener.subscribe("tenant_a")                     # snapshot del menu
+    listener.subscribe("tenant_a")                     # prompt_store
+    listener._connect_pending()
+    listener.unsubscribe("tenant_a")                   # eviction in uno dei due
+    assert listener.stats()["listening"] == ["tenant_a"] and budget.used == 1
+    listener.unsubscribe("tenant_a")
+    assert listener.stats()["listening"] == [] and budget.used == 0
+    listener.unsubscribe("tenant_a")                   # unsubscribe in più: nessun effetto
+    assert listener.stats()["subscriptions"] == {}
+
+
+def test_failed_listen_closes_connection(monkeypatch):
+    budget = ConnectionBudget(2)
+    listener = _listener(monkeypatch, budget, max_conns=2)
+    opened = []
+
+    class _NoListen(_FakeConn):
+        def cursor(self):
+            raise pg_listener.psycopg2.OperationalError("permission denied")
+
+    monkeypatch.setattr(pg_listener.psycopg2, "connect",
+                        lambda dbname, **kw: opened.append(_NoListen(dbname)) or opened[-1])
+    listener.subscribe("tenant_a")
+    listener._connect_pending()
+    assert opened[0].closed and budget.used == 0
+    assert listener.stats()["listening"] == [] and "tenant_a" in listener._pending
@@ -0,0 +1,161 @@
+import threading, time
+import pytest
+import psycopg2.extensions
+from core.pg_pool import PoolRegistry, TenantPool, PoolTimeout, parse_kv
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+
+
+class _FakeConn:
+    """Connessione finta: basta a pool, health check e rollback."""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.in_tx = False
+        self.rollbacks = 0
+
+    def cursor(self, **kw):
+        return _FakeCursor(self)
+
+    def get_transaction_status(self):
+        return (psycopg2.extensions.TRANSACTION_STATUS_INTRANS if self.in_tx
+                else psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_tx = False
+
+    def close(self):
+        self.closed = 1
+
+
+def _pool(**kw):
+    opened = []
+
+    def connect():
+        c = _FakeConn()
+        opened.append(c)
+        return c
+    kw.setdefault("minconn", 0)
+    return TenantPool("demo", connect_fn=connect, **kw), opened
+
+
+def test_parse_kv():
+    assert parse_kv("pizza=20, demo = 5,bad") == {"pizza": "20", "demo": "5"}
+
+
+def test_reuse_and_rollback_on_put():
+    pool, opened = _pool(maxconn=2)
+    c = pool.getconn()
+    c.in_tx = True
+    pool.putconn(c)
+    # la transazione lasciata aperta viene chiusa e la connessione riusata
+    assert c.rollbacks == 1
+    assert pool.getconn() is c
+    assert len(opened) == 1
+
+
+def test_acquire_timeout_instead_of_pool_error():
+    pool, _ = _pool(maxconn=1, acquire_timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, _ = _pool(maxconn=1, acquire_timeout=2)
+    c = pool.getconn()
+    got = {}
+
+    def waiter():
+        got["conn"] = pool.getconn()
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    time.sleep(0.05)
+    assert pool.stats()["waiters"] == 1
+    pool.putconn(c)
+    t.join(timeout=2)
+    assert got["conn"] is c
+
+
+def test_broken_idle_connection_is_replaced():
+    pool, opened = _pool(maxconn=2, healthcheck_after=0)
+    c = pool.getconn()
+    pool.putconn(c)
+    c.broken = True
+    fresh = pool.getconn()
+    assert fresh is not c and c.closed
+    assert pool.stats()["discarded"] == 1
+    assert len(opened) == 2
+
+
+def test_max_connections_never_exceeded_under_concurrency():
+    pool, opened = _pool(maxconn=3, acquire_timeout=5)
+    peak = []
+
+    def worker():
+        for _ in range(20):
+            c = pool.getconn()
+            peak.append(pool.stats()["in_use"])
+            pool.putconn(c)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(opened) <= 3
+    assert max(peak) <= 3
+    assert pool.stats()["in_use"] == 0
+
+
+def _registry(budget, maxconn=3):
+    opened = []
+
+    def factory(dbname, **kw):
+        def connect():
+            c = _FakeConn()
+            opened.append(c)
+            return c
+        kw["maxconn"] = maxconn
+        return TenantPool(dbname, minconn=0, acquire_timeout=0.3, connect_fn=connect, **kw)
+    return PoolRegistry(budget=budget, pool_factory=factory), opened
+
+
+def test_budget_evicts_idle_connections_of_lru_tenant():
+    reg, opened = _registry(budget=2)
+    a, b, c = reg.get("a"), reg.get("b"), reg.get("c")
+    a.putconn(a.getconn())
+    b.putconn(b.getconn())
+    assert reg.budget.used == 2
+    # budget pieno: "c" ottiene la connessione chiudendo quella inattiva di "a"
+    conn = c.getconn()
+    assert opened[0].closed and not opened[1].closed
+    assert reg.budget.used == 2
+    c.putconn(conn)
+    assert reg.stats()["budget"]["evicted_connections"] == 1
+
+
+def test_budget_exhausted_by_busy_tenants_times_out():
+    reg, _ = _registry(budget=1)
+    held = reg.get("a").getconn()
+    with pytest.raises(PoolTimeout):
+        reg.get("b").getconn()
+    reg.get("a").putconn(held)
+    assert reg.get("b").getconn() is not None
@@ -0,0 +1,11 @@
+import numpy as np
+from psycopg2.extensions import adapt
+from core.pg_vector import VectorParam
+
+
+def test_vector_param_literal_roundtrip():
+    vals = np.array([0.1, -2.5, 1e-7], dtype=np.float32)
+    lit = adapt(VectorParam(vals)).getquoted().decode()
+    assert lit.startswith("'[") and lit.endswith("]'::vector")
+    parsed = np.array(lit[2:-10].split(","), dtype=np.float32)
+    assert np.array_equal(parsed, vals)          # nessuna perdita di precisione float32
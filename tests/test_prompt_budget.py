@@ -0,0 +1,44 @@
+from core.prompt_budget import fit_history, fit_items
+
+_cost = lambda items: [len(it["name"]) + len(it.get("description", "")) for it in items]
+
+
+def test_drops_lowest_scored_and_keeps_order():
+    items = [{"name": n} for n in ("aaaa", "bbbb", "cccc", "dddd")]
+    res = fit_items(items, 8, _cost, scores=[0.9, 0.1, 0.5, 0.2])
+    assert [it["name"] for it in res["items"]] == ["aaaa", "cccc"]
+    assert (res["tokens"], res["dropped"]) == (8, 2)
+
+
+def test_cart_is_shrunk_never_dropped():
+    items = [{"name": "uramaki", "description": "x" * 50}, {"name": "gyoza", "description": "y" * 50}]
+    res = fit_items(items, 20, _cost, shrink_fields=("description",), droppable=False)
+    assert [it["name"] for it in res["items"]] == ["uramaki", "gyoza"]
+    assert all(it["description"] == "" for it in res["items"])
+    assert items[0]["description"] == "x" * 50             # input non modificato
+
+
+def test_list_fields_stay_lists(monkeypatch):
+    from core import prompt_budget
+    monkeypatch.setattr(prompt_budget, "_get_tokenizer", lambda: None)
+    monkeypatch.setattr(prompt_budget, "PROMPT_TRUNCATE_TOKENS", 4)      # ~14 caratteri
+    cost = lambda items: [len(", ".join(it["ingredients"])) for it in items]
+    items = [{"name": "poke", "ingredients": ["riso", "salmone", "avocado", "edamame"]}]
+    assert fit_items(items, 13, cost, shrink_fields=("ingredients",))["items"][0]["ingredients"] \
+        == ["riso", "salmone"]
+    res = fit_items(items, 5, cost, shrink_fields=("ingredients",), droppable=False)
+    assert res["items"][0]["ingredients"] == [] and res["truncated"] == 1
+
+
+def test_no_budget_keeps_everything():
+    items = [{"name": "a" * 100}]
+    assert fit_items(items, 0, _cost)["items"] == items
+
+
+def test_history_keeps_latest_turns_from_a_user_message():
+    msgs = [{"role": "user", "content": "u" * 400}, {"role": "assistant", "content": "a" * 40},
+            {"role": "user", "content": "u" * 40}, {"role": "assistant", "content": "a" * 40},
+            {"role": "user", "content": "ciao"}]
+    res = fit_history(msgs, 30)
+    assert res["items"][0]["role"] == "user" and res["items"][-1]["content"] == "ciao"
+    assert res["dropped"] == 2 and len(res["items"]) == 3
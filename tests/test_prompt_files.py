@@ -0,0 +1,37 @@
+import json, logging, os
+
+import pytest
+
+from core import prompt_files
+
+
+def test_json_prompt_reloaded_only_when_file_changes(tmp_path, caplog):
+    path = tmp_path / "demo-criteria.json"
+    path.write_text(json.dumps({"prompt": "v1"}), encoding="utf-8")
+    candidates = [tmp_path / "demo-criteria", path]
+
+    caplog.set_level(logging.INFO)
+    assert prompt_files.load_json_prompt(candidates) == "v1"
+    assert prompt_files.load_json_prompt(candidates) == "v1"
+    assert sum("Caricato" in r.message for r in caplog.records) == 1
+
+    path.write_text(json.dumps({"prompt": "versione 2"}), encoding="utf-8")
+    assert prompt_files.load_json_prompt(candidates) == "versione 2"
+
+    path.write_text("{non json", encoding="utf-8")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    caplog.clear()
+    assert prompt_files.load_json_prompt(candidates) is None
+    assert prompt_files.load_json_prompt(candidates) is None
+    assert sum("Errore parsing" in r.message for r in caplog.records) == 1
+
+
+def test_read_text_follows_file(tmp_path):
+    path = tmp_path / "chat.txt"
+    with pytest.raises(FileNotFoundError):
+        prompt_files.read_text(path)
+    path.write_text("ciao", encoding="utf-8")
+    assert prompt_files.read_text(path) == "ciao"
+    path.write_text("ciao Nova", encoding="utf-8")
+    assert prompt_files.read_text(path) == "ciao Nova"
@@ -0,0 +1,79 @@
+from core import prompt_store
+from core.db_router import set_current_db
+from core.lru import LRUCache
+
+
+def test_prompt_reloaded_when_version_changes(monkeypatch):
+    db = {"version": 1, "text": "Tu sei Nova. <dynamic_data>[loop menu=1]{name}[/loop]</dynamic_data>",
+          "loads": 0}
+
+    def load(project):
+        db["loads"] += 1
+        return db["text"]
+
+    monkeypatch.setattr(prompt_store, "get_version", lambda table: db["version"])
+    monkeypatch.setattr(prompt_store, "_load", load)
+    monkeypatch.setattr(prompt_store, "get_listener", lambda: None)
+    prompt_store._CACHE.clear()
+
+    first = prompt_store.get_prepared_prompt("sushi")
+    assert prompt_store.get_prepared_prompt("sushi") is first and db["loads"] == 1
+    assert first.compiled is not None and first.split is not None
+    assert first.render({"menu": [{"name": "Gyoza"}], "products_cart": [], "reviews": []},
+                        {}, {}, layout="prefix") == "Tu sei Nova. \n\n<dynamic_data>Gyoza\n</dynamic_data>"
+
+    db["version"], db["text"] = 2, "versione 2"     # UPDATE sulla tabella prompt
+    assert prompt_store.get_prompt("sushi") == "versione 2" and db["loads"] == 2
+
+    db["version"], db["text"] = 3, ""                # prompt rimosso: il chiamante usa il payload
+    assert prompt_store.get_prepared_prompt("sushi") is None
+    set_current_db(None)
+
+
+def test_unknown_version_cached_until_ttl(monkeypatch):
+    loads = []
+    monkeypatch.setattr(prompt_store, "get_version", lambda table: None)
+    monkeypatch.setattr(prompt_store, "_load", lambda project: loads.append(project) or "Tu sei Nova.")
+    monkeypatch.setattr(prompt_store, "get_listener", lambda: None)
+    clock = [0.0]
+    monkeypatch.setattr("core.lru.time.monotonic", lambda: clock[0])
+    monkeypatch.setattr(prompt_store, "_CACHE", LRUCache(4, ttl=60, on_evict=prompt_store._CACHE.on_evict))
+
+    first = prompt_store.get_prepared_prompt("sushi")
+    assert prompt_store.get_prepared_prompt("sushi") is first and len(loads) == 1
+    clock[0] = 61.0                                  # TTL scaduto: riletto dal DB
+    assert prompt_store.get_prepared_prompt("sushi") is not first and len(loads) == 2
+    set_current_db(None)
+
+
+class _Listener:
+    def __init__(self):
+        self.refs = {}
+
+    def subscribe(self, db):
+        self.refs[db] = self.refs.get(db, 0) + 1
+
+    def unsubscribe(self, db):
+        self.refs[db] -= 1
+
+
+def test_evicted_tenant_is_unsubscribed(monkeypatch):
+    listener = _Listener()
+    version = {"v": 1}
+    monkeypatch.setattr(prompt_store, "get_version", lambda table: version["v"])
+    monkeypatch.setattr(prompt_store, "_load", lambda project: f"prompt di {project}")
+    monkeypatch.setattr(prompt_store, "get_listener", lambda: listener)
+    monkeypatch.setattr(prompt_store, "_CACHE", LRUCache(
+        2, on_evict=lambda key, _value: prompt_store._track(key[0], -1)))
+
+    prompt_store.get_prompt("pizza")
+    version["v"] = 2                                   # seconda voce, stesso tenant
+    prompt_store.get_prompt("pizza")
+    assert listener.refs == {"pizza": 1}
+    prompt_store.get_prompt("ramen_bar")               # scarta pizza v1: pizza resta seguito
+    assert listener.refs == {"pizza": 1, "ramen_bar": 1}
+    prompt_store.get_prompt("tenant_x")                # scarta l'ultima voce di pizza
+    assert listener.refs == {"pizza": 0, "ramen_bar": 1, "tenant_x": 1}
+    prompt_store._CACHE.clear()
+    assert set(listener.refs.values()) == {0}
+    set_current_db(None)
@@ -0,0 +1,57 @@
+import itertools
+from pathlib import Path
+
+from core.prompt_template import get_compiled, render_legacy, render_prompt, split_prefix
+
+_PROMPT = (Path(__file__).resolve().parents[1] / "prompts" / "demo-chat.txt").read_text(encoding="utf-8")
+_LOOPS = ("menu", "products_cart", "reviews")
+
+
+def _data(n, **overrides):
+    dish = {"name": "Uramaki Sunburn", "type": "Uramaki", "description": "Tonno piccante",
+            "ingredients": ["tonno", "avocado"], "price": 9.5, "quantity": 2}
+    dish.update(overrides)
+    review = {"voto": "5", "dish": "Gyoza", "snippet": "ottimi"}
+    return {"menu": [dish] * n, "products_cart": [dish] * n, "reviews": [review] * n}
+
+
+def test_demo_prompt_is_compiled_and_identical():
+    assert get_compiled(_PROMPT, _LOOPS) is not None
+    repl = {"delivery_type": "domicilio", "delivery_day": "", "delivery_hour": "20:30",
+            "address": "Via Roma 1", "cart_total": "19.00"}
+    for n, flags in itertools.product((0, 1, 3), itertools.product(("", "1"), repeat=4)):
+        conds = dict(zip(("menu", "cart", "reviews", "delivery"), flags))
+        loops = _data(n)
+        assert render_prompt(_PROMPT, loops, conds, repl) == render_legacy(_PROMPT, loops, conds, repl)
+
+
+def test_values_with_template_syntax_use_legacy():
+    loops = _data(2, description="vedi {price} [if menu=1]x[/if]")
+    conds = {"menu": "1", "cart": "1"}
+    repl = {"cart_total": "{address}", "address": "Via Roma 1"}
+    assert render_prompt(_PROMPT, loops, conds, repl) == render_legacy(_PROMPT, loops, conds, repl)
+
+
+def test_nested_if_falls_back():
+    tpl = "[if a=1]A[if b=1]B[/if]C[/if] {x}"
+    assert get_compiled(tpl, ()) is None
+    for a, b in itertools.product(("", "1"), repeat=2):
+        conds = {"a": a, "b": b}
+        assert render_prompt(tpl, {}, conds, {"x": "X"}) == render_legacy(tpl, {}, conds, {"x": "X"})
+
+
+def test_prefix_layout_keeps_static_text_first():
+    static, dynamic = split_prefix(_PROMPT)
+    assert "<dynamic_data>" not in static and "<instructions>" in static
+    repl = {"cart_total": "19.00"}
+    for n in (0, 2):
+        conds = {"menu": "1" if n else "", "cart": "1" if n else ""}
+        out = render_prompt(_PROMPT, _data(n), conds, repl, layout="prefix")
+        assert out == static + render_legacy(dynamic, _data(n), conds, repl)
+
+
+def test_prefix_layout_falls_back_to_inline():
+    tpl = "intro {cart_total}\n<dynamic_data>[if a=1]A[/if]</dynamic_data>\nfine"
+    assert render_prompt(tpl, {}, {"a": "1"}, {"cart_total": "5"}, layout="prefix") == \
+        "intro 5\n<dynamic_data>A</dynamic_data>\nfine"
+    assert split_prefix("nessun blocco dinamico") is None
@@ -0,0 +1,19 @@
+from core import search_cache
+
+
+def test_keys_follow_data_version_and_normalized_text(monkeypatch):
+    version = {"recensioni": 1}
+    monkeypatch.setattr(search_cache, "get_version", lambda table: version[table])
+    monkeypatch.setattr(search_cache, "get_current_db", lambda: "demo")
+    search_cache.clear()
+
+    key = search_cache.cache_keys("recensioni", ["Mochi  "], 4)[0]
+    search_cache.put("recensioni", key, [{"id": 1}])
+    hit = search_cache.get("recensioni", search_cache.cache_keys("recensioni", ["mochi"], 4)[0])
+    assert hit == [{"id": 1}]
+    hit[0]["id"] = 99                                 # copia: la cache non cambia
+    assert search_cache.get("recensioni", key) == [{"id": 1}]
+
+    version["recensioni"] = 2                         # i loader hanno riscritto la tabella
+    key2 = search_cache.cache_keys("recensioni", ["mochi"], 4)[0]
+    assert search_cache.get("recensioni", key2) is None
@@ -0,0 +1,46 @@
+from psycopg2.errors import UndefinedTable
+
+from core import vector_table
+from review_services import vector_db_reviews
+
+
+def _fake_execute(rows):
+    def execute(many, embs, table, cols, k, *args):
+        assert many and len(embs) == 3
+        return rows
+    return execute
+
+
+def test_search_table_many_groups_by_query_idx(monkeypatch):
+    monkeypatch.setattr(vector_table.search_cache, "cache_keys", lambda *a, **kw: None)
+    monkeypatch.setattr(vector_table, "get_embeddings", lambda texts: [[0.1, 0.2]] * len(texts))
+    # la query 2 non ha match; l'ordine dentro ogni gruppo è quello della SQL
+    monkeypatch.setattr(vector_table, "_execute", _fake_execute([
+        {"query_idx": 1, "name": "Gyoza Verde", "score": 0.9},
+        {"query_idx": 1, "name": "Ramen Shoyu Vegetale", "score": 0.4},
+        {"query_idx": 3, "name": "Mochi Yuzu", "score": 0.8},
+    ]))
+    out = vector_table.search_table_many(["gyoza", "pizza", "mochi"], table="menu",
+                                         fields="name", k=2)
+    assert out == [
+        [{"name": "Gyoza Verde", "score": 0.9}, {"name": "Ramen Shoyu Vegetale", "score": 0.4}],
+        [],
+        [{"name": "Mochi Yuzu", "score": 0.8}],
+    ]
+
+
+def test_search_reviews_many_keeps_query_order(monkeypatch):
+    monkeypatch.setattr(vector_table.search_cache, "cache_keys", lambda *a, **kw: None)
+    monkeypatch.setattr(vector_table, "get_embeddings", lambda texts: [[0.1, 0.2]] * len(texts))
+    monkeypatch.setattr(vector_table, "_execute", _fake_execute([
+        {"query_idx": 2, "id": 7, "voto": 5, "score": 0.7},
+        {"query_idx": 3, "id": 3, "voto": 2, "score": 0.6},
+        {"query_idx": 3, "id": 9, "voto": 4, "score": 0.5},
+    ]))
+    out = vector_db_reviews.search_reviews_many(["servizio", "tonno fresco", "attesa"], k=2)
+    assert [[r["id"] for r in rows] for rows in out] == [[], [7], [3, 9]]
+
+    def missing_table(*a, **kw):
+        raise UndefinedTable("relation \"recensioni\" does not exist")
+    monkeypatch.setattr(vector_table, "_execute", missing_table)
+    assert vector_db_reviews.search_reviews_many(["a", "b", "c"]) == [[], [], []]
@@ -0,0 +1,22 @@
+import pytest
+from core import vector_index
+from core.vector_index import ann_settings_sql, ivfflat_lists
+
+
+def test_ivfflat_lists_heuristic():
+    assert ivfflat_lists(500) == 1
+    assert ivfflat_lists(200_000) == 200
+    assert ivfflat_lists(4_000_000) == 2000
+
+
+def test_ann_settings_per_query_class(monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_KIND", "hnsw")
+    assert ann_settings_sql("search") == "SET LOCAL hnsw.ef_search = 64; "
+    assert ann_settings_sql("list") == ""
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_KIND", "none")
+    assert ann_settings_sql("search") == ""
+
+
+def test_unknown_table_rejected():
+    with pytest.raises(ValueError):
+        vector_index.ensure_vector_index(None, "users")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+bench_fuzzy_match.py
+───────────────────────────────────────────────────────────────────────────────
+Confronta il fallback fuzzy di search_service:
+
+- lineare:  _token_overlap_score contro ogni riga del menu (vecchio best_menu_match)
+- indice:   FuzzyMatcher (indice invertito sui token + potatura quick_ratio)
+
+su menu sintetici di 100, 1.000 e 10.000 piatti (nomi composti da parole
+di un vocabolario da sushi bar). Le richieste sono nomi del menu con refusi,
+nomi parziali e testi senza token in comune. Niente DB né modelli.
+
+"stesso top-1" conta le richieste in cui i due metodi scelgono lo stesso
+piatto (stesso punteggio e stessa posizione a pari merito).
+
+Esempio di esecuzione:
+    python tools/bench_fuzzy_match.py
+    python tools/bench_fuzzy_match.py --sizes 100 1000 10000 --queries 300
+"""
+
+import argparse, random, sys, time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from menu_services.fuzzy_matcher import FuzzyMatcher
+from menu_services.search_service import _token_overlap_score
+
+_WORDS = ("uramaki nighiri sashimi hosomaki futomaki gunkan temaki tartare ceviche "
+          "ramen poke bowl roll salmone tonno gambero avocado yuzu mango tempura "
+          "spicy crispy dragon rainbow green garden sunburn teriyaki sesamo lime "
+          "philadelphia tataki shichimi miso veg vegano classico nordico tropicale "
+          "manzo pollo yakitori anguilla capesante branzino ricciola zenzero wasabi").split()
+
+
+def make_menu(n: int, rng: random.Random) -> list[dict]:
+    return [{"id": i, "name": " ".join(rng.sample(_WORDS, rng.randint(2, 4))) + f" {i}"}
+            for i in range(n)]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def make_queries(menu: list[dict], n: int, rng: random.Random) -> list[str]:
+    out = []
+    for _ in range(n):
+        words = rng.choice(menu)["name"].split()[:-1]
+        kind = rng.random()
+        if kind < 0.4:
+            out.append(" ".join(words))                                # nome senza numero
+        elif kind < 0.7:
+            out.append(" ".join(typo(w, rng) if rng.random() < 0.5 else w for w in words))
+        elif kind < 0.9:
+            out.append(words[0])                                       # nome parziale
+        else:
+            out.append("qualcosa di fresco")                           # nessun token in comune
+    return out
+
+
+def linear_best(menu: list[dict], query: str):
+    best, best_sc = None, 0.0
+    for row in menu:
+        sc = _token_overlap_score(query, row["name"])
+        if sc > best_sc:
+            best_sc, best = sc, row
+    return best
+
+
+def timed(fn, queries):
+    out, t0 = [], time.perf_counter()
+    for q in queries:
+        out.append(fn(q))
+    return out, (time.perf_counter() - t0) * 1000 / max(1, len(queries))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="best_menu_match: scansione lineare vs FuzzyMatcher")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    for n in args.sizes:
+        rng = random.Random(args.seed)
+        menu = make_menu(n, rng)
+        queries = make_queries(menu, args.queries, rng)
+
+        t0 = time.perf_counter()
+        matcher = FuzzyMatcher(menu)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        ref, lin_ms = timed(lambda q: linear_best(menu, q), queries)
+        got, idx_ms = timed(matcher.best, queries)
+        _, top3_ms = timed(lambda q: matcher.top_k(q, 3), queries)
+        same = sum(a is b for a, b in zip(ref, got))
+        print(f"• {n:>6} piatti   lineare {lin_ms:8.3f} ms/query   indice {idx_ms:7.3f} ms "
+              f"(top-3 {top3_ms:7.3f} ms, build {build_ms:6.1f} ms)   "
+              f"x{lin_ms / max(idx_ms, 1e-9):5.1f}   stesso top-1 {same}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
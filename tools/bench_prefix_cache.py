@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+bench_prefix_cache.py
+───────────────────────────────────────────────────────────────────────────────
+Quanto prompt può riusare la prefix cache di vLLM, turno per turno, con i
+due layout del system prompt (PROMPT_LAYOUT=inline | prefix).
+
+Avvia uno stub locale di /v1/chat/completions che imita l'automatic prefix
+caching di vLLM: il prompt (messaggi in formato chat-template) è diviso in
+blocchi da --block token, ogni blocco è identificato dall'hash di tutto il
+prefisso fino a lì, e i blocchi già visti in richieste precedenti contano
+come "cached". La risposta riporta usage.prompt_tokens_details.cached_tokens
+come vLLM.
+
+Simula --users conversazioni intercalate di --turns turni sullo stesso
+tenant (prompts/demo-chat.txt): a ogni turno crescono cronologia e carrello,
+cambiano piatti confermati e recensioni, come in chat_service.
+
+Esempio di esecuzione:
+    python tools/bench_prefix_cache.py
+    python tools/bench_prefix_cache.py --users 8 --turns 6 --warmup
+    python tools/bench_prefix_cache.py --tokenizer /path/gemma-3/tokenizer.json
+"""
+
+import argparse, hashlib, json, random, re, sys, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.prompt_template import render_prompt, split_prefix
+
+PROMPT = Path(__file__).resolve().parents[1] / "prompts" / "demo-chat.txt"
+_WORD_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+
+# ───────────────────────────────────────────────────────────────────
+# Stub server con prefix cache a blocchi
+class PrefixCache:
+    def __init__(self, block: int, tokenizer=None):
+        self.block = block
+        self.tokenizer = tokenizer
+        self.blocks: set = set()
+        self.lock = threading.Lock()
+
+    def tokens(self, text: str):
+        if self.tokenizer is not None:
+            return self.tokenizer.encode(text, add_special_tokens=False).ids
+        return _WORD_RE.findall(text)
+
+    def lookup_and_insert(self, text: str):
+        toks = self.tokens(text)
+        h = hashlib.sha1()
+        cached, hit = 0, True
+        with self.lock:
+            for end in range(self.block, len(toks) + 1, self.block):
+                h.update(json.dumps(toks[end - self.block:end]).encode())
+                key = h.hexdigest()
+                if hit and key in self.blocks:
+                    cached = end
+                else:
+                    hit = False
+                    self.blocks.add(key)
+        return len(toks), min(cached, len(toks) - 1)
+
+
+def chat_template(messages) -> str:
+    """Formato tipo Gemma: il system prompt entra nel primo turno utente."""
+    out, system = ["<bos>"], ""
+    for m in messages:
+        if m["role"] == "system":
+            system = m["content"] + "\n\n"
+            continue
+        role = "model" if m["role"] == "assistant" else "user"
+        out.append(f"<start_of_turn>{role}\n{system}{m['content']}<end_of_turn>\n")
+        system = ""
+    out.append("<start_of_turn>model\n")
+    return "".join(out)
+
+
+def start_stub(cache: PrefixCache) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            total, cached = cache.lookup_and_insert(chat_template(body["messages"]))
+            data = json.dumps({
+                "choices": [{"message": {"role": "assistant", "content": "Desideri altro?"},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": total, "prompt_tokens_details": {"cached_tokens": cached}},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ───────────────────────────────────────────────────────────────────
+def _dish(rng: random.Random):
+    i = rng.randint(1, 40)
+    return {"name": f"Uramaki Sunburn {i}", "type": "Uramaki",
+            "description": "Tonno piccante, avocado e cipolla croccante.",
+            "ingredients": "tonno, avocado, sriracha", "price": f"{4 + i * 0.35:.2f}"}
+
+
+def run(layout: str, args, url: str, template: str):
+    rng = random.Random(args.seed)
+    users = [{"history": [], "cart": []} for _ in range(args.users)]
+    if args.warmup and layout == "prefix":
+        requests.post(url, json={"messages": [
+            {"role": "system", "content": split_prefix(template)[0]},
+            {"role": "user", "content": "ciao"}], "max_tokens": 1}, timeout=10)
+
+    per_turn = []
+    for turn in range(args.turns):
+        tot = cached = 0
+        for u in users:
+            menu = [_dish(rng) for _ in range(rng.randint(0, 3))]
+            if menu:
+                u["cart"].append({**_dish(rng), "ingredients": ["tonno", "avocado"], "quantity": 1})
+            reviews = ([{"voto": str(rng.randint(3, 5)), "dish": "Gyoza",
+                         "snippet": "Ottimi, croccanti fuori e morbidi dentro."}] * rng.randint(0, 4))
+            sys_prompt = render_prompt(
+                template,
+                loops={"menu": menu, "products_cart": u["cart"], "reviews": reviews},
+                conditions={"menu": "1" if menu else "", "cart": "1" if u["cart"] else "",
+                            "reviews": "1" if reviews else "", "delivery": ""},
+                replacements={"delivery_type": "", "delivery_day": "", "delivery_hour": "",
+                              "address": "", "cart_total": f"{len(u['cart']) * 9.5:.2f}"},
+                layout=layout,
+            )
+            u["history"].append({"role": "user", "content": f"vorrei un uramaki numero {rng.randint(1, 40)}"})
+            usage = requests.post(url, json={"messages": [{"role": "system", "content": sys_prompt}]
+                                             + u["history"]}, timeout=10).json()["usage"]
+            u["history"].append({"role": "assistant", "content": "Perfetto! Desideri altro?"})
+            tot += usage["prompt_tokens"]
+            cached += usage["prompt_tokens_details"]["cached_tokens"]
+        per_turn.append((tot / len(users), cached / len(users)))
+    return per_turn
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prefix cache vLLM: layout inline vs prefix")
+    ap.add_argument("--users", type=int, default=4)
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--block", type=int, default=16, help="block size della KV cache (vLLM: 16)")
+    ap.add_argument("--warmup", action="store_true", help="richiesta di warm-up prima degli utenti")
+    ap.add_argument("--tokenizer", default="", help="tokenizer.json del modello (default: parole)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    tokenizer = None
+    if args.tokenizer:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(args.tokenizer)
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+
+    template = PROMPT.read_text(encoding="utf-8")
+    results = {}
+    for layout in ("inline", "prefix"):
+        server = start_stub(PrefixCache(args.block, tokenizer))
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+            results[layout] = run(layout, args, url, template)
+        finally:
+            server.shutdown()
+
+    print(f"• {PROMPT.name} · {args.users} utenti × {args.turns} turni · blocchi da {args.block} "
+          f"· tokenizer {'modello' if tokenizer else 'parole'}{' · warm-up' if args.warmup else ''}")
+    print("  turno │ inline: prompt  prefisso condiviso │ prefix: prompt  prefisso condiviso")
+    for t, ((ti, ci), (tp, cp)) in enumerate(zip(results["inline"], results["prefix"]), 1):
+        print(f"  {t:5d} │ {ti:14.0f}  {ci:9.0f} ({ci / ti:4.0%})  │ {tp:14.0f}  {cp:9.0f} ({cp / tp:4.0%})")
+    for layout, rows in results.items():
+        tot, cached = sum(r[0] for r in rows), sum(r[1] for r in rows)
+        print(f"  {layout:6s}: {cached / tot:.0%} dei token di prompt da prefix cache "
+              f"({tot - cached:.0f} token/utente da calcolare in prefill)")
+
+
+if __name__ == "__main__":
+    main()
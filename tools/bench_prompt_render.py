@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+bench_prompt_render.py
+───────────────────────────────────────────────────────────────────────────────
+Microbenchmark del rendering del system prompt (prompts/demo-chat.txt):
+
+- storico:    fill_prompt_loop × 3 + process_conditional_blocks + replace
+              globali (la pipeline di chat_service prima di core/prompt_template.py)
+- compilato:  render_prompt (template in cache, un solo passaggio)
+
+con dimensioni realistiche: --menu piatti confermati (max 8 in chat_service),
+--cart prodotti nel carrello, --reviews recensioni (4 per query di review).
+Verifica anche che i due output siano identici byte per byte.
+
+Esempio di esecuzione:
+    python tools/bench_prompt_render.py
+    python tools/bench_prompt_render.py --menu 8 --cart 15 --reviews 12 --iters 5000
+"""
+
+import argparse, random, sys, time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.prompt_template import get_compiled, render_legacy, render_prompt
+
+PROMPT = Path(__file__).resolve().parents[1] / "prompts" / "demo-chat.txt"
+
+
+def make_data(n_menu: int, n_cart: int, n_reviews: int, seed: int = 0):
+    rng = random.Random(seed)
+    dish = lambda i: {
+        "name": f"Uramaki Sunburn {i}", "type": "Uramaki",
+        "description": "Tonno piccante, avocado e cipolla croccante con salsa sriracha.",
+        "ingredients": ", ".join(["tonno", "avocado", "sriracha", "cipolla fritta"]),
+        "price": f"{rng.uniform(4, 18):.2f}",
+    }
+    menu = [dish(i) for i in range(n_menu)]
+    cart = [{**dish(i), "ingredients": ["tonno", "avocado", "sriracha"],
+             "quantity": rng.randint(1, 4)} for i in range(n_cart)]
+    reviews = [{"voto": str(rng.randint(1, 5)), "dish": "Uramaki Sunburn",
+                "snippet": "Porzioni generose, pesce freschissimo e servizio veloce. " * 3}
+               for _ in range(n_reviews)]
+    loops = {"menu": menu, "products_cart": cart, "reviews": reviews}
+    conditions = {"menu": "1" if menu else "", "cart": "1" if cart else "",
+                  "reviews": "1" if reviews else "", "delivery": "1"}
+    replacements = {"delivery_type": "domicilio", "delivery_day": "venerdì",
+                    "delivery_hour": "20:30", "address": "Via Roma 15",
+                    "cart_total": "42.50"}
+    return loops, conditions, replacements
+
+
+def bench(fn, iters: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / iters
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rendering del prompt: storico vs compilato")
+    ap.add_argument("--menu", type=int, default=8)
+    ap.add_argument("--cart", type=int, default=10)
+    ap.add_argument("--reviews", type=int, default=12)
+    ap.add_argument("--iters", type=int, default=2000)
+    args = ap.parse_args()
+
+    template = PROMPT.read_text(encoding="utf-8")
+    loops, conditions, replacements = make_data(args.menu, args.cart, args.reviews)
+
+    t0 = time.perf_counter()
+    compiled = get_compiled(template, tuple(loops))
+    compile_ms = (time.perf_counter() - t0) * 1000
+    if compiled is None:
+        sys.exit("✗ template non compilabile: render_prompt userebbe la pipeline storica")
+
+    legacy = render_legacy(template, loops, conditions, replacements)
+    fast = render_prompt(template, loops, conditions, replacements)
+    print(f"• {PROMPT.name}: {len(template)} caratteri → {len(fast)} · menu={args.menu} "
+          f"cart={args.cart} reviews={args.reviews} · compilazione {compile_ms:.2f} ms")
+    print(f"  output identico: {'sì' if legacy == fast else 'NO'}")
+
+    us_legacy = bench(lambda: render_legacy(template, loops, conditions, replacements), args.iters)
+    us_fast = bench(lambda: render_prompt(template, loops, conditions, replacements), args.iters)
+    print(f"  storico     {us_legacy:8.1f} µs/render")
+    print(f"  compilato   {us_fast:8.1f} µs/render   x{us_legacy / us_fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+bench_review_rerank.py
+───────────────────────────────────────────────────────────────────────────────
+Benchmark della ricerca recensioni a due fasi (candidati ANN + rerank sul
+voto) contro la versione a una fase, che ordina tutta la tabella per
+(1 - distanza) + (voto/5)*0.3 e quindi non può usare l'indice.
+
+1. --setup crea il DB BENCH_DB (default bench_reviews, schema clonato da
+   DB_NAME) e lo riempie con
+   --rows recensioni sintetiche: embedding raggruppati attorno a centroidi
+   casuali, voto 1–5; poi costruisce l'indice ANN (core/vector_index.py);
+2. senza --setup confronta, su query vicine ai dati, la latenza e il
+   ranking delle due varianti per ogni valore di --candidates.
+
+"identico" conta le query con stesso top-k (id e score); "top-k nei
+candidati" quelle in cui il vero top-k cade tra gli N più vicini, il caso
+in cui il ranking è garantito identico.
+
+Esempio di esecuzione:
+    python tools/bench_review_rerank.py --setup --rows 1000000
+    python tools/bench_review_rerank.py --candidates 50 100 200 --queries 100
+"""
+
+import argparse, io, os, sys, time, uuid
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+BENCH_DB = os.getenv("BENCH_DB", "bench_reviews")
+os.environ["DEFAULT_DB"] = BENCH_DB            # il router di core/ punta al DB di benchmark
+
+from core.embedding_providers import provider_class
+from core.vector_index import drop_vector_indexes, ensure_vector_index
+from core.vector_table import search_table_by_embedding
+
+DB = dict(
+    dbname   = os.getenv("DB_NAME", "demo_restaurant"),
+    user     = os.getenv("DB_USER", "postgres"),
+    password = os.getenv("DB_PASS", "postgres"),
+    host     = os.getenv("DB_HOST", "localhost"),
+    port     = int(os.getenv("DB_PORT", "5432")),
+)
+EXTRA = "(voto / 5.0) * 0.3"
+
+
+def setup(rows: int, chunk: int = 50_000, clusters: int = 1000, seed: int = 0):
+    admin = psycopg2.connect(**{**DB, "dbname": "postgres"})
+    admin.autocommit = True
+    with closing(admin), admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{BENCH_DB}"')
+        cur.execute(f'CREATE DATABASE "{BENCH_DB}" TEMPLATE "{DB["dbname"]}"')
+    print(f"• DB {BENCH_DB} creato da {DB['dbname']}")
+
+    dim = provider_class().dim
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    with closing(psycopg2.connect(**{**DB, "dbname": BENCH_DB})) as con, con.cursor() as cur:
+        cur.execute("TRUNCATE recensioni")
+        drop_vector_indexes(cur, "recensioni")     # costruito dopo il caricamento
+        t0 = time.time()
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            x = centers[rng.integers(0, clusters, n)] + \
+                rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+            x /= np.linalg.norm(x, axis=1, keepdims=True)
+            voti = rng.integers(1, 6, n)
+            buf = io.StringIO()
+            for i in range(n):
+                vec = ",".join("%.6g" % v for v in x[i])
+                buf.write(f"{uuid.uuid4()}\t{voti[i]}\trecensione sintetica {start + i}\t[{vec}]\n")
+            buf.seek(0)
+            cur.copy_expert("COPY recensioni (id, voto, recensione, embedding) FROM STDIN", buf)
+            con.commit()
+            print(f"  • {start + n:>9} righe  ({time.time() - t0:.0f} s)")
+        print("• Costruzione indice ANN …")
+        t0 = time.time()
+        name = ensure_vector_index(cur, "recensioni")
+        cur.execute("ANALYZE recensioni")
+        con.commit()
+        print(f"✓ {rows} recensioni, indice {name} in {time.time() - t0:.0f} s")
+
+
+def sample_queries(n: int, noise: float, seed: int) -> np.ndarray:
+    with closing(psycopg2.connect(**{**DB, "dbname": BENCH_DB})) as con, con.cursor() as cur:
+        cur.execute("SELECT embedding::real[] FROM recensioni TABLESAMPLE SYSTEM (1) LIMIT %s", (n,))
+        base = np.asarray([r[0] for r in cur.fetchall()], dtype=np.float32)
+    q = base + np.random.default_rng(seed).normal(scale=noise, size=base.shape).astype(np.float32)
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def nearest_ids(q, n: int) -> set:
+    rows = search_table_by_embedding(q, table="recensioni", fields="id", k=n)
+    return {r["id"] for r in rows}
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recensioni: rerank a due fasi vs scansione completa")
+    ap.add_argument("--setup", action="store_true", help="crea e riempie il DB di benchmark")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--candidates", type=int, nargs="+", default=[50, 100, 200])
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--noise", type=float, default=0.02)
+    args = ap.parse_args()
+
+    if args.setup:
+        return setup(args.rows)
+
+    queries = sample_queries(args.queries, args.noise, seed=7)
+    print(f"• DB {BENCH_DB} · {len(queries)} query · k={args.k}")
+
+    exact, lat_exact = [], []
+    for q in queries:
+        rows, ms = timed(lambda: search_table_by_embedding(
+            q, table="recensioni", fields="id,voto", k=args.k, extra_score_sql=EXTRA))
+        exact.append([(r["id"], r["score"]) for r in rows])
+        lat_exact.append(ms)
+    print(f"  una fase (scansione)      p50 {np.percentile(lat_exact, 50):8.2f} ms   "
+          f"p95 {np.percentile(lat_exact, 95):8.2f} ms")
+
+    for n in args.candidates:
+        lat, identical, inside, identical_inside = [], 0, 0, 0
+        for q, ref in zip(queries, exact):
+            rows, ms = timed(lambda: search_table_by_embedding(
+                q, table="recensioni", fields="id,voto", k=args.k,
+                extra_score_sql=EXTRA, candidates=n))
+            lat.append(ms)
+            same = [(r["id"], r["score"]) for r in rows] == ref
+            covered = {i for i, _ in ref} <= nearest_ids(q, n)
+            identical += same
+            inside += covered
+            identical_inside += same and covered
+        print(f"  due fasi N={n:<5}          p50 {np.percentile(lat, 50):8.2f} ms   "
+              f"p95 {np.percentile(lat, 95):8.2f} ms   identico {identical}/{len(queries)}   "
+              f"top-k nei candidati {inside} (di cui identici {identical_inside})")
+
+
+if __name__ == "__main__":
+    main()
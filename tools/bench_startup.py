@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+───────────────────────────────────────────────────────────────────────────────
+Misura il cold start dell'app Flask:
+
+1. tempo di import per modulo (python -X importtime su factory.app_factory),
+   ordinato per tempo cumulativo;
+2. per ogni blueprint, in un processo Python NUOVO: tempo di import,
+   tempo di create_app() e tempo alla prima risposta dell'endpoint.
+
+Ogni misura gira in un sottoprocesso separato, così nessun modulo è già
+in cache da una misura precedente.
+
+Esempio di esecuzione:
+    export EMBEDDING_PROVIDER=local_cpu
+    python tools/bench_startup.py --top 25
+"""
+
+import argparse, json, os, subprocess, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# (blueprint, metodo, path, body JSON)
+ENDPOINTS = [
+    ("menu_bp",        "GET",  "/api/menu", None),
+    ("ingredients_bp", "GET",  "/api/ingredienti", None),
+    ("cart_bp",        "GET",  "/api/getcart?sessionid=bench-startup", None),
+    ("stats_bp",       "GET",  "/api/stats", None),
+    ("chat_bp",        "POST", "/api/chat", {
+        "project": "demo", "sessionid": "bench-startup",
+        "conversation_history": [{"role": "user", "content": "Avete il ramen?"}],
+    }),
+]
+
+# Codice eseguito nel processo figlio: stampa una riga JSON con i tempi
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from factory.app_factory import create_app
+t_import = time.perf_counter()
+out = {"import_s": t_import - t0}
+try:
+    app = create_app()
+except Exception as exc:
+    out["error"] = f"create_app: {exc}"
+    print("@@" + json.dumps(out)); sys.exit(0)
+t_app = time.perf_counter()
+out["create_app_s"] = t_app - t_import
+method, path, body = json.loads(sys.argv[1])
+client = app.test_client()
+try:
+    resp = client.open(path, method=method, json=body)
+    out["status"] = resp.status_code
+except Exception as exc:
+    out["error"] = f"request: {exc}"
+t_resp = time.perf_counter()
+out["first_response_s"] = t_resp - t_app
+out["total_s"] = t_resp - t0
+heavy = ["torch", "sentence_transformers", "sklearn", "pandas", "openai", "onnxruntime"]
+out["heavy_loaded"] = [m for m in heavy if m in sys.modules]
+print("@@" + json.dumps(out))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_times(top: int) -> list[tuple[str, float, float]]:
+    """Ritorna [(modulo, self_ms, cumulative_ms)] ordinati per cumulativo."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import factory.app_factory"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        # formato: "import time:  self_us | cumulative_us | modulo"
+        try:
+            self_us, cum_us, name = line.split(":", 1)[1].split("|")
+            self_us, cum_us, name = int(self_us), int(cum_us), name.strip()
+        except ValueError:
+            continue
+        rows.append((name, self_us / 1000, cum_us / 1000))
+    if proc.returncode != 0:
+        print(proc.stderr.splitlines()[-1] if proc.stderr else "import fallito")
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows[:top]
+
+
+def first_response(method: str, path: str, body) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD, json.dumps([method, path, body])],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, timeout=600,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@"):
+            return json.loads(line[2:])
+    return {"error": (proc.stderr.strip().splitlines() or ["nessun output"])[-1]}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--top", type=int, default=20, help="moduli da mostrare")
+    ap.add_argument("--skip-chat", action="store_true",
+                    help="non misurare /chat (richiede LLM e Redis raggiungibili)")
+    args = ap.parse_args()
+
+    print(f"• EMBEDDING_PROVIDER={os.getenv('EMBEDDING_PROVIDER', 'local_cpu')}")
+    print(f"• Import di factory.app_factory (top {args.top} per tempo cumulativo)")
+    print(f"  {'modulo':<55} {'self ms':>9} {'cum ms':>9}")
+    for name, self_ms, cum_ms in import_times(args.top):
+        print(f"  {name:<55} {self_ms:9.1f} {cum_ms:9.1f}")
+
+    print("\n• Time-to-first-response per blueprint (processo nuovo per ciascuno)")
+    print(f"  {'blueprint':<16} {'import s':>9} {'app s':>8} {'1st resp s':>11} {'tot s':>8}  status / moduli pesanti")
+    for bp, method, path, body in ENDPOINTS:
+        if args.skip_chat and bp == "chat_bp":
+            continue
+        r = first_response(method, path, body)
+        if "create_app_s" not in r:
+            err = (r.get("error") or "").strip().splitlines()
+            print(f"  {bp:<16} errore: {err[0] if err else '?'}")
+            continue
+        extra = r.get("error") or r.get("status")
+        print(f"  {bp:<16} {r['import_s']:9.3f} {r['create_app_s']:8.3f} "
+              f"{r.get('first_response_s', 0):11.3f} {r.get('total_s', 0):8.3f}  "
+              f"{extra} {r.get('heavy_loaded')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+bench_vector_params.py
+───────────────────────────────────────────────────────────────────────────────
+Microbenchmark di search_table: percorso testuale storico
+(f"{x:.6f}" per ogni float + SQL composto a ogni chiamata) contro
+VectorParam + statement preparato per connessione.
+
+Per ogni variante misura, su N query con embedding diversi:
+- tempo CPU del processo Python per query (time.process_time)
+- latenza totale per query (p50 / p95)
+
+Gli embedding sono calcolati prima del benchmark: si misura solo il
+percorso Python → Postgres.
+
+Esempio di esecuzione:
+    export DB_NAME=demo_restaurant
+    python tools/bench_vector_params.py --table menu -n 500
+"""
+
+import argparse, os, random, sys, time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+os.environ.setdefault("DEFAULT_DB", os.getenv("DB_NAME", "demo_restaurant"))
+
+from psycopg2 import sql as psql
+
+from core.embedding_providers import provider_class
+from core.vector_client import _run
+from core.vector_table import _parse_fields, search_table_by_embedding
+
+
+def legacy_search(emb, table: str, k: int):
+    """Copia del percorso precedente di core/vector_table.search_table."""
+    cols = _parse_fields(table, "*")
+    fields_sql = psql.SQL(", ").join(psql.Identifier(c) for c in cols)
+    emb_str = "[" + ",".join(f"{x:.6f}" for x in emb) + "]"
+    sim_expr = psql.SQL("(1 - (embedding <=> {emb}::vector))").format(
+        emb=psql.Placeholder("emb")
+    )
+    stmt = psql.SQL(
+        """
+        SELECT {fields},
+               {sim}   AS cos_sim,
+               {sim}   AS score
+        FROM   {table}
+        ORDER  BY score DESC
+        LIMIT  {k};
+        """
+    ).format(fields=fields_sql, sim=sim_expr,
+             table=psql.Identifier(table), k=psql.Placeholder("k"))
+    return _run(stmt, {"emb": emb_str, "k": k}, dict_cursor=True, query_class="search")
+
+
+def random_embeddings(n: int, dim: int) -> list[list[float]]:
+    rnd = random.Random(42)
+    out = []
+    for _ in range(n):
+        v = [rnd.gauss(0, 1) for _ in range(dim)]
+        norm = sum(x * x for x in v) ** 0.5
+        out.append([x / norm for x in v])
+    return out
+
+
+def bench(name: str, fn, embs) -> dict:
+    for e in embs[:10]:                       # warm-up: pool, PREPARE, cache piani
+        fn(e)
+    lat = []
+    cpu0 = time.process_time()
+    for e in embs:
+        t0 = time.perf_counter()
+        fn(e)
+        lat.append(time.perf_counter() - t0)
+    cpu = time.process_time() - cpu0
+    lat.sort()
+    res = {
+        "cpu_us": cpu / len(embs) * 1e6,
+        "p50_ms": lat[len(lat) // 2] * 1000,
+        "p95_ms": lat[int(len(lat) * 0.95)] * 1000,
+    }
+    print(f"  {name:<26} cpu {res['cpu_us']:8.1f} µs/query   "
+          f"p50 {res['p50_ms']:6.3f} ms   p95 {res['p95_ms']:6.3f} ms")
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Testo vs VectorParam + PREPARE per search_table")
+    ap.add_argument("--table", default="menu", choices=["menu", "recensioni"])
+    ap.add_argument("-n", type=int, default=500, help="query per variante")
+    ap.add_argument("-k", type=int, default=5)
+    args = ap.parse_args()
+
+    dim = provider_class().dim
+    embs = random_embeddings(args.n, dim)
+    print(f"• {args.n} query su {args.table} (dim {dim}, k {args.k}) · DB {os.environ['DEFAULT_DB']}")
+
+    old = bench("testo + SQL composto", lambda e: legacy_search(e, args.table, args.k), embs)
+    new = bench("VectorParam + PREPARE", lambda e: search_table_by_embedding(
+        e, table=args.table, k=args.k, prepared=True), embs)
+    bench("VectorParam senza PREPARE", lambda e: search_table_by_embedding(
+        e, table=args.table, k=args.k, prepared=False), embs)
+
+    print(f"✓ CPU ×{old['cpu_us'] / new['cpu_us']:.2f}   p50 ×{old['p50_ms'] / new['p50_ms']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
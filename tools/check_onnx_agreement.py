@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+check_onnx_agreement.py
+───────────────────────────────────────────────────────────────────────────────
+Verifica che il backend `local_onnx` (int8) produca embedding coerenti con
+quelli PyTorch già salvati nelle tabelle `menu` e `recensioni`.
+
+Per ogni riga ricostruisce il testo esattamente come i loader
+(core/embedding_texts.py), lo codifica con ONNX e calcola la similarità
+coseno con l'embedding memorizzato. Esce con codice 1 se l'accordo è
+sotto le soglie.
+
+Esempio di esecuzione:
+    export DB_NAME=demo_restaurant
+    python tools/check_onnx_agreement.py --min-mean 0.99 --min-cos 0.95
+"""
+
+import argparse, os, sys, time
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.embedding_providers import get_provider
+from core.embedding_texts import menu_text, review_text
+
+DB = dict(
+    dbname   = os.getenv("DB_NAME", "demo_restaurant"),
+    user     = os.getenv("DB_USER", "postgres"),
+    password = os.getenv("DB_PASS", "postgres"),
+    host     = os.getenv("DB_HOST", "localhost"),
+    port     = int(os.getenv("DB_PORT", "5432")),
+)
+
+QUERIES = {
+    "menu": (
+        "SELECT name, type, description, ingredients, embedding::real[] "
+        "FROM menu WHERE embedding IS NOT NULL ORDER BY id",
+        lambda r: menu_text(r[0], r[1], r[2], r[3]),
+    ),
+    "recensioni": (
+        "SELECT recensione, piatti, embedding::real[] "
+        "FROM recensioni WHERE embedding IS NOT NULL ORDER BY id",
+        lambda r: review_text(r[0], r[1]),
+    ),
+}
+
+
+def check_table(cur, table: str, limit: int | None) -> np.ndarray:
+    sql, to_text = QUERIES[table]
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    cur.execute(sql)
+    rows = cur.fetchall()
+    if not rows:
+        print(f"  {table}: nessuna riga con embedding")
+        return np.empty(0, dtype=np.float32)
+
+    texts = [to_text(r) for r in rows]
+    stored = np.asarray([r[-1] for r in rows], dtype=np.float32)
+    stored /= np.clip(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12, None)
+
+    t0 = time.perf_counter()
+    onnx = np.asarray(get_provider("local_onnx").encode(texts), dtype=np.float32)
+    dt = time.perf_counter() - t0
+
+    cos = (stored * onnx).sum(axis=1)
+    print(f"  {table:<11} n={len(cos):5d}  mean={cos.mean():.4f}  min={cos.min():.4f}  "
+          f"p1={np.percentile(cos, 1):.4f}  p5={np.percentile(cos, 5):.4f}  "
+          f"encode={dt*1000/len(cos):.2f} ms/testo")
+    worst = int(cos.argmin())
+    print(f"    peggiore: {cos[worst]:.4f} ← {texts[worst][:80]!r}")
+    return cos
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Accordo coseno ONNX int8 vs embedding salvati")
+    ap.add_argument("--tables", nargs="+", default=list(QUERIES), choices=list(QUERIES))
+    ap.add_argument("--limit", type=int, default=None, help="righe massime per tabella")
+    ap.add_argument("--min-mean", type=float, default=0.99)
+    ap.add_argument("--min-cos", type=float, default=0.95)
+    args = ap.parse_args()
+
+    print(f"• DB {DB['dbname']} @ {DB['host']}:{DB['port']}")
+    with psycopg2.connect(**DB) as con, con.cursor() as cur:
+        results = {t: check_table(cur, t, args.limit) for t in args.tables}
+
+    ok = True
+    for table, cos in results.items():
+        if cos.size and (cos.mean() < args.min_mean or cos.min() < args.min_cos):
+            ok = False
+            print(f"✗ {table}: accordo sotto soglia (mean ≥ {args.min_mean}, min ≥ {args.min_cos})")
+    if ok:
+        print("✓ Accordo ONNX int8 entro le soglie")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+eval_ann_recall.py
+───────────────────────────────────────────────────────────────────────────────
+Recall@k e latenza della ricerca ANN (HNSW / IVFFlat) rispetto alla ricerca
+esatta, sui dati di un tenant.
+
+Le query sono embedding presi a caso dalla tabella e perturbati con un po'
+di rumore gaussiano (vicini ai dati come le query reali, ma non identici).
+Per ogni query:
+- esatta: scansione sequenziale (indici disabilitati con SET LOCAL)
+- ANN:    stessa query per ogni valore di ef_search (HNSW) o probes (IVFFlat)
+
+Esempio di esecuzione:
+    export DB_NAME=demo_restaurant
+    python tools/eval_ann_recall.py --table recensioni -k 5 --queries 200
+    python tools/eval_ann_recall.py --table recensioni --values 10 20 40 80 160
+"""
+
+import argparse, os, sys, time
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.pg_vector import VectorParam
+from core.vector_index import VECTOR_TABLES, index_name
+
+DB = dict(
+    dbname   = os.getenv("DB_NAME", "demo_restaurant"),
+    user     = os.getenv("DB_USER", "postgres"),
+    password = os.getenv("DB_PASS", "postgres"),
+    host     = os.getenv("DB_HOST", "localhost"),
+    port     = int(os.getenv("DB_PORT", "5432")),
+)
+
+_SEARCH = "SELECT id FROM {table} ORDER BY embedding <=> %s LIMIT %s"
+
+
+def index_kind(cur, table: str) -> str | None:
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (table,))
+    names = {r[0] for r in cur.fetchall()}
+    for kind in ("hnsw", "ivfflat"):
+        if index_name(table, kind) in names:
+            return kind
+    return None
+
+
+def sample_queries(cur, table: str, n: int, noise: float, seed: int) -> np.ndarray:
+    cur.execute(f"SELECT setseed(%s); SELECT embedding::real[] FROM {table} "
+                "WHERE embedding IS NOT NULL ORDER BY random() LIMIT %s",
+                (seed / 2**31, n))
+    base = np.asarray([r[0] for r in cur.fetchall()], dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    q = base + rng.normal(scale=noise, size=base.shape).astype(np.float32)
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def run_queries(con, table: str, queries: np.ndarray, k: int, settings: str):
+    ids, lat = [], []
+    sql = settings + _SEARCH.format(table=table)
+    with con.cursor() as cur:
+        for q in queries:
+            t0 = time.perf_counter()
+            cur.execute(sql, (VectorParam(q), k))
+            ids.append([r[0] for r in cur.fetchall()])
+            lat.append(time.perf_counter() - t0)
+            con.rollback()                    # SET LOCAL vale per una transazione
+    return ids, np.asarray(lat) * 1000
+
+
+def uses_index(con, table: str, q: np.ndarray, k: int, settings: str) -> bool:
+    with con.cursor() as cur:
+        cur.execute(settings + "EXPLAIN " + _SEARCH.format(table=table), (VectorParam(q), k))
+        plan = "\n".join(r[0] for r in cur.fetchall())
+    con.rollback()
+    return "Index Scan" in plan
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Recall@k e latenza ANN vs ricerca esatta")
+    ap.add_argument("--table", default="recensioni", choices=VECTOR_TABLES)
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--noise", type=float, default=0.02, help="dev. std. del rumore sulle query")
+    ap.add_argument("--values", type=int, nargs="+",
+                    help="valori di ef_search (HNSW) o probes (IVFFlat) da provare")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    with closing(psycopg2.connect(**DB)) as con:
+        with con.cursor() as cur:
+            kind = index_kind(cur, args.table)
+            cur.execute(f"SELECT count(*) FROM {args.table}")
+            rows = cur.fetchone()[0]
+            queries = sample_queries(cur, args.table, args.queries, args.noise, args.seed)
+        con.rollback()
+
+        print(f"• DB {DB['dbname']} · {args.table}: {rows} righe · indice {kind or 'nessuno'} · "
+              f"{len(queries)} query · k={args.k}")
+        if not kind:
+            sys.exit("✗ nessun indice ANN: lancia i loader (VECTOR_INDEX_KIND=hnsw|ivfflat)")
+
+        exact_settings = ("SET LOCAL enable_indexscan = off; "
+                          "SET LOCAL enable_bitmapscan = off; ")
+        exact, exact_lat = run_queries(con, args.table, queries, args.k, exact_settings)
+        print(f"  esatta                    p50 {np.percentile(exact_lat, 50):7.2f} ms   "
+              f"p95 {np.percentile(exact_lat, 95):7.2f} ms")
+
+        guc = "hnsw.ef_search" if kind == "hnsw" else "ivfflat.probes"
+        values = args.values or ([10, 20, 40, 80, 160] if kind == "hnsw" else [1, 5, 10, 20, 50])
+        for v in values:
+            settings = f"SET LOCAL {guc} = {v}; "
+            if not uses_index(con, args.table, queries[0], args.k, settings):
+                print(f"  {guc}={v:<5} il planner non usa l'indice (tabella troppo piccola?)")
+                continue
+            ann, lat = run_queries(con, args.table, queries, args.k, settings)
+            recall = np.mean([len(set(a) & set(e)) / max(1, len(e)) for a, e in zip(ann, exact)])
+            print(f"  {guc}={v:<5} recall@{args.k} {recall:.4f}   "
+                  f"p50 {np.percentile(lat, 50):7.2f} ms   p95 {np.percentile(lat, 95):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+export_onnx.py
+───────────────────────────────────────────────────────────────────────────────
+Esporta all-MiniLM-L6-v2 (lo stesso modello del provider `local_cpu`) in ONNX
+e ne crea una versione quantizzata int8 (quantizzazione dinamica dei pesi),
+pronta per EMBEDDING_PROVIDER=local_onnx.
+
+Richiede (solo per l'export): sentence-transformers, torch, onnx, onnxruntime.
+
+Output in EMB_ONNX_DIR (default models/all-MiniLM-L6-v2-onnx):
+- model_fp32.onnx   grafo esportato in float32
+- model_int8.onnx   grafo quantizzato usato a runtime
+- tokenizer.json    tokenizer "fast" di HuggingFace
+
+Esempio di esecuzione:
+    python tools/export_onnx.py
+    EMBEDDING_PROVIDER=local_onnx python tools/check_onnx_agreement.py
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.embedding_providers import EMB_ONNX_DIR, EMB_ONNX_FILE, LocalCpuProvider
+
+
+def export(out_dir: Path, opset: int):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = out_dir / "model_fp32.onnx"
+    int8_path = out_dir / EMB_ONNX_FILE
+
+    print(f"• Carico {LocalCpuProvider.model} …")
+    st = SentenceTransformer(LocalCpuProvider.model, device="cpu")
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+
+    sample = tokenizer(["uramaki sunburn", "ramen shoyu vegetale con tofu"],
+                       padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    args = tuple(sample[n] for n in names)
+    dyn = {n: {0: "batch", 1: "seq"} for n in names}
+    dyn["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+    print(f"• Export ONNX (opset {opset}) → {fp32_path}")
+    t0 = time.time()
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, args, str(fp32_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dyn,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    print(f"  fatto in {time.time()-t0:.1f} s")
+
+    print(f"• Quantizzazione int8 → {int8_path}")
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+    # tokenizer.json (formato "fast") letto da `tokenizers` a runtime
+    tokenizer.save_pretrained(str(out_dir))
+    if not (out_dir / "tokenizer.json").exists():
+        raise SystemExit("tokenizer.json non generato: serve un tokenizer 'fast'")
+
+    mb = lambda p: p.stat().st_size / 1e6
+    print(f"✓ fp32 {mb(fp32_path):.1f} MB → int8 {mb(int8_path):.1f} MB in {out_dir}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export ONNX int8 di all-MiniLM-L6-v2")
+    ap.add_argument("--out", type=Path, default=EMB_ONNX_DIR)
+    ap.add_argument("--opset", type=int, default=14)
+    args = ap.parse_args()
+    export(args.out, args.opset)
+
+
+if __name__ == "__main__":
+    main()
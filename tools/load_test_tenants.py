@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+load_test_tenants.py
+───────────────────────────────────────────────────────────────────────────────
+Load test multi-tenant: molti ristoranti (un DB ciascuno) interrogati in
+parallelo, per verificare che le connessioni Postgres restino sotto il
+budget globale (PG_GLOBAL_MAX_CONN) e non crescano con il numero di tenant.
+
+1. --setup N crea i DB tenant_001 … tenant_N clonando DB_NAME (TEMPLATE);
+2. i worker chiamano /api/menu?project=… (e /api/chat con --chat) su
+   tenant scelti a caso;
+3. in parallelo campiona pg_stat_activity e /api/stats (budget, eviction).
+
+Esempio di esecuzione:
+    python tools/load_test_tenants.py --setup 50
+    python tools/load_test_tenants.py --tenants 50 --workers 32 --seconds 60
+    python tools/load_test_tenants.py --drop 50
+"""
+
+import argparse, os, random, sys, threading, time
+from contextlib import closing
+from pathlib import Path
+
+import psycopg2
+import requests
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+DB = dict(
+    dbname   = os.getenv("DB_NAME", "demo_restaurant"),
+    user     = os.getenv("DB_USER", "postgres"),
+    password = os.getenv("DB_PASS", "postgres"),
+    host     = os.getenv("DB_HOST", "localhost"),
+    port     = int(os.getenv("DB_PORT", "5432")),
+)
+
+
+def tenant_name(i: int) -> str:
+    return f"tenant_{i:03d}"
+
+
+def _admin():
+    con = psycopg2.connect(**{**DB, "dbname": "postgres"})
+    con.autocommit = True
+    return con
+
+
+def setup(n: int):
+    """Clona DB_NAME in n database tenant (quelli già esistenti vengono saltati)."""
+    with closing(_admin()) as con, con.cursor() as cur:
+        cur.execute("SELECT datname FROM pg_database")
+        existing = {r[0] for r in cur.fetchall()}
+        for i in range(1, n + 1):
+            name = tenant_name(i)
+            if name in existing:
+                continue
+            cur.execute(f'CREATE DATABASE "{name}" TEMPLATE "{DB["dbname"]}"')
+            print(f"  • creato {name}")
+    print(f"✓ {n} tenant pronti (template {DB['dbname']})")
+
+
+def drop(n: int):
+    with closing(_admin()) as con, con.cursor() as cur:
+        for i in range(1, n + 1):
+            cur.execute(f'DROP DATABASE IF EXISTS "{tenant_name(i)}"')
+    print(f"✓ {n} tenant eliminati")
+
+
+def backend_connections(cur) -> int:
+    cur.execute(
+        "SELECT count(*) FROM pg_stat_activity "
+        "WHERE backend_type = 'client backend' AND datname LIKE 'tenant\\_%'"
+    )
+    return cur.fetchone()[0]
+
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ok = 0
+        self.errors = 0
+        self.latencies: list[float] = []
+
+    def add(self, ok: bool, dt: float):
+        with self.lock:
+            if ok:
+                self.ok += 1
+                self.latencies.append(dt)
+            else:
+                self.errors += 1
+
+
+def worker(base: str, tenants: int, chat: bool, stop: float, counters: Counters):
+    s = requests.Session()
+    while time.time() < stop:
+        project = tenant_name(random.randint(1, tenants))
+        t0 = time.perf_counter()
+        try:
+            if chat and random.random() < 0.2:
+                r = s.post(f"{base}/api/chat", json={
+                    "project": project, "sessionid": f"load-{project}",
+                    "conversation_history": [{"role": "user", "content": "Avete il ramen?"}],
+                }, timeout=60)
+            else:
+                r = s.get(f"{base}/api/menu", params={"project": project}, timeout=30)
+            ok = r.status_code < 500
+        except requests.RequestException:
+            ok = False
+        counters.add(ok, time.perf_counter() - t0)
+
+
+def run(args):
+    counters = Counters()
+    stop = time.time() + args.seconds
+    threads = [threading.Thread(target=worker, daemon=True,
+                                args=(args.url, args.tenants, args.chat, stop, counters))
+               for _ in range(args.workers)]
+    for t in threads:
+        t.start()
+
+    peak_pg, peak_budget = 0, 0
+    with closing(_admin()) as con, con.cursor() as cur:
+        while time.time() < stop:
+            time.sleep(args.sample)
+            n_pg = backend_connections(cur)
+            peak_pg = max(peak_pg, n_pg)
+            try:
+                budget = requests.get(f"{args.url}/api/stats", timeout=5).json()["pg_pools"]["budget"]
+                peak_budget = max(peak_budget, budget["used"])
+                extra = (f"budget {budget['used']}/{budget['limit']}  "
+                         f"tenant connessi {budget['tenants_connected']}/{budget['tenants']}  "
+                         f"evict {budget['evicted_connections']}")
+            except (requests.RequestException, KeyError, ValueError):
+                extra = "stats n/d"
+            print(f"  pg_stat_activity {n_pg:4d}  {extra}  ok {counters.ok}  err {counters.errors}")
+
+    for t in threads:
+        t.join()
+
+    lat = sorted(counters.latencies) or [0.0]
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+    print(f"✓ {counters.ok} richieste ok, {counters.errors} errori in {args.seconds}s")
+    print(f"  latenza p50 {p(0.50):.1f} ms  p95 {p(0.95):.1f} ms  p99 {p(0.99):.1f} ms")
+    print(f"  picco connessioni Postgres {peak_pg} (budget per processo usato: {peak_budget})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test multi-tenant sulle connessioni Postgres")
+    ap.add_argument("--setup", type=int, metavar="N", help="crea N DB tenant ed esce")
+    ap.add_argument("--drop", type=int, metavar="N", help="elimina N DB tenant ed esce")
+    ap.add_argument("--url", default="http://localhost:5000")
+    ap.add_argument("--tenants", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=32)
+    ap.add_argument("--seconds", type=int, default=30)
+    ap.add_argument("--sample", type=float, default=2.0, help="intervallo di campionamento (s)")
+    ap.add_argument("--chat", action="store_true", help="mescola anche richieste /api/chat")
+    args = ap.parse_args()
+
+    if args.setup:
+        return setup(args.setup)
+    if args.drop:
+        return drop(args.drop)
+    print(f"• {args.workers} worker su {args.tenants} tenant per {args.seconds}s → {args.url}")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()